@@ -0,0 +1,229 @@
+# 基准测试 (开发工具)
+#
+# 位于 bin 文件夹下使用如下的命令运行指定的基准测试::
+#
+#     python -m benchmark.<name>
+#
+# 所有的基准测试均在临时文件夹中运行，不会修改当前的用户配置
+
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import contextlib
+import concurrent.futures
+
+from typing import Iterator as _Iterator
+from wsgiref.simple_server import ServerHandler, WSGIRequestHandler, WSGIServer
+
+from core import base as _base
+from core.base import conf as _conf
+from core.base import config as _config
+from core.base import database as _database
+
+
+__all__ = [
+    "report",
+    "timer",
+    "sandbox",
+    "setup_django",
+    "PoolServer",
+    "serve"
+]
+
+
+def report(name: str, **metrics):
+    """
+    以 JSON 行的形式输出一项基准测试的结果
+
+    :param name:
+        基准测试的名称
+
+    :param metrics:
+        测试指标
+
+    :type name: str
+    """
+    print(json.dumps({'benchmark': name, **metrics}, ensure_ascii=False), flush=True)
+    return
+
+
+@contextlib.contextmanager
+def timer() -> _Iterator[dict[str, float]]:
+    """
+    计时器，退出时将经过的秒数写入返回字典的 seconds 键中
+
+    >>> with timer() as t:
+    ...     pass
+    >>> t['seconds']
+    """
+    result = {'seconds': 0.0}
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result['seconds'] = time.perf_counter() - start
+    return
+
+
+@contextlib.contextmanager
+def sandbox() -> _Iterator[str]:
+    """
+    将 `RunInfo.ADDRESS` 临时重定向至一个临时文件夹，退出时恢复并删除该文件夹
+
+    :return:
+        临时文件夹的绝对地址
+    """
+    address = tempfile.mkdtemp(prefix='adm_benchmark_')
+    address_old = _conf.RunInfo.ADDRESS
+    _conf.RunInfo.state('ADDRESS', readonly=False)
+    _conf.RunInfo.ADDRESS = address
+    try:
+        _base.mkdir()
+        yield address
+    finally:
+        _database.close()
+        _conf.RunInfo.ADDRESS = address_old
+        _conf.RunInfo.state('ADDRESS', readonly=True)
+        shutil.rmtree(address, ignore_errors=True)
+    return
+
+
+def setup_django(sections=None, *, urlconf=None):
+    """
+    在沙盒中初始化网站，并执行数据库迁移
+
+    Django 的配置在进程内只能初始化一次，需要比较不同配置时请在子进程中调用
+
+    :param sections:
+        写入 ADM INI文件 的内容，以节名称为键，值为选项的字典
+
+    :param urlconf:
+        替代 ROOT_URLCONF 的模块名称，仅限关键字
+
+    :type sections: dict[str, dict[str, str]] | None
+    :type urlconf: str | None
+    """
+    parser = _config.ConfigParser()
+    parser.read_dict(sections or {})
+    _conf.INIConnect.new('ADM', parser)
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'website.settings'
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+
+    django.setup()
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['127.0.0.1', 'testserver']
+    if urlconf is not None:
+        settings.ROOT_URLCONF = urlconf
+    call_command('migrate', verbosity=0)
+    return
+
+
+class _SendfileServerHandler(ServerHandler):
+    """
+    使用 sendfile 发送 wsgi.file_wrapper 的 ServerHandler，行为与 gunicorn 一致，
+    即从文件的当前位置开始发送 Content-Length 个字节
+    """
+
+    def sendfile(self) -> bool:
+        try:
+            fd = self.result.filelike.fileno()
+            out = self.stdout.fileno()
+            length = int(self.headers['Content-Length'])
+        except (AttributeError, OSError, TypeError, ValueError):
+            return False
+        if not self.headers_sent:
+            self.send_headers()
+        self._flush()
+        offset = os.lseek(fd, 0, os.SEEK_CUR)
+        while length > 0:
+            sent = os.sendfile(out, fd, offset, length)
+            if sent == 0:
+                break
+            offset += sent
+            length -= sent
+            self.bytes_sent += sent
+        return True
+
+
+class _QuietHandler(WSGIRequestHandler):
+    """
+    不输出访问日志的请求处理器
+    """
+    server_handler = ServerHandler
+
+    def log_message(self, *args):
+        return
+
+    def handle(self):  # 与 wsgiref 相同，仅替换 ServerHandler
+        self.raw_requestline = self.rfile.readline(65537)
+        if len(self.raw_requestline) > 65536:
+            self.send_error(414)
+            return
+        if not self.parse_request():
+            return
+        handler = self.server_handler(self.rfile, self.wfile, self.get_stderr(), self.get_environ(),
+                                      multithread=True)
+        handler.request_handler = self
+        handler.run(self.server.get_app())
+        return
+
+
+class _SendfileHandler(_QuietHandler):
+    server_handler = _SendfileServerHandler
+
+
+class PoolServer(WSGIServer):
+    """
+    使用固定大小线程池的 WSGI 服务器，与生产环境中的服务器一致，持久连接可以在请求之间复用
+    """
+    request_queue_size = 256
+
+    def __init__(self, address, handler, *, workers: int):
+        super().__init__(address, handler)
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        return
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self._process, request, client_address)
+        return
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+        return
+
+
+def serve(app, *, workers=8, sendfile=False) -> PoolServer:
+    """
+    在后台线程中运行 WSGI 应用，监听 127.0.0.1 上的随机端口
+
+    :param app:
+        WSGI 应用
+
+    :param workers:
+        服务器的线程数目，仅限关键字
+
+    :param sendfile:
+        是否使用 sendfile 发送文件，仅限关键字
+
+    :type workers: int
+    :type sendfile: bool
+
+    :return:
+        服务器，端口为 server_address[1]，使用完毕后需要调用 shutdown
+    :rtype: PoolServer
+    """
+    server = PoolServer(('127.0.0.1', 0), _SendfileHandler if sendfile else _QuietHandler, workers=workers)
+    server.set_app(app)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
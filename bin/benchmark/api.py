@@ -0,0 +1,141 @@
+# 媒体库异步 API 的基准测试
+#
+# 逐步扩大媒体库 (默认最终为 50 万集)，在每个规模下通过 ASGI 并发地请求随机深度的页面::
+#
+#     series    使用游标跳转至随机位置的系列列表
+#     episodes  随机系列的剧集列表
+#     files     使用游标跳转至随机位置的文件列表
+#     offset    作为对照，直接使用 LIMIT/OFFSET 查询同样深度的文件列表
+#
+# 最后以 NDJSON 流式输出所有文件，测试流式输出的吞吐量
+
+import time
+import random
+import asyncio
+import argparse
+
+from core.base import database
+from core.data import library
+
+from . import report, sandbox, setup_django, timer
+
+
+def fixture(start: int, stop: int, episodes: int, *, seed=0):
+    """
+    写入编号为 [start, stop) 的系列，每个系列包括 episodes 集，每集一个文件
+    """
+    rng = random.Random(seed + start)
+    now = time.time()
+    with database.transaction('library') as connection:
+        connection.executemany("INSERT INTO series (id, title, year, added) VALUES (?, ?, ?, ?)",
+                               ((index, f"{rng.getrandbits(40):010x} Series {index}", 1990 + index % 35, now)
+                                for index in range(start, stop)))
+        connection.executemany("INSERT INTO episode (id, series, season, number, title) VALUES (?, ?, ?, ?, ?)",
+                               ((index * episodes + number, index, 1 + number // 12, number % 12 + 1,
+                                 f"Episode {number + 1}")
+                                for index in range(start, stop) for number in range(episodes)))
+        connection.executemany("INSERT INTO media_file (id, episode, path, size, mtime) VALUES (?, ?, ?, ?, ?)",
+                               ((index * episodes + number, index * episodes + number,
+                                 f"/library/{index}/{number}.mkv", 1 << 30, now)
+                                for index in range(start, stop) for number in range(episodes)))
+    return
+
+
+def _percentile(values: list[float], percent: float) -> float:
+    return round(sorted(values)[min(int(len(values) * percent), len(values) - 1)] * 1000, 2)
+
+
+async def _load(client, urls: list[str], concurrency: int) -> list[float]:
+    """
+    使用 concurrency 个并发任务请求所有的地址，返回每个请求的延迟
+    """
+    queue = list(reversed(urls))
+    latencies = []
+
+    async def task():
+        while queue:
+            url = queue.pop()
+            start = time.perf_counter()
+            response = await client.get(url)
+            if response.status_code != 200:
+                raise AssertionError(f"请求 '{url}' 失败，状态码为 {response.status_code}")
+            latencies.append(time.perf_counter() - start)
+        return
+
+    await asyncio.gather(*(task() for _ in range(concurrency)))
+    return latencies
+
+
+async def _stream(client) -> tuple[int, int]:
+    response = await client.get('/api/files/?format=ndjson')
+    lines = size = 0
+    async for chunk in response.streaming_content:
+        lines += chunk.count(b'\n')
+        size += len(chunk)
+    return lines, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='媒体库异步 API 的基准测试')
+    parser.add_argument('--episodes', type=int, default=500000, help='最终的剧集数目')
+    parser.add_argument('--steps', type=int, default=3, help='扩大媒体库的次数')
+    parser.add_argument('--per-series', type=int, default=25, help='每个系列的剧集数目')
+    parser.add_argument('--requests', type=int, default=2000, help='每个规模下的请求数目')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发的请求数目')
+    args = parser.parse_args()
+
+    with sandbox():
+        setup_django()
+        from django.test import AsyncClient
+        from website import api
+
+        media = api.get_library()
+        client = AsyncClient()
+        total = args.episodes // args.per_series
+        created = 0
+        for step in range(1, args.steps + 1):
+            target = total * step // args.steps
+            with timer() as t:
+                fixture(created, target, args.per_series)
+            created = target
+            report('api.fixture', series=created, episodes=created * args.per_series,
+                   seconds=round(t['seconds'], 4))
+
+            keys = database.connect('library').execute("SELECT title, id FROM series ORDER BY title, id").fetchall()
+            rng = random.Random(step)
+            depths = [rng.randrange(len(keys)) for _ in range(args.requests)]
+            files = [rng.randrange(created * args.per_series) for _ in depths]
+            urls = {
+                'series': [f"/api/series/?limit=50&cursor={library.encode_cursor(keys[depth])}" for depth in depths],
+                'episodes': [f"/api/series/{rng.randrange(created)}/episodes/?limit=50" for _ in depths],
+                'files': [f"/api/files/?limit=50&cursor={library.encode_cursor([depth])}" for depth in files],
+            }
+            for name, group in urls.items():
+                with timer() as t:
+                    latencies = asyncio.run(_load(client, group, args.concurrency))
+                report(f"api.{name}", episodes=created * args.per_series, requests=len(latencies),
+                       per_second=round(len(latencies) / t['seconds'], 1),
+                       p50_ms=_percentile(latencies, 0.5), p99_ms=_percentile(latencies, 0.99))
+
+            latencies = []
+            for depth in files[:max(args.requests // 20, 1)]:  # OFFSET 过慢，仅取部分深度
+                with timer() as t:
+                    media.reader.execute("SELECT id, episode, path, size, mtime FROM media_file ORDER BY id "
+                                         "LIMIT 51 OFFSET ?", (depth,)).fetchall()
+                latencies.append(t['seconds'])
+            report('api.offset', episodes=created * args.per_series, requests=len(latencies),
+                   p50_ms=_percentile(latencies, 0.5), p99_ms=_percentile(latencies, 0.99))
+
+        with timer() as t:
+            lines, size = asyncio.run(_stream(client))
+        report('api.ndjson', rows=lines, bytes=size, seconds=round(t['seconds'], 4))
+
+        with timer() as t:
+            rows = sum(len(chunk) for chunk in media.iterate('files'))
+        report('api.iterate', rows=rows, seconds=round(t['seconds'], 4),
+               rows_per_second=round(rows / t['seconds']))
+    return
+
+
+if __name__ == '__main__':
+    main()
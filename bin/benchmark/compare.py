@@ -0,0 +1,120 @@
+# 比较两次基准测试的结果
+#
+# 读取两个由基准测试输出重定向得到的 JSON 行文件，按照基准测试名称与参数配对，
+# 参数为非数值的字段 (例如 scale, kind) 与 _PARAMETERS 中的数值字段 (例如 threads, workers)，
+# 名称与参数均相同的结果再按照在文件中出现的次序配对，只比较方向已知的指标::
+#
+#     越小越好  seconds, min_seconds 以及以 _seconds, _ms, _us, ns_per_call 等结尾的耗时
+#     越大越好  以 per_second 结尾的吞吐量与 speedup
+#
+# 每个被比较的指标输出一行结果，变差的比例超过 --threshold 时记为退化并以非零状态码退出::
+#
+#     python -m benchmark.compare base.jsonl new.jsonl --threshold 0.2
+
+import sys
+import json
+import argparse
+import collections
+
+from . import report
+
+
+_LOWER = ('seconds', '_ms', '_us', 'ns_per_call', 'us_per_job', 'us_per_call')  #: 越小越好的指标后缀
+_HIGHER = ('per_second', 'speedup')  #: 越大越好的指标后缀
+_PARAMETERS = frozenset({'threads', 'workers', 'clients', 'cpus', 'file_mib', 'limit', 'pages'})  #: 作为参数的数值字段
+
+
+def _direction(metric: str) -> int:
+    """
+    返回指标的方向，越小越好时为 1，越大越好时为 -1，未知时为 0
+    """
+    if metric.endswith(_HIGHER):
+        return -1
+    if metric.endswith(_LOWER):
+        return 1
+    return 0
+
+
+def _parameters(record: dict) -> str:
+    """
+    返回结果中作为参数的字段，序列化为可以比较的字符串
+    """
+    return json.dumps({key: value for key, value in record.items()
+                       if key in _PARAMETERS or isinstance(value, bool) or not isinstance(value, (int, float))},
+                      sort_keys=True, ensure_ascii=False)
+
+
+def load(path: str) -> dict[tuple[str, str, int], dict]:
+    """
+    读取 JSON 行文件，忽略不是基准测试结果的行
+
+    :return:
+        以 (基准测试名称, 参数, 名称与参数均相同的第几次出现) 为键的结果
+    :rtype: dict[tuple[str, str, int], dict]
+    """
+    results = {}
+    counts = collections.Counter()
+    with open(path, encoding='utf8') as fp:
+        for line in fp:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(record, dict) or 'benchmark' not in record:
+                continue
+            key = (record.pop('benchmark'), _parameters(record))
+            results[(*key, counts[key])] = record
+            counts[key] += 1
+    return results
+
+
+def compare(base: dict, new: dict, threshold: float) -> list[dict]:
+    """
+    比较两次运行的结果
+
+    :param base:
+        基准结果，参考 :func:`load`
+    :param new:
+        新的结果
+    :param threshold:
+        允许变差的比例
+
+    :return:
+        每个被比较的指标的结果，regression 为是否退化
+    :rtype: list[dict]
+    """
+    rows = []
+    for key, record in new.items():
+        if key not in base:
+            continue
+        for metric, value in record.items():
+            direction = _direction(metric)
+            old = base[key].get(metric)
+            if not direction or not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or old <= 0:
+                continue
+            change = (value - old) / old
+            rows.append({**json.loads(key[1]), 'benchmark': key[0], 'index': key[2], 'metric': metric, 'base': old,
+                         'new': value, 'change': round(change, 4), 'regression': change * direction > threshold})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='比较两次基准测试的结果')
+    parser.add_argument('base', help='基准结果的 JSON 行文件')
+    parser.add_argument('new', help='新结果的 JSON 行文件')
+    parser.add_argument('--threshold', type=float, default=0.1, help='允许变差的比例')
+    parser.add_argument('--all', action='store_true', help='输出所有指标，而不只是退化的指标')
+    args = parser.parse_args()
+
+    rows = compare(load(args.base), load(args.new), args.threshold)
+    regressions = [row for row in rows if row['regression']]
+    for row in (rows if args.all else regressions):
+        report('compare', **{key: value for key, value in row.items() if key != 'benchmark'}, target=row['benchmark'])
+    report('compare.summary', compared=len(rows), regressions=len(regressions), threshold=args.threshold)
+    if regressions:
+        sys.exit(f"{len(regressions)} 项指标的退化超过了 {args.threshold:.0%}")
+    return
+
+
+if __name__ == '__main__':
+    main()
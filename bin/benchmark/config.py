@@ -0,0 +1,238 @@
+# 配置层的基准测试
+#
+# 在沙盒中按照不同的规模 (节数目 x 每节的选项数目) 生成合成的 ADM 数据库与 INI文件，测试::
+#
+#     create      config.create 从数据库生成 INI文件
+#     fix         config.fix 修复缺少部分选项且修改了部分值的 INI文件
+#     read_file   ConfigParser.read_file 读取 INI文件
+#     write       ConfigParser.write 写入 INI文件
+#     conf        多个线程同时读写同一个 Conf 配置类的属性，单次操作的耗时 (纳秒)
+#     dump/load   conf.dump 与 conf.load 缓存与恢复包含所有选项的配置类
+#
+# 每项测试重复 --repeat 次，输出最短与中位数耗时，结果为 JSON 行，
+# 可以重定向至文件后使用 benchmark.compare 比较两次运行的结果::
+#
+#     python -m benchmark.config > base.jsonl
+#     python -m benchmark.config > new.jsonl
+#     python -m benchmark.compare base.jsonl new.jsonl --threshold 0.2
+
+import io
+import os
+import random
+import sqlite3
+import argparse
+import threading
+import statistics
+
+from core.base import conf as _conf
+from core.base import config as _config
+
+from . import report, sandbox, timer
+
+
+__all__ = [
+    "SCALES",
+    "make_db",
+    "make_ini"
+]
+
+
+SCALES = {  #: 规模名称与 (节数目, 每节的选项数目)
+    'small': (5, 20),
+    'medium': (20, 100),
+    'large': (100, 500)
+}
+
+
+def _sections(sections: int, options: int, seed: int) -> dict[str, dict[str, tuple[str, str]]]:
+    """
+    返回确定的合成配置，以节名称为键，值为选项名称与 (值, 注释) 的字典
+    """
+    rng = random.Random(seed)
+    values = (lambda: str(rng.randint(0, 10 ** 6)),
+              lambda: rng.choice(('true', 'false')),
+              lambda: f"{rng.random() * 1000:.3f}",
+              lambda: ''.join(rng.choices('abcdefghijklmnopqrstuvwxyz', k=rng.randint(4, 24))))
+    return {f"Section{index}": {f"option_{index}_{number}": (rng.choice(values)(),
+                                                              f"选项 {number} 的说明" if number % 3 else '')
+                                for number in range(options)}
+            for index in range(sections)}
+
+
+def make_db(address: str, sections=5, options=20, *, seed=0, data=None):
+    """
+    写入合成的 ADM 数据库，结构与 config.create 读取的结构一致，即每个节为一个包含 name, value 与 comment 列的表
+
+    :param address:
+        数据库的地址，已存在时会被覆盖
+    :param sections:
+        节数目
+    :param options:
+        每节的选项数目
+    :param seed:
+        随机数种子，相同的参数总是生成相同的数据库，仅限关键字
+    :param data:
+        直接指定内容，以节名称为键，值为选项名称与值的字典，指定时忽略 sections 与 options，仅限关键字
+
+    :type address: str
+    :type sections: int
+    :type options: int
+    :type seed: int
+    :type data: dict[str, dict[str, str]] | None
+    """
+    if data is None:
+        content = _sections(sections, options, seed)
+    else:
+        content = {section: {name: (str(value), '') for name, value in items.items()} for section, items in data.items()}
+    if os.path.exists(address):
+        os.remove(address)
+    os.makedirs(os.path.dirname(address), exist_ok=True)
+    db = sqlite3.connect(address)
+    with db:
+        for section, items in content.items():
+            db.execute(f"CREATE TABLE {section} (name TEXT, value TEXT, comment TEXT)")
+            db.execute(f"INSERT INTO {section} VALUES (?, '', ?)", (_config.COMMENT_NAME, f"{section} 节的说明"))
+            db.executemany(f"INSERT INTO {section} VALUES (?, ?, ?)",
+                           ((name, value, comment) for name, (value, comment) in items.items()))
+    db.close()
+    return
+
+
+def make_ini(address: str, *, drop=0.1, change=0.1, seed=0):
+    """
+    修改已有的 INI文件，模拟用户修改过的或旧版本的配置文件
+
+    :param address:
+        INI文件的地址
+    :param drop:
+        删除的选项比例，仅限关键字
+    :param change:
+        修改值的选项比例，仅限关键字
+    :param seed:
+        随机数种子，仅限关键字
+
+    :type address: str
+    :type drop: float
+    :type change: float
+    :type seed: int
+    """
+    rng = random.Random(seed)
+    with open(address, encoding='utf8') as fp:
+        lines = fp.readlines()
+    result = []
+    for line in lines:
+        if '=' in line and not line.startswith(_config.COMMENT_SYMBOL):
+            roll = rng.random()
+            if roll < drop:
+                continue
+            if roll < drop + change:
+                line = f"{line.split('=', 1)[0].rstrip()} = changed_{rng.randint(0, 10 ** 6)}\n"
+        result.append(line)
+    with open(address, encoding='utf8', mode='w') as fp:
+        fp.writelines(result)
+    return
+
+
+class _BenchConf(_conf.Conf):
+    """
+    测试使用的配置类，序列化时需要可以通过模块属性找到
+    """
+    pass
+
+
+def _measure(func, repeat: int, setup=None) -> dict:
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        with timer() as t:
+            func()
+        samples.append(t['seconds'])
+    return {'seconds': round(statistics.median(samples), 5), 'min_seconds': round(min(samples), 5)}
+
+
+def _contention(instance: _conf.Conf, names: list[str], threads: int, operations: int, write: bool) -> float:
+    """
+    返回所有线程同时读或写配置属性时的单次操作耗时 (纳秒)
+    """
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(offset: int):
+        barrier.wait()
+        count = len(names)
+        if write:
+            for index in range(operations):
+                setattr(instance, names[(index + offset) % count], index)
+        else:
+            for index in range(operations):
+                getattr(instance, names[(index + offset) % count])
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for item in workers:
+        item.start()
+    with timer() as t:
+        barrier.wait()
+        for item in workers:
+            item.join()
+    return t['seconds'] / (threads * operations) * 1e9
+
+
+def _scale(name: str, sections: int, options: int, args: argparse.Namespace):
+    db_address = os.path.join(_conf.Folder.TEMP, f"bench_{name}.db")
+    ini_address = _config.get_ini_address_list(db_address)[0]
+    make_db(db_address, sections, options, seed=args.seed)
+    size = {'scale': name, 'sections': sections, 'options': sections * options}
+
+    report('config.create', **size, **_measure(lambda: _config.create(db_address, new_file=True), args.repeat))
+
+    with open(ini_address, encoding='utf8') as fp:
+        pristine = fp.read()
+
+    def modified():
+        with open(ini_address, encoding='utf8', mode='w') as ini:
+            ini.write(pristine)
+        make_ini(ini_address, seed=args.seed)
+
+    report('config.fix', **size, **_measure(lambda: _config.fix(db_address), args.repeat, modified))
+
+    lines = pristine.splitlines(keepends=True)
+    report('config.read_file', **size, **_measure(lambda: _config.ConfigParser().read_file(lines), args.repeat))
+    parser = _config.ConfigParser()
+    parser.read_file(lines)
+    report('config.write', **size, **_measure(lambda: parser.write(io.StringIO()), args.repeat))
+
+    instance = _BenchConf()
+    for key in list(instance.get_data()):
+        delattr(instance, key)
+    names = [f"OPTION_{index}" for index in range(sections * options)]
+    for key in names:
+        instance.new(key, 0)
+    for threads in args.threads:
+        for mode in ('get', 'set'):
+            report(f"config.conf.{mode}", **size, threads=threads,
+                   ns_per_call=round(_contention(instance, names, threads, args.operations, mode == 'set'), 1))
+
+    _conf.Dump.new('BenchConf', instance)
+    report('config.dump', **size, **_measure(_conf.dump, args.repeat))
+    report('config.load', **size, **_measure(_conf.load, args.repeat))
+    delattr(_conf.Dump, 'BenchConf')
+    return
+
+
+def main():
+    parser = argparse.ArgumentParser(description='配置层的基准测试')
+    parser.add_argument('--scales', nargs='+', choices=SCALES, default=list(SCALES), help='测试的规模')
+    parser.add_argument('--repeat', type=int, default=5, help='每项测试的重复次数')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8], help='测试 Conf 时的线程数目')
+    parser.add_argument('--operations', type=int, default=50000, help='测试 Conf 时每个线程的操作次数')
+    parser.add_argument('--seed', type=int, default=0, help='生成合成配置的随机数种子')
+    args = parser.parse_args()
+
+    with sandbox():
+        for name in args.scales:
+            _scale(name, *SCALES[name], args)
+    return
+
+
+if __name__ == '__main__':
+    main()
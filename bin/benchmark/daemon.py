@@ -0,0 +1,95 @@
+# 守护进程转发的基准测试
+#
+# 在沙盒中比较执行同一个 Django 命令 (默认为 check) 的完整进程耗时::
+#
+#     cold        每次启动新进程，完成 core.base.setup 与 django.setup 后执行命令
+#     startup     启动守护进程直到其可以接受命令的耗时
+#     forwarded   新进程只导入 daemon 并将命令转发给守护进程
+#     roundtrip   在当前进程中转发 ping 命令的往返耗时 (毫秒)，不包括进程启动
+
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+
+import daemon
+
+from core.base import conf as _conf
+
+from . import report, sandbox, timer
+from .config import make_db
+
+
+_BIN = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_REDIRECT = (
+    "import sys\n"
+    "from core.base import conf\n"
+    "conf.RunInfo.state('ADDRESS', readonly=False)\n"
+    "conf.RunInfo.ADDRESS = sys.argv[1]\n"
+    "import daemon\n"
+)
+_COLD = _REDIRECT + (
+    "daemon._setup()\n"
+    "reply = daemon._execute({'command': 'manage', 'args': sys.argv[3:]})\n"
+    "sys.exit(reply['status'])\n"
+)
+_SERVE = _REDIRECT + "daemon.serve(runtime=sys.argv[2])\n"
+_FORWARD = (
+    "import sys, daemon\n"
+    "sys.exit(daemon.forward('manage', sys.argv[3:], runtime=sys.argv[2]))\n"
+)
+
+
+def _run(code: str, address: str, runtime: str, args: list[str]) -> float:
+    with timer() as t:
+        subprocess.run([sys.executable, '-c', code, address, runtime, *args],
+                       cwd=_BIN, check=True, capture_output=True)
+    return t['seconds']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='守护进程转发的基准测试')
+    parser.add_argument('--runs', type=int, default=5, help='每种方式的运行次数，取中位数')
+    parser.add_argument('--calls', type=int, default=1000, help='测试往返耗时时的调用次数')
+    parser.add_argument('args', nargs='*', default=['check'], help='Django 命令及其参数')
+    args = parser.parse_args()
+
+    with sandbox() as address:
+        make_db(_conf.DBToINIAddress.ADM, data={'Global': {'profile': ''}, 'Logging': {'number': 5, 'level': 'INFO'}})
+        runtime = os.path.join(_conf.Folder.TEMP, 'daemon.json')
+
+        cold = [_run(_COLD, address, runtime, args.args) for _ in range(args.runs)]
+        report('daemon.cold', command=args.args, runs=args.runs, seconds=round(statistics.median(cold), 4))
+
+        with timer() as t:
+            server = subprocess.Popen([sys.executable, '-c', _SERVE, address, runtime], cwd=_BIN)
+            while daemon._connect(runtime) is None:
+                if server.poll() is not None:
+                    sys.exit('守护进程未能启动')
+        report('daemon.startup', seconds=round(t['seconds'], 4))
+
+        try:
+            forwarded = [_run(_FORWARD, address, runtime, args.args) for _ in range(args.runs)]
+            report('daemon.forwarded', command=args.args, runs=args.runs,
+                   seconds=round(statistics.median(forwarded), 4),
+                   speedup=round(statistics.median(cold) / statistics.median(forwarded), 1))
+
+            with timer() as t:
+                for _ in range(args.calls):
+                    connection = daemon._connect(runtime)
+                    with connection:
+                        daemon._request(connection, 'ping', [])
+            report('daemon.roundtrip', calls=args.calls, ms_per_call=round(t['seconds'] / args.calls * 1000, 3))
+        finally:
+            connection = daemon._connect(runtime)
+            if connection is not None:
+                with connection:
+                    daemon._request(connection, 'stop', [])
+            server.wait(10)
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# 重复文件检测的基准测试
+#
+# 生成一个包含受控重复文件的目录树，依次测试::
+#
+#     1. 首次检测，需要读取部分哈希与完整哈希
+#     #. 再次检测，所有哈希均来自数据库
+#
+# 目录树中包含如下几类文件::
+#
+#     unique     互不相同的文件，大小也各不相同
+#     copies     unique 文件的副本，位于其他文件夹
+#     decoys     与 unique 文件大小相同，但头部不同，在第二阶段被排除
+#     twins      与 unique 文件头部与尾部相同，但中部不同，在第三阶段被排除
+
+import os
+import random
+import argparse
+
+from core.file import duplicate
+
+from . import report, sandbox, timer
+
+
+def generate(root: str, unique: int, copies: int, decoys: int, twins: int, *, seed=0) -> int:
+    """
+    生成测试目录树
+
+    :return:
+        预期的重复分组数目
+    """
+    rng = random.Random(seed)
+    originals = []
+    for index in range(unique):
+        folder = os.path.join(root, 'library', f"Series {index // 12:03d}")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"[Group] Series {index // 12:03d} - {index % 12 + 1:02d} [1080p].mkv")
+        data = rng.randbytes(256 * 1024 + index * 127)  # 大小互不相同
+        with open(path, mode='wb') as fp:
+            fp.write(data)
+        originals.append((path, data))
+
+    def place(kind: str, index: int, data: bytes):
+        folder = os.path.join(root, kind, f"{index % 7}")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"{kind}_{index}.mkv"), mode='wb') as fp:
+            fp.write(data)
+        return
+
+    duplicated = set()
+    for index in range(copies):
+        source = rng.randrange(unique)
+        duplicated.add(source)
+        place('copies', index, originals[source][1])
+
+    for index in range(decoys):
+        data = bytearray(originals[rng.randrange(unique)][1])
+        data[:8] = rng.randbytes(8)
+        place('decoys', index, bytes(data))
+
+    for index in range(twins):
+        data = bytearray(originals[rng.randrange(unique)][1])
+        data[len(data) // 2:len(data) // 2 + 8] = rng.randbytes(8)
+        place('twins', index, bytes(data))
+
+    return len(duplicated)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='重复文件检测的基准测试')
+    parser.add_argument('--unique', type=int, default=1000, help='互不相同的文件数目')
+    parser.add_argument('--copies', type=int, default=100, help='副本数目')
+    parser.add_argument('--decoys', type=int, default=100, help='大小相同但头部不同的文件数目')
+    parser.add_argument('--twins', type=int, default=50, help='头尾相同但中部不同的文件数目')
+    args = parser.parse_args()
+
+    with sandbox() as address:
+        root = os.path.join(address, 'tree')
+        with timer() as t:
+            expected = generate(root, args.unique, args.copies, args.decoys, args.twins)
+        total = sum(entry.stat().st_size for entry in duplicate.walk([root]))
+        report('duplicate.generate', files=args.unique + args.copies + args.decoys + args.twins,
+               bytes=total, seconds=round(t['seconds'], 4))
+
+        finder = duplicate.DuplicateFinder(block_size=64 * 1024)
+        for name in ('cold', 'incremental'):
+            with timer() as t:
+                groups = finder.find([root])
+            if len(groups) != expected:
+                raise AssertionError(f"预期 {expected} 个重复分组，但是检测到了 {len(groups)} 个")
+            report(f"duplicate.{name}", total_bytes=total, read_ratio=round(finder.stats['bytes_read'] / total, 4),
+                   seconds=round(t['seconds'], 4), **finder.stats)
+    return
+
+
+if __name__ == '__main__':
+    main()
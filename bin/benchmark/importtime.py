@@ -0,0 +1,95 @@
+# 启动导入耗时的回归检查
+#
+# 在子进程中使用 -X importtime 运行启动层的正常路径 (导入 common 并通过环境检查)，
+# 以下任一情况都会以非零状态码退出::
+#
+#     1. 正常路径导入了只应在异常或提示时使用的模块，例如 tkinter
+#     #. 导入耗时的中位数超过基准值的 (1 + tolerance) 倍再加上 slack
+#
+# 基准值储存在同目录的 importtime.json 中，有意的变化后使用 --update 更新
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+from . import report
+
+
+_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'importtime.json')
+_BIN = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_HAPPY_PATH = (
+    "import sys, common\n"
+    "common.check_venv()\n"
+    "if sys.platform == 'win32' and sys.maxsize > 2 ** 32:\n"  # 其他平台会显示警告窗口，不属于正常路径
+    "    common.check_environ()\n"
+)
+_FORBIDDEN = ('tkinter', '_tkinter', 'webbrowser')  #: 正常路径中不应导入的模块
+
+
+def _importtime(module: str) -> tuple[int, set[str]]:
+    """
+    运行一次正常路径
+
+    :return:
+        module 的累计导入耗时 (微秒) 与导入的所有模块
+    :rtype: tuple[int, set[str]]
+    """
+    env = dict(os.environ, VIRTUAL_ENV=os.environ.get('VIRTUAL_ENV', sys.prefix))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', _HAPPY_PATH],
+                            cwd=_BIN, env=env, capture_output=True, text=True, check=True)
+    cumulative = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, total, name = line.removeprefix('import time:').split('|')
+        modules.add(name.strip())
+        if name.strip() == module and len(name) - len(name.lstrip()) == 1:  # 顶层导入
+            cumulative = int(total)
+    return cumulative, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description='启动导入耗时的回归检查')
+    parser.add_argument('--runs', type=int, default=7, help='运行次数，取中位数')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='允许超过基准值的比例')
+    parser.add_argument('--slack', type=int, default=3000, help='额外允许的耗时 (微秒)，避免噪声导致的误报')
+    parser.add_argument('--update', action='store_true', help='将本次结果写入基准值')
+    args = parser.parse_args()
+
+    _importtime('common')  # 预热，确保字节码缓存已经生成
+    samples = []
+    imported = set()
+    for _ in range(args.runs):
+        cumulative, modules = _importtime('common')
+        samples.append(cumulative)
+        imported |= modules
+    median = round(statistics.median(samples))
+    forbidden = sorted(imported.intersection(_FORBIDDEN))
+
+    try:
+        with open(_BASELINE, encoding='utf8') as fp:
+            baseline = json.load(fp)['common']
+    except FileNotFoundError:
+        baseline = None
+    limit = None if baseline is None else round(baseline * (1 + args.tolerance) + args.slack)
+    report('importtime.common', median_us=median, min_us=min(samples), baseline_us=baseline, limit_us=limit,
+           modules=len(imported), forbidden=forbidden)
+
+    if args.update:
+        with open(_BASELINE, encoding='utf8', mode='w') as fp:
+            json.dump({'common': median}, fp, indent=4)
+            fp.write('\n')
+    if forbidden:
+        sys.exit(f"正常路径导入了 {', '.join(forbidden)}")
+    if limit is not None and median > limit and not args.update:
+        sys.exit(f"导入耗时 {median} us 超过了上限 {limit} us (基准值 {baseline} us)")
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# 任务调度的基准测试
+#
+#     overhead   提交并执行大量空任务的单个任务耗时 (微秒)，与直接使用 ThreadPoolExecutor 比较
+#     latency    已有大量低优先级任务在等待时，新提交的高优先级任务开始执行前的等待时间，
+#                与 ThreadPoolExecutor 的先进先出队列比较
+
+import time
+import argparse
+import threading
+import concurrent.futures
+
+from core.base import jobs as _jobs
+
+from . import report, timer
+
+
+def _noop():
+    return
+
+
+def _overhead(count: int, workers: int):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        with timer() as t:
+            futures = [executor.submit(_noop) for _ in range(count)]
+            concurrent.futures.wait(futures)
+    report('jobs.overhead.executor', jobs=count, us_per_job=round(t['seconds'] / count * 1e6, 2))
+
+    with _jobs.Scheduler(io_workers=workers) as scheduler:
+        with timer() as t:
+            submitted = [scheduler.submit(_noop) for _ in range(count)]
+            for job in submitted:
+                job.result()
+    report('jobs.overhead.scheduler', jobs=count, us_per_job=round(t['seconds'] / count * 1e6, 2))
+    return
+
+
+def _latency(queued: int, workers: int, duration: float):
+    def work():
+        time.sleep(duration)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for _ in range(queued):
+            executor.submit(work)
+        started = threading.Event()
+        submitted = time.perf_counter()
+        executor.submit(started.set)
+        started.wait()
+        waited = time.perf_counter() - submitted
+        executor.shutdown(wait=True, cancel_futures=True)
+    report('jobs.latency.executor', queued=queued, waited_seconds=round(waited, 4))
+
+    with _jobs.Scheduler(io_workers=workers) as scheduler:
+        for _ in range(queued):
+            scheduler.submit(work, priority=_jobs.LOW)
+        started = threading.Event()
+        submitted = time.perf_counter()
+        scheduler.submit(started.set, priority=_jobs.HIGH)
+        started.wait()
+        waited = time.perf_counter() - submitted
+        scheduler.shutdown(wait=True, cancel=True)
+    report('jobs.latency.scheduler', queued=queued, waited_seconds=round(waited, 4))
+    return
+
+
+def main():
+    parser = argparse.ArgumentParser(description='任务调度的基准测试')
+    parser.add_argument('--jobs', type=int, default=20000, help='测试调度开销时的任务数目')
+    parser.add_argument('--workers', type=int, default=4, help='线程池的大小')
+    parser.add_argument('--queued', type=int, default=200, help='测试等待时间时已在等待的低优先级任务数目')
+    parser.add_argument('--duration', type=float, default=0.01, help='低优先级任务的耗时 (秒)')
+    args = parser.parse_args()
+
+    _overhead(args.jobs, args.workers)
+    _latency(args.queued, args.workers, args.duration)
+    return
+
+
+if __name__ == '__main__':
+    main()
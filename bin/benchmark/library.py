@@ -0,0 +1,318 @@
+# 合成的大型媒体库
+#
+# 生成一个由稀疏文件构成的媒体库目录树，并写入对应的 library 数据库，
+# 供扫描、搜索与网站的基准测试在没有真实媒体的普通 Linux 机器上以 1 万、10 万与 100 万个文件的规模运行::
+#
+#     fansub    [Group] Title - 01 [1080p][ABCD1234].mkv，附带 .sc.ass 与 .tc.ass 字幕
+#     scene     Title.S01E01.1080p.WEB-DL.AAC2.0.H.264-GROUP.mkv，附带 .en.srt 字幕
+#     plain     Title/Season 1/Title - S01E01 - Episode 1.mp4，附带 .zh.srt 字幕
+#     bd        Title/BD/Title Vol.1/BDMV/STREAM/00000.m2ts 等原盘目录结构
+#
+# 部分剧集在 Downloads 文件夹中有一个相同的副本，并在数据库中登记为同一剧集的第二个文件
+#
+# 文件均通过 truncate 生成，内容全为零，不占用磁盘空间，除副本外大小互不相同，
+# 因此重复文件检测只会找到这些副本；修改时间与数据库中登记的一致，扫描时均视为未变化
+#
+# 在沙盒中运行时依次测试生成、写入数据库与遍历目录树的耗时，
+# 使用 --output 时将目录树与 library.db 保存至该文件夹::
+#
+#     python -m benchmark.library --scales 10k 100k
+#     python -m benchmark.library --scales 1m --output /srv/adm_library
+
+import os
+import time
+import random
+import sqlite3
+import argparse
+
+from core.base import database
+from core.data import library as _library
+from core.file import duplicate
+
+from . import report, sandbox, timer
+
+
+__all__ = [
+    "SCALES",
+    "STYLES",
+    "layout",
+    "write",
+    "populate",
+    "generate"
+]
+
+
+SCALES = {  #: 规模名称与文件数目
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000
+}
+STYLES = ('fansub', 'scene', 'plain')  #: 非原盘系列的命名风格
+
+_GROUPS = ('Nekomoe', 'Sakurato', 'LoliHouse', 'VCB-Studio', 'Airota', 'DMG', 'SweetSub', 'Lilith-Raws',
+           'NTb', 'FLUX', 'SMURF', 'CMRG', 'EDITH', 'GGEZ')
+_WORDS = ('Silver', 'Spring', 'Shadow', 'Garden', 'Star', 'Blue', 'Hidden', 'Summer', 'Iron', 'Crimson',
+          'Little', 'Last', 'Winter', 'Dragon', 'Tale', 'Academy', 'Witch', 'Knight', 'Ocean', 'Echo',
+          'Night', 'Moon', 'Journey', 'Machine', 'City', 'Forest', 'Song', 'Detective', 'Railway', 'Festival',
+          'Paper', 'Glass', 'Lantern', 'Frontier', 'Harbor', 'Signal', 'Orbit', 'Violet', 'Tower', 'Archive')
+_CJK = ('ひだまり', 'スケッチ', '物語', '日常', '青春', '魔法', '少女', '探偵', '異世界', '学園',
+        '星空', '四月', '君の', '恋', '夏', '冒険', '銀河', '鉄道', '花', '旅')
+_RESOLUTIONS = ('720p', '1080p', '1080p', '2160p')
+_SEASON = (12, 13, 24, 26)
+_MIB = 1 << 20
+_YEAR = 365 * 24 * 3600
+_EPOCH = 1_700_000_000  #: 修改时间的上限，使生成的结果与运行的时间无关
+
+
+def _title(rng: random.Random, used: set[str], index: int) -> str:
+    if rng.random() < 0.2:
+        title = ''.join(rng.sample(_CJK, rng.randint(2, 3)))
+    else:
+        title = ' '.join(rng.sample(_WORDS, rng.randint(1, 3)))
+    if title in used:
+        title = f"{title} {index}"
+    used.add(title)
+    return title
+
+
+def layout(files: int, *, series=None, subtitles=0.3, bd=0.05, duplicates=0.02, styles=STYLES, seed=0
+           ) -> dict[str, list[tuple]]:
+    """
+    规划媒体库的内容，相同的参数总是返回相同的结果
+
+    :param files:
+        文件总数，包括字幕、原盘的元数据与副本，每个系列的最后一集或最后一张原盘会使实际数目略多
+    :param series:
+        系列数目，默认为 None，即平均每个系列约 30 个文件，仅限关键字
+    :param subtitles:
+        附带字幕的剧集比例，仅限关键字
+    :param bd:
+        原盘系列的比例，仅限关键字
+    :param duplicates:
+        在 Downloads 中有副本的剧集比例，仅限关键字
+    :param styles:
+        非原盘系列使用的命名风格，参考 STYLES，仅限关键字
+    :param seed:
+        随机数种子，仅限关键字
+
+    :type files: int
+    :type series: int | None
+    :type subtitles: float
+    :type bd: float
+    :type duplicates: float
+    :type styles: tuple[str, ...]
+    :type seed: int
+
+    :return:
+        series 为 (编号, 标题, 年份) 的列表，episodes 为 (编号, 系列, 季, 集数, 标题) 的列表，
+        files 为 (相对地址, 大小, 修改时间, 剧集编号) 的列表，字幕与原盘的元数据的剧集编号为 None
+    :rtype: dict[str, list[tuple]]
+    """
+    rng = random.Random(seed)
+    titles: set[str] = set()
+    sizes: set[int] = set()
+    result = {'series': [], 'episodes': [], 'files': []}
+    count = max(1, min(files, series or files // 30))
+
+    def add(path: str, low: int, high: int, episode=None):
+        size = rng.randrange(low, high)
+        while size in sizes:
+            size += 1
+        sizes.add(size)
+        result['files'].append((path, size, _EPOCH - rng.randrange(3 * _YEAR), episode))
+        return
+
+    for index in range(count):
+        quota = len(result['files']) + files * (index + 1) // count - files * index // count
+        title = _title(rng, titles, index)
+        group = rng.choice(_GROUPS)
+        resolution = rng.choice(_RESOLUTIONS)
+        per_season = rng.choice(_SEASON)
+        result['series'].append((index + 1, title, 1990 + rng.randrange(36)))
+
+        if rng.random() < bd:
+            per_disc = rng.randint(2, 4)
+            number = 0
+            while len(result['files']) < quota:
+                disc = os.path.join(title, 'BD', f"{title} Vol.{number // per_disc + 1}", 'BDMV')
+                for name in ('index.bdmv', 'MovieObject.bdmv', os.path.join('PLAYLIST', '00000.mpls')):
+                    add(os.path.join(disc, name), 100, 64 * 1024)
+                for clip in range(per_disc):
+                    episode = len(result['episodes']) + 1
+                    result['episodes'].append((episode, index + 1, number // per_season + 1,
+                                               number % per_season + 1, f"Episode {number + 1}"))
+                    add(os.path.join(disc, 'CLIPINF', f"{clip:05d}.clpi"), 100, 64 * 1024)
+                    add(os.path.join(disc, 'STREAM', f"{clip:05d}.m2ts"), 4096 * _MIB, 8192 * _MIB, episode)
+                    number += 1
+            continue
+
+        style = rng.choice(styles)
+        dotted = title.replace(' ', '.')
+        number = 0
+        while len(result['files']) < quota:
+            season, episode_number = number // per_season + 1, number % per_season + 1
+            episode = len(result['episodes']) + 1
+            result['episodes'].append((episode, index + 1, season, episode_number, f"Episode {number + 1}"))
+            if style == 'fansub':
+                folder = os.path.join(title, f"[{group}] {title} [{resolution}]")
+                stem = f"[{group}] {title} - {number + 1:02d} [{resolution}][{rng.getrandbits(32):08X}]"
+                name, suffixes = f"{stem}.mkv", ('.sc.ass', '.tc.ass')
+            elif style == 'scene':
+                folder = os.path.join(title, f"Season {season:02d}")
+                stem = f"{dotted}.S{season:02d}E{episode_number:02d}.{resolution}.WEB-DL.AAC2.0.H.264-{group.upper()}"
+                name, suffixes = f"{stem}.mkv", ('.en.srt',)
+            else:
+                folder = os.path.join(title, f"Season {season}")
+                stem = f"{title} - S{season:02d}E{episode_number:02d} - Episode {number + 1}"
+                name, suffixes = f"{stem}.mp4", ('.zh.srt',)
+            add(os.path.join(folder, name), 200 * _MIB, 2048 * _MIB, episode)
+            video = result['files'][-1]
+            if rng.random() < subtitles:
+                for suffix in suffixes:
+                    add(os.path.join(folder, f"{stem}{suffix}"), 20 * 1024, 2 * _MIB)
+            if rng.random() < duplicates:
+                result['files'].append((os.path.join('Downloads', group, name), *video[1:]))
+            number += 1
+    return result
+
+
+def write(root: str, plan: dict[str, list[tuple]]) -> int:
+    """
+    在 root 下创建 :func:`layout` 规划的稀疏文件，已存在的文件会被覆盖
+
+    :type root: str
+    :type plan: dict[str, list[tuple]]
+
+    :return:
+        所有文件的表观总大小
+    :rtype: int
+    """
+    folders = set()
+    total = 0
+    for path, size, mtime, _ in plan['files']:
+        path = os.path.join(root, path)
+        folder = os.path.dirname(path)
+        if folder not in folders:
+            os.makedirs(folder, exist_ok=True)
+            folders.add(folder)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0))
+        try:
+            os.ftruncate(fd, size)
+        finally:
+            os.close(fd)
+        os.utime(path, (mtime, mtime))
+        total += size
+    return total
+
+
+def populate(root: str, plan: dict[str, list[tuple]], *, name='library'):
+    """
+    将 :func:`layout` 规划的系列、剧集与文件写入媒体库数据库，文件的地址为 root 下的绝对地址
+
+    :param root:
+        :func:`write` 使用的根目录
+    :param plan:
+        :func:`layout` 的返回值
+    :param name:
+        媒体库的数据库名称，仅限关键字
+
+    :type root: str
+    :type plan: dict[str, list[tuple]]
+    :type name: str
+    """
+    root = os.path.abspath(root)
+    target = _library.Library(database=name)
+    now = time.time()
+    with database.transaction(name) as connection:
+        connection.executemany("INSERT INTO series (id, title, year, added) VALUES (?, ?, ?, ?)",
+                               ((*row, now) for row in plan['series']))
+        connection.executemany("INSERT INTO episode (id, series, season, number, title) VALUES (?, ?, ?, ?, ?)",
+                               plan['episodes'])
+        connection.executemany("INSERT INTO media_file (episode, path, size, mtime) VALUES (?, ?, ?, ?)",
+                               ((episode, os.path.join(root, path), size, mtime)
+                                for path, size, mtime, episode in plan['files'] if episode is not None))
+    target.bump(row[0] for row in plan['series'])
+    return
+
+
+def generate(root: str, files: int, *, name='library', **kwargs) -> dict[str, list[tuple]]:
+    """
+    规划、创建并登记媒体库，参数参考 :func:`layout` 与 :func:`populate`
+
+    :type root: str
+    :type files: int
+    :type name: str
+
+    :return:
+        :func:`layout` 的返回值
+    :rtype: dict[str, list[tuple]]
+    """
+    plan = layout(files, **kwargs)
+    write(root, plan)
+    populate(root, plan, name=name)
+    return plan
+
+
+def _usage(root: str) -> tuple[int, int]:
+    """
+    返回目录树中的文件数目与实际占用的磁盘空间
+    """
+    count = blocks = 0
+    for entry in duplicate.walk([root]):
+        count += 1
+        blocks += getattr(entry.stat(follow_symlinks=False), 'st_blocks', 0)
+    return count, blocks * 512
+
+
+def _run(name: str, files: int, args: argparse.Namespace, root: str):
+    with timer() as t:
+        plan = layout(files, series=args.series, subtitles=args.subtitles, bd=args.bd,
+                      duplicates=args.duplicates, seed=args.seed)
+    size = {'scale': name, 'files': len(plan['files'])}
+    report('library.layout', **size, series=len(plan['series']), episodes=len(plan['episodes']),
+           seconds=round(t['seconds'], 3))
+
+    with timer() as t:
+        total = write(root, plan)
+    report('library.write', **size, apparent_gib=round(total / (1 << 30), 1), seconds=round(t['seconds'], 3),
+           files_per_second=round(len(plan['files']) / t['seconds']))
+
+    with timer() as t:
+        populate(root, plan)
+    report('library.populate', **size, rows=sum(episode is not None for *_, episode in plan['files']),
+           seconds=round(t['seconds'], 3))
+
+    with timer() as t:
+        count, usage = _usage(root)
+    report('library.scan', **size, found=count, disk_mib=round(usage / _MIB, 1), seconds=round(t['seconds'], 3),
+           files_per_second=round(count / t['seconds']))
+    return
+
+
+def main():
+    parser = argparse.ArgumentParser(description='合成的大型媒体库')
+    parser.add_argument('--scales', nargs='+', choices=SCALES, default=['10k', '100k'], help='生成的规模')
+    parser.add_argument('--series', type=int, default=None, help='系列数目，默认平均每个系列约 30 个文件')
+    parser.add_argument('--subtitles', type=float, default=0.3, help='附带字幕的剧集比例')
+    parser.add_argument('--bd', type=float, default=0.05, help='原盘系列的比例')
+    parser.add_argument('--duplicates', type=float, default=0.02, help='在 Downloads 中有副本的剧集比例')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子')
+    parser.add_argument('--output', default=None, help='保存目录树与 library.db 的文件夹，只能指定一个规模')
+    args = parser.parse_args()
+    if args.output is not None and len(args.scales) != 1:
+        parser.error('--output 只能与一个规模一起使用')
+
+    for name in args.scales:
+        with sandbox() as address:
+            root = os.path.join(address, 'media') if args.output is None else os.path.join(args.output, 'media')
+            _run(name, SCALES[name], args, root)
+            if args.output is not None:
+                target = sqlite3.connect(os.path.join(args.output, 'library.db'))
+                with target:
+                    database.connect('library').backup(target)
+                target.close()
+    return
+
+
+if __name__ == '__main__':
+    main()
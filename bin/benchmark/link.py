@@ -0,0 +1,85 @@
+# 链接整理的基准测试
+#
+# 使用 benchmark.organise 生成杂乱的下载目录，以硬链接构成 "系列/Season 1/文件名" 的视图，依次测试::
+#
+#     1. 首次同步 (创建所有链接) 与再次同步 (无变化)
+#     #. 检查所有链接
+#     #. 制造各类损坏后检查修复结果::
+#
+#            missing   链接被删除，应重新创建
+#            stale     源文件被重新下载，应指向新的源文件
+#            user      链接被用户的文件替换，应保留用户的文件并计为冲突
+#            orphan    源文件被删除且链接是唯一的副本，应保留
+#            extra     源文件被删除但仍有其他硬链接，应删除链接
+
+import os
+import argparse
+
+from core.file import transfer
+from core.rule import link
+
+from . import organise, report, sandbox, timer
+
+
+def _read(path: str) -> bytes:
+    with open(path, mode='rb') as fp:
+        return fp.read()
+
+
+def _check(condition: bool, message: str):
+    if not condition:
+        raise AssertionError(message)
+    return
+
+
+def main():
+    parser = argparse.ArgumentParser(description='链接整理的基准测试')
+    parser.add_argument('--files', type=int, default=5000, help='源文件数目')
+    args = parser.parse_args()
+
+    with sandbox() as address:
+        downloads = os.path.join(address, 'downloads')
+        library = os.path.join(address, 'library')
+        organise.generate(downloads, args.files, 4096)
+        tree = link.LinkTree('benchmark', organise.rule(library), root=library, mode=transfer.HARDLINK)
+
+        for name in ('cold', 'unchanged'):
+            with timer() as t:
+                stats = tree.sync([downloads])
+            report(f"link.sync.{name}", **stats, seconds=round(t['seconds'], 4))
+
+        with timer() as t:
+            broken = tree.verify()
+        _check(not broken, f"同步后存在 {len(broken)} 个损坏的链接")
+        report('link.verify', links=len(tree.links()), seconds=round(t['seconds'], 4))
+
+        links = sorted(tree.links().items())
+        cases = dict(zip(('missing', 'stale', 'user', 'orphan', 'extra'), links))
+        os.remove(cases['missing'][0])
+        src = cases['stale'][1][0]
+        os.remove(src)
+        with open(src, mode='wb') as fp:
+            fp.write(b'redownloaded')
+        os.remove(cases['user'][0])
+        with open(cases['user'][0], mode='wb') as fp:
+            fp.write(b'user file')
+        os.remove(cases['orphan'][1][0])
+        os.link(cases['extra'][1][0], os.path.join(address, 'extra'))
+        os.remove(cases['extra'][1][0])
+
+        with timer() as t:
+            stats = tree.repair()
+        report('link.repair', **stats, seconds=round(t['seconds'], 4))
+
+        _check(os.path.samefile(cases['missing'][1][0], cases['missing'][0]), 'missing: 链接未被重新创建')
+        _check(_read(cases['stale'][0]) == b'redownloaded', 'stale: 链接未指向新的源文件')
+        _check(_read(cases['user'][0]) == b'user file', 'user: 用户的文件被替换')
+        _check(os.path.exists(cases['orphan'][0]), 'orphan: 唯一的副本被删除')
+        _check(not os.path.exists(cases['extra'][0]), 'extra: 仍有其他硬链接的孤立链接未被删除')
+        _check(stats == {'broken': 5, 'relinked': 2, 'removed': 1, 'kept': 1, 'conflicts': 1},
+               f"修复的统计信息错误: {stats}")
+    return
+
+
+if __name__ == '__main__':
+    main()
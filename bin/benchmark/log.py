@@ -0,0 +1,93 @@
+# 日志吞吐量的基准测试
+#
+# 多个线程同时写入日志，比较两种方式::
+#
+#     inline  轮转文件处理器直接挂载在根日志记录器上，记录日志的线程直接写入文件
+#     queue   core.base.logging 的队列方式，文件写入由监听线程完成
+#
+# 记录日志的线程的吞吐量与单次调用的延迟反映了日志对热点路径的影响，
+# flushed 为所有记录均写入文件时的总耗时
+
+import time
+import logging
+import argparse
+import threading
+import statistics
+import logging.handlers
+
+from core.base import conf as _conf
+from core.base import logging as _log
+
+from . import report, sandbox, timer
+
+
+def _worker(logger: logging.Logger, count: int, barrier: threading.Barrier, latencies: list):
+    samples = []
+    barrier.wait()
+    for index in range(count):
+        if index % 64 == 0:
+            start = time.perf_counter_ns()
+            logger.info('record %d from %s', index, 'worker')
+            samples.append(time.perf_counter_ns() - start)
+        else:
+            logger.info('record %d from %s', index, 'worker')
+    latencies.extend(samples)
+    return
+
+
+def _run(mode: str, threads: int, count: int, number: int, size: int):
+    root = logging.getLogger()
+    if mode == 'inline':
+        handler = logging.handlers.RotatingFileHandler(f"{_conf.Folder.LOGS}/inline.log", maxBytes=size,
+                                                       backupCount=number, encoding='utf8')
+        handler.setFormatter(logging.Formatter(_log.FORMAT))
+        root.addHandler(handler)
+        root.setLevel(logging.INFO)
+    else:
+        _log.setup(number=number, level=logging.INFO, size=size)
+
+    latencies = []
+    barrier = threading.Barrier(threads + 1)
+    workers = [threading.Thread(target=_worker, args=(logging.getLogger(f"benchmark.{index}"), count,
+                                                      barrier, latencies))
+               for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    with timer() as flushed:
+        with timer() as logged:
+            barrier.wait()
+            for worker in workers:
+                worker.join()
+        if mode == 'inline':
+            root.removeHandler(handler)
+            handler.close()
+        else:
+            _log.shutdown()
+
+    records = threads * count
+    latencies.sort()
+    report(f"log.{mode}", threads=threads, records=records,
+           logged_per_second=round(records / logged['seconds']),
+           flushed_seconds=round(flushed['seconds'], 4),
+           p50_us=round(statistics.median(latencies) / 1000, 2),
+           p99_us=round(latencies[int(len(latencies) * 0.99)] / 1000, 2))
+    return
+
+
+def main():
+    parser = argparse.ArgumentParser(description='日志吞吐量的基准测试')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8, 32], help='线程数目')
+    parser.add_argument('--records', type=int, default=200000, help='每次测试的日志总数')
+    parser.add_argument('--number', type=int, default=5, help='保留的旧日志文件数目')
+    parser.add_argument('--size', type=int, default=4 * 1024 * 1024, help='单个日志文件的大小上限 (字节)')
+    args = parser.parse_args()
+
+    with sandbox():
+        for threads in args.threads:
+            for mode in ('inline', 'queue'):
+                _run(mode, threads, args.records // threads, args.number, args.size)
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# 运行指标的基准测试
+#
+# 比较单次记录的开销 (纳秒)::
+#
+#     locked     使用一把锁保护的计数器，作为对照
+#     counter    按线程分片的 Counter.inc
+#     histogram  按线程分片的 Histogram.observe
+#
+# 每种方式分别在 1 个与多个线程中同时记录，最后测试生成 /metrics 文本的耗时
+
+import time
+import argparse
+import threading
+
+from core.base import metrics as _metrics
+
+from . import report, timer
+
+
+class _LockedCounter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+def _run(func, threads: int, calls: int) -> float:
+    """
+    返回所有线程同时调用 calls 次 func 时的单次调用耗时 (纳秒)
+    """
+    barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        barrier.wait()
+        for _ in range(calls):
+            func(0.01)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for item in workers:
+        item.start()
+    start = time.perf_counter_ns()
+    barrier.wait()
+    for item in workers:
+        item.join()
+    return (time.perf_counter_ns() - start) / (threads * calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='运行指标的基准测试')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8], help='线程数目')
+    parser.add_argument('--calls', type=int, default=200000, help='每个线程的调用次数')
+    parser.add_argument('--metrics', type=int, default=200, help='测试生成文本时的直方图数目')
+    args = parser.parse_args()
+
+    registry = _metrics.Registry()
+    cases = {
+        'locked': _LockedCounter().inc,
+        'counter': registry.counter('benchmark_total').inc,
+        'histogram': registry.histogram('benchmark_seconds').observe,
+    }
+    for threads in args.threads:
+        for name, func in cases.items():
+            report(f"metrics.{name}", threads=threads, ns_per_call=round(_run(func, threads, args.calls), 1))
+
+    for index in range(args.metrics):
+        registry.histogram(f"benchmark_{index}_seconds", 'benchmark', ('label',)).labels('value').observe(0.01)
+    with timer() as t:
+        text = registry.expose()
+    report('metrics.expose', metrics=args.metrics, lines=text.count('\n'), seconds=round(t['seconds'], 4))
+    return
+
+
+if __name__ == '__main__':
+    main()
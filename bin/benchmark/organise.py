@@ -0,0 +1,110 @@
+# 文件整理的基准测试
+#
+# 生成一个杂乱的下载目录，按照 "系列/Season 1/文件名" 的规范整理，依次测试::
+#
+#     1. 计算整理计划与冲突检测
+#     #. 同设备移动 (rename) 与回滚
+#     #. 跨设备移动 (零拷贝复制)，分别使用单线程与多线程
+#
+# 跨设备测试需要使用 --cross 指定一个位于其他设备上的文件夹，例如 /dev/shm
+
+import os
+import re
+import random
+import shutil
+import argparse
+import tempfile
+
+from core.file import transfer
+from core.rule import organise
+
+from . import report, sandbox, timer
+
+
+_NAME = re.compile(r'\[(?P<group>[^]]+)] (?P<series>.+?) - (?P<episode>\d+)')
+
+
+def generate(root: str, files: int, size: int, *, seed=0) -> int:
+    """
+    生成杂乱的下载目录
+
+    :return:
+        生成的总字节数
+    """
+    rng = random.Random(seed)
+    groups = ('Nekomoe', 'Sakurato', 'LoliHouse', 'VCB-Studio')
+    total = 0
+    for index in range(files):
+        folder = os.path.join(root, *(f"batch_{rng.randrange(20)}" for _ in range(rng.randrange(1, 4))))
+        os.makedirs(folder, exist_ok=True)
+        name = f"[{rng.choice(groups)}] Series {index // 24:04d} - {index % 24 + 1:02d} [1080p][{index:08X}].mkv"
+        with open(os.path.join(folder, name), mode='wb') as fp:
+            fp.write(rng.randbytes(size))
+        total += size
+    return total
+
+
+def rule(library: str):
+    """
+    返回将文件整理至 library 下的规则
+    """
+    def _rule(path: str) -> str | None:
+        match = _NAME.match(os.path.basename(path))
+        if match is None:
+            return None
+        return os.path.join(library, match['series'], 'Season 1', os.path.basename(path))
+    return _rule
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文件整理的基准测试')
+    parser.add_argument('--files', type=int, default=5000, help='同设备测试的文件数目')
+    parser.add_argument('--cross', default=None, help='位于其他设备上的文件夹')
+    parser.add_argument('--cross-files', type=int, default=64, help='跨设备测试的文件数目')
+    parser.add_argument('--cross-size', type=int, default=16, help='跨设备测试的文件大小 (MiB)')
+    parser.add_argument('--workers', type=int, default=4, help='跨设备测试的线程数目')
+    args = parser.parse_args()
+
+    with sandbox() as address:
+        downloads = os.path.join(address, 'downloads')
+        library = os.path.join(address, 'library')
+        generate(downloads, args.files, 4096)
+        organiser = organise.Organiser()
+
+        with timer() as t:
+            plan = organise.Plan.from_rule([downloads], rule(library))
+            plan.dry_run()
+        report('organise.plan', operations=len(plan), conflicts=len(plan.conflicts), seconds=round(t['seconds'], 4))
+
+        with timer() as t:
+            run = organiser.execute(plan)
+        report('organise.rename', operations=len(plan), seconds=round(t['seconds'], 4),
+               per_second=round(len(plan) / t['seconds']))
+
+        with timer() as t:
+            organiser.rollback(run)
+        report('organise.rollback', operations=len(plan), seconds=round(t['seconds'], 4))
+
+        if args.cross is None:
+            return
+        if transfer.same_device(address, args.cross):
+            report('organise.cross', skipped=f"'{args.cross}' 与临时文件夹位于同一设备")
+            return
+
+        for workers in (1, args.workers):
+            source = tempfile.mkdtemp(prefix='adm_benchmark_', dir=args.cross)
+            target = os.path.join(address, f"cross_{workers}")
+            try:
+                total = generate(source, args.cross_files, args.cross_size * 1024 * 1024)
+                plan = organise.Plan.from_rule([source], rule(target))
+                with timer() as t:
+                    organise.Organiser(workers=workers).execute(plan)
+                report('organise.cross', workers=workers, operations=len(plan), bytes=total,
+                       seconds=round(t['seconds'], 4), mib_per_second=round(total / 1048576 / t['seconds'], 1))
+            finally:
+                shutil.rmtree(source, ignore_errors=True)
+    return
+
+
+if __name__ == '__main__':
+    main()
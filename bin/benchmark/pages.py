@@ -0,0 +1,67 @@
+# 网站页面缓存的基准测试
+#
+# 使用与 benchmark.api 相同的媒体库，依次渲染媒体库网格的前若干页与随机的系列页面::
+#
+#     cold  清空缓存后的首次渲染
+#     hot   所有页面均命中缓存
+#     scan  模拟扫描修改了部分系列后的渲染，网格页面需要重新渲染，但未变化的卡片与系列页面仍命中缓存
+
+import random
+import argparse
+
+from . import report, sandbox, setup_django, timer
+from .api import fixture
+
+
+def _render(client, urls: list[str]) -> float:
+    with timer() as t:
+        for url in urls:
+            response = client.get(url)
+            if response.status_code != 200:
+                raise AssertionError(f"请求 '{url}' 失败，状态码为 {response.status_code}")
+    return t['seconds']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='网站页面缓存的基准测试')
+    parser.add_argument('--series', type=int, default=20000, help='系列数目')
+    parser.add_argument('--per-series', type=int, default=25, help='每个系列的剧集数目')
+    parser.add_argument('--grid-pages', type=int, default=20, help='渲染的网格页面数目')
+    parser.add_argument('--series-pages', type=int, default=200, help='渲染的系列页面数目')
+    parser.add_argument('--changed', type=int, default=5, help='扫描修改的系列数目')
+    args = parser.parse_args()
+
+    with sandbox():
+        setup_django()
+        from django.core.cache import cache
+        from django.test import Client
+        from website import api
+
+        media = api.get_library()
+        fixture(0, args.series, args.per_series)
+        media.bump()
+        client = Client()
+
+        grid, cursor = [], None
+        for _ in range(args.grid_pages):  # 网格页面的游标需要依次获得
+            grid.append('/library/' + (f"?cursor={cursor}" if cursor else ''))
+            cursor = media.series(cursor)[1]
+        rng = random.Random(0)
+        pages = [f"/library/series/{rng.randrange(args.series)}/" for _ in range(args.series_pages)]
+
+        cache.clear()
+        for phase in ('cold', 'hot', 'scan'):
+            if phase == 'scan':
+                visible = [row['id'] for row in media.series(limit=args.grid_pages * media.page_size)[0]]
+                changed = set(rng.sample(visible, args.changed)) | set(rng.sample(range(args.series), args.changed))
+                for series in changed:
+                    media.add_episode(series, 999, title='New episode')
+            for name, urls in (('grid', grid), ('series', pages)):
+                seconds = _render(client, urls)
+                report(f"pages.{phase}.{name}", pages=len(urls), seconds=round(seconds, 4),
+                       ms_per_page=round(seconds / len(urls) * 1000, 3))
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+# 插件载入的基准测试
+#
+# 在沙盒的插件文件夹中生成若干合成插件，每个插件包含一定数目的函数以模拟导入开销::
+#
+#     cold        首次启动，解析所有插件的清单并写入索引缓存
+#     warm        再次启动，清单均从索引缓存中读取
+#     touch       修改一个插件后启动，只重新解析该插件
+#     eager       启动后立即导入所有插件，即不使用懒加载时的启动耗时
+#     dispatch    第一次调用钩子，只导入实现该钩子的插件
+#
+# 随后测试单次调用的开销 (纳秒)::
+#
+#     direct      直接调用函数
+#     unhooked    没有插件钩住的钩子，调度表为空，直接调用原方法
+#     hooked      被一个插件钩住的钩子
+#     declined    插件不支持当前调用，回退到原方法
+#     dynamic     每次调用时查找插件并解析实现，即没有调度表时的开销
+#
+# 最后比较 heavy 插件在进程池中执行的效果::
+#
+#     stall       插件执行纯 Python 计算时，主线程同时完成的计算量相对空闲时的比例
+#     transfer    向插件传递大缓冲区的耗时，分别使用共享内存与管道
+#     recovery    子进程崩溃或超时后，下一次调用的耗时
+
+import os
+import time
+import timeit
+import argparse
+import threading
+
+from core.base import conf as _conf
+from core.base import plugins as _plugins
+
+from . import report, sandbox, timer
+
+
+def _write_plugins(folder: str, count: int, functions: int):
+    body = '\n'.join(f"def helper_{i}(value):\n    return value + {i}\n" for i in range(functions))
+    for index in range(count):
+        with open(os.path.join(folder, f"plugin_{index}.py"), encoding='utf8', mode='w') as fp:
+            fp.write(f"PLUGIN = {{'version': '0.1.0', 'hooks': {{'benchmark.hook_{index}': 'run'}}}}\n\n"
+                     f"{body}\n"
+                     f"def run(value):\n    return helper_0(value)\n")
+    return
+
+
+_MICRO = """\
+PLUGIN = {'hooks': {'micro.hooked': 'run', 'micro.declined': 'decline'}}
+
+from core.base.conf import PluginsTypeError
+
+
+def run(value):
+    return value
+
+
+def decline(value):
+    raise PluginsTypeError
+"""
+
+
+def _dynamic(registry: _plugins.Registry, point: str, default):
+    """
+    每次调用时查找插件并解析实现的钩子，作为调度表的对照
+    """
+    def wrapper(*args, **kwargs):
+        for plugin in registry.implementations(point):
+            if plugin.error is not None:
+                continue
+            implementation = plugin.resolve(point)
+            if implementation is None:
+                continue
+            try:
+                return implementation(*args, **kwargs)
+            except _conf.PluginsTypeError:
+                continue
+        return default(*args, **kwargs)
+
+    return wrapper
+
+
+def _per_call(func, calls: int) -> float:
+    """
+    返回单次调用的最短耗时 (纳秒)
+    """
+    return min(timeit.repeat(lambda: func(1), number=calls, repeat=5)) / calls * 1e9
+
+
+def _micro(calls: int):
+    folder = os.path.join(_conf.Folder.TEMP, 'micro')
+    os.makedirs(folder)
+    with open(os.path.join(folder, 'micro.py'), encoding='utf8', mode='w') as fp:
+        fp.write(_MICRO)
+    registry = _plugins.Registry()
+    registry.load(folder, cache=os.path.join(folder, 'index.json'))
+
+    def direct(value):
+        return value
+
+    cases = {
+        'direct': direct,
+        'unhooked': _plugins.hook('micro.unhooked', target=registry)(direct),
+        'hooked': _plugins.hook('micro.hooked', target=registry)(direct),
+        'declined': _plugins.hook('micro.declined', target=registry)(direct),
+        'dynamic': _dynamic(registry, 'micro.hooked', direct),
+    }
+    for func in cases.values():  # 导入插件并编译调度表
+        func(1)
+    for name, func in cases.items():
+        report(f"plugins.call.{name}", calls=calls, ns_per_call=round(_per_call(func, calls), 1))
+    return
+
+
+_POOL = """\
+PLUGIN = {'heavy': %s, 'hooks': {'pool.spin': 'spin', 'pool.size': 'size', 'pool.crash': 'crash', 'pool.sleep': 'sleep'}}
+
+import os
+import time
+
+
+def spin(count):
+    total = 0
+    for i in range(count):
+        total += i
+    return total
+
+
+def size(buffer):
+    return len(buffer)
+
+
+def crash():
+    os._exit(1)
+
+
+def sleep(seconds):
+    time.sleep(seconds)
+"""
+
+
+def _pool_registry(name: str, heavy: bool) -> _plugins.Registry:
+    folder = os.path.join(_conf.Folder.TEMP, name)
+    os.makedirs(folder)
+    with open(os.path.join(folder, f"{name}.py"), encoding='utf8', mode='w') as fp:
+        fp.write(_POOL % heavy)
+    registry = _plugins.Registry()
+    registry.load(folder, cache=os.path.join(folder, 'index.json'))
+    return registry
+
+
+def _main_thread_work(seconds: float, stop: threading.Event | None = None) -> int:
+    """
+    在主线程中执行纯 Python 计算，返回完成的次数
+    """
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline and not (stop and stop.is_set()):
+        sum(range(100))
+        count += 1
+    return count
+
+
+def _pool(spin: int, size: int):
+    idle = _main_thread_work(1.0)
+    for name, heavy in (('light', False), ('heavy', True)):
+        registry = _pool_registry(name, heavy)
+        spin_hook = _plugins.hook('pool.spin', _plugins.REPLACE, target=registry)(None)
+        spin_hook(1)  # 导入插件或等待子进程就绪
+
+        done = threading.Event()
+        worker = threading.Thread(target=lambda: (spin_hook(spin), done.set()))
+        with timer() as t:
+            worker.start()
+            count = _main_thread_work(3600, done)
+        worker.join()
+        report(f"plugins.pool.stall.{name}", cpus=len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity')
+               else os.cpu_count(), seconds=round(t['seconds'], 4), main_thread=round(count / t['seconds'] / idle, 3))
+        registry.close()
+
+    registry = _pool_registry('transfer', True)
+    buffer = os.urandom(size)
+    for mode, threshold in (('shared_memory', 1024 * 1024), ('pipe', size + 1)):
+        registry.pool.threshold = threshold
+        size_hook = _plugins.hook('pool.size', _plugins.REPLACE, target=registry)(None)
+        size_hook(b'')
+        with timer() as t:
+            for _ in range(5):
+                assert size_hook(buffer) == size
+        report(f"plugins.pool.transfer.{mode}", bytes=size, seconds=round(t['seconds'] / 5, 4))
+        registry.close()
+
+    registry = _pool_registry('recovery', True)
+    registry.pool.timeout = 0.5
+    crash = _plugins.hook('pool.crash', _plugins.REPLACE, target=registry)(None)
+    sleep = _plugins.hook('pool.sleep', _plugins.REPLACE, target=registry)(None)
+    sleep(0)
+    for name, func, error in (('crash', crash, _plugins.PluginProcessError), ('timeout', lambda: sleep(10), TimeoutError)):
+        try:
+            func()
+        except error:
+            pass
+        with timer() as t:
+            sleep(0)
+        report(f"plugins.pool.recovery.{name}", next_call=round(t['seconds'], 4), **registry.pool.stats)
+    registry.close()
+    return
+
+
+def main():
+    parser = argparse.ArgumentParser(description='插件载入的基准测试')
+    parser.add_argument('--plugins', type=int, default=200, help='插件数目')
+    parser.add_argument('--functions', type=int, default=300, help='每个插件包含的函数数目')
+    parser.add_argument('--calls', type=int, default=200000, help='测试调用开销时的调用次数')
+    parser.add_argument('--spin', type=int, default=20000000, help='heavy 插件的计算量')
+    parser.add_argument('--size', type=int, default=256 * 1024 * 1024, help='传递的缓冲区大小 (字节)')
+    args = parser.parse_args()
+
+    with sandbox():
+        folder = _conf.Folder.PLUGINS
+        _write_plugins(folder, args.plugins, args.functions)
+
+        for phase in ('cold', 'warm', 'touch'):
+            if phase == 'touch':
+                with open(os.path.join(folder, 'plugin_0.py'), encoding='utf8', mode='a') as fp:
+                    fp.write('\n# touched\n')
+            registry = _plugins.Registry()
+            with timer() as t:
+                registry.load()
+            report(f"plugins.{phase}", plugins=args.plugins, parsed=registry.stats['parsed'],
+                   seconds=round(t['seconds'], 4))
+
+        eager = _plugins.Registry()
+        with timer() as t:
+            eager.load()
+            for plugin in eager.plugins():
+                plugin.module
+        report('plugins.eager', plugins=args.plugins, seconds=round(t['seconds'], 4))
+
+        hooked = _plugins.hook('benchmark.hook_1', target=registry)(lambda value: -1)
+        with timer() as t:
+            result = hooked(1)
+        assert result == 1, result
+        report('plugins.dispatch', seconds=round(t['seconds'], 4),
+               loaded=sum(plugin.loaded for plugin in registry.plugins()), timings=registry.timings())
+
+        _micro(args.calls)
+        _pool(args.spin, args.size)
+    return
+
+
+if __name__ == '__main__':
+    main()
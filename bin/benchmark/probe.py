@@ -0,0 +1,213 @@
+# 媒体容器解析的基准测试
+#
+# 生成只有容器头部的稀疏 Matroska 与 MP4 文件，检查解析结果后依次测试::
+#
+#     single  解析单个文件的耗时 (微秒)，分别为头部在文件开始与需要跳转至文件结尾的情况::
+#
+#                 mkv       SeekHead, Info, Tracks 之后为 Cluster
+#                 mkv_tail  Tracks 位于 Cluster 之后，根据 SeekHead 跳转
+#                 mp4       moov 位于 mdat 之前 (faststart)
+#                 mp4_tail  moov 位于 mdat 之后
+#
+#     spawn   作为对照，启动一个外部进程的耗时，安装了 ffprobe 时为 ffprobe 解析同一个文件的耗时
+#     bulk    使用 benchmark.library 生成的媒体库，通过 Prober 分别以不同的进程数目首次与再次 (缓存) 解析所有文件
+
+import os
+import sys
+import shutil
+import struct
+import argparse
+import statistics
+import subprocess
+
+from core.file import probe
+
+from . import library, report, sandbox, timer
+
+
+_VIDEO = {'width': 1920, 'height': 1080}
+_AUDIO = {'channels': 2, 'sample_rate': 48000}
+
+
+def _ebml(element: int, payload: bytes) -> bytes:
+    return element.to_bytes((element.bit_length() + 7) // 8, 'big') + (1 << 56 | len(payload)).to_bytes(8, 'big') + payload
+
+
+def _ebml_uint(element: int, value: int) -> bytes:
+    return _ebml(element, value.to_bytes(8, 'big'))
+
+
+def write_mkv(path: str, size: int, *, duration=1420.0, tail=False) -> dict:
+    """
+    写入稀疏的 Matroska 文件，tail 为 True 时 Tracks 位于 Cluster 之后
+
+    :return:
+        预期的解析结果
+    """
+    header = _ebml(0x1A45DFA3, _ebml_uint(0x4286, 1) + _ebml_uint(0x42F7, 1) + _ebml_uint(0x42F2, 4) +
+                   _ebml_uint(0x42F3, 8) + _ebml(0x4282, b'matroska') + _ebml_uint(0x4287, 4) + _ebml_uint(0x4285, 2))
+    info = _ebml(0x1549A966, _ebml_uint(0x2AD7B1, 1000000) + _ebml(0x4489, struct.pack('>d', duration * 1000)) +
+                 _ebml(0x4D80, b'benchmark'))
+    tracks = _ebml(0x1654AE6B, b''.join((
+        _ebml(0xAE, _ebml_uint(0xD7, 1) + _ebml_uint(0x83, 1) + _ebml(0x86, b'V_MPEGH/ISO/HEVC') +
+              _ebml(0x22B59C, b'und') + _ebml(0xE0, _ebml_uint(0xB0, 1920) + _ebml_uint(0xBA, 1080))),
+        _ebml(0xAE, _ebml_uint(0xD7, 2) + _ebml_uint(0x83, 2) + _ebml(0x86, b'A_FLAC') + _ebml(0x22B59C, b'jpn') +
+              _ebml(0x536E, '立体声'.encode()) + _ebml(0xE1, _ebml(0xB5, struct.pack('>d', 48000.0)) +
+                                                    _ebml_uint(0x9F, 2))),
+        _ebml(0xAE, _ebml_uint(0xD7, 3) + _ebml_uint(0x83, 17) + _ebml(0x86, b'S_TEXT/ASS') +
+              _ebml(0x22B59C, b'chi') + _ebml(0x22B59D, b'zh-Hans') + _ebml_uint(0x88, 0) + _ebml_uint(0x55AA, 1)),
+    )))
+
+    def seek_head(info_position: int, tracks_position: int) -> bytes:
+        return _ebml(0x114D9B74, _ebml(0x4DBB, _ebml(0x53AB, bytes.fromhex('1549A966')) +
+                                       _ebml_uint(0x53AC, info_position)) +
+                     _ebml(0x4DBB, _ebml(0x53AB, bytes.fromhex('1654AE6B')) + _ebml_uint(0x53AC, tracks_position)))
+
+    segment_start = len(header) + 12
+    length = len(seek_head(0, 0))
+    cluster = size - segment_start - length - len(info) - len(tracks) - 12
+    if tail:
+        body = [seek_head(length, length + len(info) + 12 + cluster), info]
+    else:
+        body = [seek_head(length, length + len(info)), info, tracks]
+    with open(path, mode='wb') as fp:
+        fp.write(header + bytes.fromhex('18538067') + (1 << 56 | size - segment_start).to_bytes(8, 'big'))
+        fp.write(b''.join(body) + bytes.fromhex('1F43B675') + (1 << 56 | cluster).to_bytes(8, 'big'))
+        fp.seek(cluster, os.SEEK_CUR)
+        if tail:
+            fp.write(tracks)
+        fp.truncate(size)
+    return {'container': 'matroska', 'duration': duration, **_VIDEO, 'tracks': [
+        {'type': 'video', 'codec': 'V_MPEGH/ISO/HEVC', 'language': 'und', 'name': None, 'default': True,
+         'forced': False, **_VIDEO},
+        {'type': 'audio', 'codec': 'A_FLAC', 'language': 'jpn', 'name': '立体声', 'default': True, 'forced': False,
+         **_AUDIO},
+        {'type': 'subtitle', 'codec': 'S_TEXT/ASS', 'language': 'zh-Hans', 'name': None, 'default': False,
+         'forced': True}]}
+
+
+def _box(kind: bytes, payload: bytes) -> bytes:
+    return (8 + len(payload)).to_bytes(4, 'big') + kind + payload
+
+
+def _trak(handler: bytes, language: str, entry: bytes, duration: int) -> bytes:
+    code = sum((ord(char) - 0x60) << shift for char, shift in zip(language, (10, 5, 0)))
+    return _box(b'trak', _box(b'tkhd', b'\x00\x00\x00\x03' + bytes(72) + (1920 << 16).to_bytes(4, 'big') +
+                              (1080 << 16).to_bytes(4, 'big')) +
+                _box(b'mdia', _box(b'mdhd', bytes(12) + (1000).to_bytes(4, 'big') + duration.to_bytes(4, 'big') +
+                                   code.to_bytes(2, 'big') + bytes(2)) +
+                     _box(b'hdlr', bytes(8) + handler + bytes(12) + b'Handler\x00') +
+                     _box(b'minf', _box(b'stbl', _box(b'stsd', bytes(4) + (1).to_bytes(4, 'big') + entry)))))
+
+
+def write_mp4(path: str, size: int, *, duration=1420.0, tail=False) -> dict:
+    """
+    写入稀疏的 MP4 文件，tail 为 True 时 moov 位于 mdat 之后
+
+    :return:
+        预期的解析结果
+    """
+    length = int(duration * 1000)
+    ftyp = _box(b'ftyp', b'isom' + (512).to_bytes(4, 'big') + b'isomiso2avc1mp41')
+    moov = _box(b'moov', _box(b'mvhd', bytes(12) + (1000).to_bytes(4, 'big') + length.to_bytes(4, 'big') + bytes(80)) +
+                _trak(b'vide', 'und', _box(b'avc1', bytes(6) + (1).to_bytes(2, 'big') + bytes(16) +
+                                           (1920).to_bytes(2, 'big') + (1080).to_bytes(2, 'big') + bytes(50)), length) +
+                _trak(b'soun', 'jpn', _box(b'mp4a', bytes(6) + (1).to_bytes(2, 'big') + bytes(8) +
+                                           (2).to_bytes(2, 'big') + (16).to_bytes(2, 'big') + bytes(4) +
+                                           (48000 << 16).to_bytes(4, 'big')), length) +
+                _trak(b'sbtl', 'chi', _box(b'tx3g', bytes(6) + (1).to_bytes(2, 'big')), length))
+    mdat = size - len(ftyp) - len(moov)
+    with open(path, mode='wb') as fp:
+        fp.write(ftyp if tail else ftyp + moov)
+        fp.write((1).to_bytes(4, 'big') + b'mdat' + mdat.to_bytes(8, 'big'))
+        fp.seek(mdat - 16, os.SEEK_CUR)
+        if tail:
+            fp.write(moov)
+        fp.truncate(size)
+    return {'container': 'mp4', 'duration': duration, **_VIDEO, 'tracks': [
+        {'type': 'video', 'codec': 'avc1', 'language': 'und', 'name': None, 'default': True, 'forced': False,
+         **_VIDEO},
+        {'type': 'audio', 'codec': 'mp4a', 'language': 'jpn', 'name': None, 'default': True, 'forced': False,
+         **_AUDIO},
+        {'type': 'subtitle', 'codec': 'tx3g', 'language': 'chi', 'name': None, 'default': True, 'forced': False}]}
+
+
+_KINDS = {
+    'mkv': (write_mkv, False),
+    'mkv_tail': (write_mkv, True),
+    'mp4': (write_mp4, False),
+    'mp4_tail': (write_mp4, True)
+}
+
+
+def _single(root: str, args: argparse.Namespace):
+    for name, (writer, tail) in _KINDS.items():
+        path = os.path.join(root, f"single_{name}.{name[:3]}")
+        expected = writer(path, args.size << 20, tail=tail)
+        result = probe.probe(path)
+        if result != expected:
+            raise AssertionError(f"{name} 的解析结果错误: {result}")
+        samples = []
+        for _ in range(args.repeat):
+            with timer() as t:
+                probe.probe(path)
+            samples.append(t['seconds'])
+        report('probe.single', kind=name, file_mib=args.size, us_per_file=round(statistics.median(samples) * 1e6, 1))
+
+    ffprobe = shutil.which('ffprobe')
+    if ffprobe is not None:
+        command = [ffprobe, '-v', 'quiet', '-show_format', '-show_streams', os.path.join(root, 'single_mkv.mkv')]
+    else:
+        command = [sys.executable, '-I', '-S', '-c', 'pass']
+    samples = []
+    for _ in range(10):
+        with timer() as t:
+            subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+        samples.append(t['seconds'])
+    report('probe.spawn', command=os.path.basename(command[0]),
+           us_per_file=round(statistics.median(samples) * 1e6, 1))
+    return
+
+
+def _bulk(root: str, args: argparse.Namespace):
+    plan = library.layout(args.files, subtitles=0, seed=args.seed)
+    library.write(root, plan)
+    expected = {}
+    for index, (path, size, *_) in enumerate(plan['files']):
+        path = os.path.join(root, path)
+        if path.endswith('.mkv'):
+            expected[path] = write_mkv(path, size, tail=index % 4 == 0)
+        elif path.endswith('.mp4'):
+            expected[path] = write_mp4(path, size, tail=index % 4 == 0)
+    paths = [os.path.join(root, path) for path, *_ in plan['files']]
+
+    for workers in dict.fromkeys(args.workers):
+        prober = probe.Prober(workers=workers, database=f"probe_{workers}")
+        for name in ('cold', 'cached'):
+            with timer() as t:
+                results = prober.run(paths)
+            wrong = [path for path, info in expected.items() if results[path] != info]
+            if wrong:
+                raise AssertionError(f"{len(wrong)} 个文件的解析结果错误，例如 {wrong[0]}")
+            report(f"probe.bulk.{name}", workers=workers, files=len(paths), parsed=len(expected),
+                   seconds=round(t['seconds'], 3), files_per_second=round(len(paths) / t['seconds']))
+    return
+
+
+def main():
+    parser = argparse.ArgumentParser(description='媒体容器解析的基准测试')
+    parser.add_argument('--size', type=int, default=1400, help='单个文件测试中的文件大小 (MiB)')
+    parser.add_argument('--repeat', type=int, default=1000, help='单个文件测试的重复次数')
+    parser.add_argument('--files', type=int, default=10000, help='媒体库的文件数目')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1], help='进程数目')
+    parser.add_argument('--seed', type=int, default=0, help='生成媒体库的随机数种子')
+    args = parser.parse_args()
+
+    with sandbox() as address:
+        _single(address, args)
+        _bulk(os.path.join(address, 'media'), args)
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+# RSS 订阅轮询的基准测试
+#
+# 启动一个本地的订阅服务器，提供大量条目的合成订阅，依次测试::
+#
+#     1. 首次轮询，需要完整解析所有条目
+#     #. 未更新时的轮询，服务器返回 304
+#     #. 少量更新时的轮询，解析在第一个已知条目处停止
+
+import asyncio
+import argparse
+import threading
+import http.server
+
+from email.utils import formatdate
+
+from core.net import rss
+
+from . import report, sandbox, timer
+
+
+class FeedServer(http.server.ThreadingHTTPServer):
+    """
+    本地的合成订阅服务器
+
+    地址 /feed/<n> 对应第 n 个订阅，其条目由新到旧排列，
+    调用 :meth:`publish` 可以为所有订阅添加新条目
+
+    支持 ETag 与 If-Modified-Since，并记录实际发送的字节数
+    """
+    daemon_threads = True
+
+    def __init__(self, items: int):
+        super().__init__(('127.0.0.1', 0), _FeedHandler)
+        self.items = items
+        self.revision = 0
+        self.bytes_sent = 0
+        self.not_modified = 0
+        self._bodies: dict[tuple[int, int], bytes] = {}
+        self._lock = threading.Lock()
+        return
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def publish(self, count: int):
+        """
+        为所有订阅添加 count 个新条目
+        """
+        with self._lock:
+            self.items += count
+            self.revision += 1
+            self._bodies.clear()
+        return
+
+    def body(self, feed: int) -> bytes:
+        with self._lock:
+            key = (feed, self.items)
+            if key not in self._bodies:
+                lines = ['<?xml version="1.0" encoding="utf-8"?>',
+                         '<rss version="2.0"><channel>',
+                         f'<title>Feed {feed}</title>']
+                for index in range(self.items - 1, -1, -1):
+                    lines.append(f'<item><title>[Group] Anime {feed} - {index:04d} [1080p].mkv</title>'
+                                 f'<guid>feed-{feed}-item-{index}</guid>'
+                                 f'<link>http://example.invalid/{feed}/{index}</link>'
+                                 f'<enclosure url="http://example.invalid/{feed}/{index}.torrent" '
+                                 f'type="application/x-bittorrent" length="{index}"/>'
+                                 f'<pubDate>{formatdate(index * 60.0, usegmt=True)}</pubDate></item>')
+                lines.append('</channel></rss>')
+                self._bodies[key] = '\n'.join(lines).encode('utf8')
+            return self._bodies[key]
+
+
+class _FeedHandler(http.server.BaseHTTPRequestHandler):
+    server: FeedServer
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        try:
+            feed = int(self.path.rsplit('/', maxsplit=1)[1])
+        except ValueError:
+            self.send_error(404)
+            return
+
+        etag = f'"{feed}-{self.server.revision}"'
+        last_modified = formatdate(self.server.revision * 3600.0, usegmt=True)
+        if self.headers.get('If-None-Match') == etag:
+            with self.server._lock:
+                self.server.not_modified += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        body = self.server.body(feed)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/rss+xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', last_modified)
+        self.end_headers()
+        sent = 0
+        try:
+            for start in range(0, len(body), 65536):
+                sent += self.wfile.write(body[start:start + 65536])
+        except (BrokenPipeError, ConnectionResetError):  # 客户端提前停止读取
+            pass
+        with self.server._lock:
+            self.server.bytes_sent += sent
+        return
+
+
+async def _poll_all(poller: rss.Poller) -> int:
+    results = await asyncio.gather(*(poller.poll(feed) for feed in poller.feeds()))
+    return sum(len(items) for items in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='RSS 订阅轮询的基准测试')
+    parser.add_argument('--feeds', type=int, default=50, help='订阅数目')
+    parser.add_argument('--items', type=int, default=5000, help='每个订阅的初始条目数目')
+    parser.add_argument('--publish', type=int, default=10, help='每个订阅新增的条目数目')
+    args = parser.parse_args()
+
+    server = FeedServer(args.items)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with sandbox():
+        poller = rss.Poller(concurrency=16)
+        for feed in range(args.feeds):
+            poller.add(f"{server.url}/feed/{feed}")
+
+        async def run():
+            for name, publish in (('first', 0), ('unchanged', 0), ('update', args.publish)):
+                if publish:
+                    server.publish(publish)
+                bytes_sent, not_modified = server.bytes_sent, server.not_modified
+                with timer() as t:
+                    new_items = await _poll_all(poller)
+                report(f"rss.{name}", feeds=args.feeds, items=server.items, new_items=new_items,
+                       bytes_sent=server.bytes_sent - bytes_sent,
+                       not_modified=server.not_modified - not_modified,
+                       seconds=round(t['seconds'], 4))
+
+        asyncio.run(run())
+
+    server.shutdown()
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+# 视频流的吞吐量测试
+#
+# 在本地服务器上请求媒体库中的文件，分别使用 Python 逐块复制与 sendfile 两种服务器，依次测试::
+#
+#     full     完整下载大文件的吞吐量，单个与多个并发的客户端
+#     seek     随机位置的 1 MiB 范围请求的延迟，模拟播放时的拖动
+#     limit    同一客户端超出并发流数目限制时返回 429
+#
+# 测试前会校验范围请求与条件请求的正确性
+
+import os
+import time
+import random
+import argparse
+import http.client
+import concurrent.futures
+
+from . import report, sandbox, serve, setup_django, timer
+
+
+def _request(port: int, url: str, headers=None) -> tuple[int, dict[str, str], bytes]:
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        connection.request('GET', url, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        connection.close()
+
+
+def _download(port: int, url: str) -> int:
+    """
+    下载但不保存，返回接收的字节数
+    """
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        connection.request('GET', url)
+        response = connection.getresponse()
+        size = 0
+        while chunk := response.read(1024 * 1024):
+            size += len(chunk)
+        return size
+    finally:
+        connection.close()
+
+
+def _verify(port: int, url: str, data: bytes):
+    status, headers, body = _request(port, url)
+    assert status == 200 and body == data, '完整请求的内容错误'
+    status, headers, body = _request(port, url, {'Range': 'bytes=1000-1999'})
+    assert status == 206 and body == data[1000:2000], '范围请求的内容错误'
+    assert headers['Content-Range'] == f"bytes 1000-1999/{len(data)}", '范围请求的 Content-Range 错误'
+    status, _, body = _request(port, url, {'Range': 'bytes=-500'})
+    assert status == 206 and body == data[-500:], '后缀范围请求的内容错误'
+    status, _, _ = _request(port, url, {'Range': f"bytes={len(data)}-"})
+    assert status == 416, '无法满足的范围请求应返回 416'
+    status, _, _ = _request(port, url, {'If-None-Match': headers['ETag']})
+    assert status == 304, '条件请求应返回 304'
+    status, _, body = _request(port, url, {'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+    assert status == 200 and body == data, 'If-Range 不匹配时应返回完整文件'
+    return
+
+
+def main():
+    parser = argparse.ArgumentParser(description='视频流的吞吐量测试')
+    parser.add_argument('--size', type=int, default=2048, help='大文件的大小 (MiB)，使用稀疏文件')
+    parser.add_argument('--clients', type=int, default=4, help='并发下载的客户端数目')
+    parser.add_argument('--seeks', type=int, default=200, help='随机范围请求的数目')
+    parser.add_argument('--limit', type=int, default=4, help='每个客户端的并发流数目')
+    args = parser.parse_args()
+
+    with sandbox() as address:
+        setup_django({'Website': {'stream_limit': str(args.limit)}})
+        from django.core.wsgi import get_wsgi_application
+        from website import api
+
+        media = api.get_library()
+        small = os.path.join(address, 'small.mkv')
+        data = random.Random(0).randbytes(4 * 1024 * 1024 + 123)
+        with open(small, mode='wb') as fp:
+            fp.write(data)
+        large = os.path.join(address, 'large.mkv')
+        with open(large, mode='wb') as fp:
+            fp.truncate(args.size * 1024 * 1024)
+        small_url = f"/stream/{media.add_file(small)}/"
+        large_url = f"/stream/{media.add_file(large)}/"
+        size = args.size * 1024 * 1024
+
+        application = get_wsgi_application()
+        for mode in ('python', 'sendfile'):
+            server = serve(application, workers=args.clients + args.limit + 4, sendfile=mode == 'sendfile')
+            port = server.server_address[1]
+            _verify(port, small_url, data)
+
+            for clients in (1, args.clients):
+                with timer() as t:
+                    with concurrent.futures.ThreadPoolExecutor(max_workers=clients) as executor:
+                        received = sum(executor.map(lambda _: _download(port, large_url), range(clients)))
+                assert received == size * clients, '下载的字节数错误'
+                report(f"stream.full.{mode}", clients=clients, bytes=received, seconds=round(t['seconds'], 4),
+                       mib_per_second=round(received / 1048576 / t['seconds'], 1))
+
+            rng = random.Random(1)
+            latencies = []
+            for _ in range(args.seeks):
+                start = rng.randrange(size - 1024 * 1024)
+                begin = time.perf_counter()
+                status, _, body = _request(port, large_url, {'Range': f"bytes={start}-{start + 1024 * 1024 - 1}"})
+                latencies.append(time.perf_counter() - begin)
+                assert status == 206 and len(body) == 1024 * 1024, '范围请求失败'
+            latencies.sort()
+            report(f"stream.seek.{mode}", requests=len(latencies),
+                   p50_ms=round(latencies[len(latencies) // 2] * 1000, 2),
+                   p99_ms=round(latencies[int(len(latencies) * 0.99)] * 1000, 2))
+
+            held = []
+            for _ in range(args.limit):  # 只读取响应头，占用流
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                connection.request('GET', large_url)
+                response = connection.getresponse()  # 需要保留响应，否则连接会被关闭
+                assert response.status == 200, '未达到限制时请求失败'
+                held.append((connection, response))
+            status, _, _ = _request(port, small_url)
+            for connection, response in held:
+                response.close()
+                connection.close()
+            report(f"stream.limit.{mode}", limit=args.limit, status=status)
+
+            server.shutdown()
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+# 计时区间的基准测试
+#
+# 比较单次 span 调用的开销 (纳秒)::
+#
+#     bare      空的 with 语句，作为对照
+#     disabled  未在记录时的 span
+#     enabled   正在记录时的 span，包括嵌套关系的维护
+
+import timeit
+import argparse
+
+from core.base import timing as _timing
+
+from . import report
+
+
+class _Bare:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def _per_call(stmt, calls: int) -> float:
+    return min(timeit.repeat(stmt, number=calls, repeat=5)) / calls * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description='计时区间的基准测试')
+    parser.add_argument('--calls', type=int, default=200000, help='调用次数')
+    args = parser.parse_args()
+
+    bare = _Bare()
+
+    def run_bare():
+        with bare:
+            pass
+
+    def run_span():
+        with _timing.span('benchmark', index=1):
+            pass
+
+    report('timing.bare', ns_per_call=round(_per_call(run_bare, args.calls), 1))
+    report('timing.disabled', ns_per_call=round(_per_call(run_span, args.calls), 1))
+    profile = _timing.Profile('benchmark')
+    with _timing.record(profile), _timing.span('root'):
+        report('timing.enabled', ns_per_call=round(_per_call(run_span, args.calls), 1))
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# 虚拟环境创建的基准测试
+#
+# 在临时文件夹中生成 wheelhouse (Python 自带的 pip wheel 文件与若干合成的 wheel 文件) 与 requirements 文件::
+#
+#     ensurepip   wheelhouse 中没有 pip 时，以 ensurepip 创建虚拟环境后离线安装依赖
+#     bootstrap   以 --without-pip 创建虚拟环境，从 pip 的 wheel 文件运行 pip 并离线安装依赖
+#     check       依赖记录与 requirements 文件一致时 check_venv 的耗时
+#     sync        requirements 文件变化后 check_venv 的耗时，依赖均已安装
+#
+# 所有阶段均不访问网络
+
+import os
+import sys
+import glob
+import base64
+import hashlib
+import zipfile
+import argparse
+import ensurepip
+import contextlib
+
+import common
+
+from . import report, sandbox, timer
+
+
+def _write_wheel(wheelhouse: str, name: str):
+    files = {f"{name}/__init__.py": b'VALUE = 1\n',
+             f"{name}-1.0.dist-info/METADATA": f"Metadata-Version: 2.1\nName: {name}\nVersion: 1.0\n".encode(),
+             f"{name}-1.0.dist-info/WHEEL": b'Wheel-Version: 1.0\nRoot-Is-Purelib: true\nTag: py3-none-any\n'}
+    record = ''
+    for path, data in files.items():
+        digest = base64.urlsafe_b64encode(hashlib.sha256(data).digest()).rstrip(b'=').decode()
+        record += f"{path},sha256={digest},{len(data)}\n"
+    record += f"{name}-1.0.dist-info/RECORD,,\n"
+    with zipfile.ZipFile(os.path.join(wheelhouse, f"{name}-1.0-py3-none-any.whl"), mode='w') as fp:
+        for path, data in files.items():
+            fp.writestr(path, data)
+        fp.writestr(f"{name}-1.0.dist-info/RECORD", record)
+    return
+
+
+def _prepare(root: str, packages: int, pip: bool) -> str:
+    """
+    生成 root/bin, root/wheelhouse 与 root/requirements.txt
+
+    :return:
+        bin 文件夹的绝对地址
+    """
+    wheelhouse = os.path.join(root, 'wheelhouse')
+    os.makedirs(os.path.join(root, 'bin'))
+    os.makedirs(wheelhouse)
+    if pip:
+        bundled = glob.glob(os.path.join(os.path.dirname(ensurepip.__file__), '_bundled', 'pip-*.whl'))
+        with open(bundled[0], mode='rb') as source, \
+                open(os.path.join(wheelhouse, os.path.basename(bundled[0])), mode='wb') as target:
+            target.write(source.read())
+    names = [f"adm_benchmark_{index}" for index in range(packages)]
+    for name in names:
+        _write_wheel(wheelhouse, name)
+    with open(os.path.join(root, 'requirements.txt'), encoding='utf8', mode='w') as fp:
+        fp.write(''.join(f"{name}==1.0\n" for name in names))
+    return os.path.join(root, 'bin')
+
+
+@contextlib.contextmanager
+def _quiet():
+    """
+    将 pip 等子进程的标准输出重定向至空设备，避免与测试结果混在一起
+    """
+    sys.stdout.flush()
+    saved = os.dup(1)
+    with open(os.devnull, mode='w') as devnull:
+        os.dup2(devnull.fileno(), 1)
+    try:
+        yield
+    finally:
+        os.dup2(saved, 1)
+        os.close(saved)
+    return
+
+
+def main():
+    parser = argparse.ArgumentParser(description='虚拟环境创建的基准测试')
+    parser.add_argument('--packages', type=int, default=20, help='合成的依赖数目')
+    args = parser.parse_args()
+
+    environ = dict(os.environ)
+    cwd = os.getcwd()
+    with sandbox() as address:
+        try:
+            os.environ.pop('VIRTUAL_ENV', None)
+            for phase, pip in (('ensurepip', False), ('bootstrap', True)):
+                os.chdir(_prepare(os.path.join(address, phase), args.packages, pip))
+                with timer() as t, _quiet():
+                    common._venv_create(os.path.abspath('../venv'))
+                report(f"venv.{phase}", packages=args.packages, seconds=round(t['seconds'], 3))
+
+            for phase in ('check', 'sync'):
+                if phase == 'sync':
+                    with open('../requirements.txt', encoding='utf8', mode='a') as fp:
+                        fp.write('# changed\n')
+                os.environ.clear()
+                os.environ.update(environ)
+                os.environ.pop('VIRTUAL_ENV', None)
+                with timer() as t, _quiet():
+                    common.check_venv()
+                report(f"venv.{phase}", seconds=round(t['seconds'], 4))
+        finally:
+            os.chdir(cwd)
+            os.environ.clear()
+            os.environ.update(environ)
+    return
+
+
+if __name__ == '__main__':
+    main()
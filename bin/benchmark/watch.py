@@ -0,0 +1,124 @@
+# 文件监视的基准测试
+#
+# 在临时文件夹中分别使用 inotify 与轮询后端运行 Watcher，检查事件后测试延迟::
+#
+#     coalesce  新建文件后连续写入多次，去抖后只应产生一个新增事件
+#     cancel    新建文件后在去抖时间内删除，新增与删除应相互抵消，不产生事件
+#     recurse   新建多层文件夹并在其中新建文件，之后再次新建文件，新的文件夹应被自动监视
+#     latency   关闭去抖，从新建文件至事件进入队列的耗时 (毫秒)
+#
+# 当前平台不支持 inotify 时跳过 inotify 后端
+
+import os
+import time
+import shutil
+import argparse
+import statistics
+import tempfile
+
+from core.file import watch
+
+from . import report, timer
+
+
+def _collect(watcher: watch.Watcher, quiet: float) -> list[watch.Event]:
+    """
+    取出事件，直到 quiet 秒内没有新的事件
+    """
+    events = []
+    while batch := watcher.drain(quiet):
+        events.extend(batch)
+    return events
+
+
+def _write(path: str, data=b'data'):
+    with open(path, mode='ab') as fp:
+        fp.write(data)
+    return
+
+
+def _check(backend: str, case: str, events: list[watch.Event], expected: list[watch.Event]):
+    if sorted(events, key=repr) != sorted(expected, key=repr):
+        raise AssertionError(f"{backend} 后端的 {case} 事件错误: {events}，应为 {expected}")
+    return
+
+
+def _cases(root: str, backend: str, args: argparse.Namespace):
+    watcher = watch.Watcher([root], backend=backend, debounce=args.debounce, interval=args.interval)
+    watcher.start()
+    quiet = args.debounce + args.interval * 4
+    try:
+        path = os.path.join(root, 'coalesce.mkv')
+        for _ in range(args.writes):
+            _write(path)
+        _check(backend, 'coalesce', _collect(watcher, quiet), [watch.Event(watch.CREATED, path)])
+
+        path = os.path.join(root, 'cancel.mkv')
+        _write(path)
+        time.sleep(args.interval * 2)  # 确保轮询后端已经发现该文件，仍在去抖时间内
+        os.remove(path)
+        _check(backend, 'cancel', _collect(watcher, quiet), [])
+
+        folder = os.path.join(root, 'new', 'deep', 'er')
+        os.makedirs(folder)
+        first = os.path.join(folder, 'first.mkv')
+        _write(first)
+        events = [event for event in _collect(watcher, quiet) if not event.is_dir]
+        _check(backend, 'recurse', events, [watch.Event(watch.CREATED, first)])
+        second = os.path.join(folder, 'second.mkv')
+        _write(second)
+        _check(backend, 'recurse', _collect(watcher, quiet), [watch.Event(watch.CREATED, second)])
+    finally:
+        watcher.stop()
+    report('watch.events', backend=backend, writes=args.writes, debounce=args.debounce, status='ok')
+    return
+
+
+def _latency(root: str, backend: str, args: argparse.Namespace):
+    folder = os.path.join(root, 'latency')
+    os.makedirs(folder)
+    watcher = watch.Watcher([folder], backend=backend, debounce=0, interval=args.interval)
+    watcher.start()
+    samples = []
+    try:
+        for index in range(args.repeat):
+            with timer() as t:
+                _write(os.path.join(folder, f"{index}.mkv"))
+                event = watcher.queue.get(timeout=10)
+            if event.kind != watch.CREATED:
+                raise AssertionError(f"{backend} 后端的 latency 事件错误: {event}")
+            samples.append(t['seconds'] * 1000)
+            _collect(watcher, args.interval * 2)  # 丢弃写入完成产生的修改事件
+    finally:
+        watcher.stop()
+    report('watch.latency', backend=backend, interval=args.interval, events=len(samples),
+           median_ms=round(statistics.median(samples), 2), max_ms=round(max(samples), 2))
+    return
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文件监视的基准测试')
+    parser.add_argument('--debounce', type=float, default=0.5, help='去抖时间 (秒)')
+    parser.add_argument('--interval', type=float, default=0.1, help='轮询后端的轮询间隔 (秒)')
+    parser.add_argument('--writes', type=int, default=50, help='coalesce 测试中的写入次数')
+    parser.add_argument('--repeat', type=int, default=20, help='latency 测试的事件数目')
+    args = parser.parse_args()
+
+    for backend in ('inotify', 'polling'):
+        root = tempfile.mkdtemp(prefix='adm_benchmark_')
+        try:
+            if backend == 'inotify':
+                try:
+                    watch.InotifyBackend([root]).close()
+                except OSError:
+                    report('watch.events', backend=backend, skipped='当前平台不支持 inotify')
+                    continue
+            _cases(root, backend, args)
+            _latency(root, backend, args)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+# 网站数据库配置的负载测试
+#
+# 在线程池 WSGI 服务器上运行网站，并发地请求读取与写入数据库的页面，依次比较如下配置::
+#
+#     baseline    每个请求重新连接，回滚日志模式，不使用 mmap
+#     persistent  持久连接，WAL 模式与 mmap
+#     replica     在 persistent 的基础上将只读查询发送至独立的只读连接
+#
+# 每种配置均在独立的子进程中运行，因为 Django 的配置在进程内只能初始化一次
+
+import sys
+import time
+import random
+import argparse
+import threading
+import subprocess
+import http.client
+import concurrent.futures
+
+from . import report, sandbox, serve, setup_django, timer
+
+
+CONFIGS = {
+    'baseline': {'conn_max_age': '0', 'journal_mode': 'delete', 'mmap_size': '0', 'replica': 'false'},
+    'persistent': {'conn_max_age': '600', 'journal_mode': 'wal', 'mmap_size': '268435456', 'replica': 'false'},
+    'replica': {'conn_max_age': '600', 'journal_mode': 'wal', 'mmap_size': '268435456', 'replica': 'true'},
+}
+
+
+# ---------- 子进程中运行的页面 ----------
+
+def _read_view(request):
+    from django.contrib.auth.models import User
+    from django.http import HttpResponse
+
+    names = list(User.objects.order_by('-id').values_list('username', flat=True)[:50])
+    return HttpResponse(f"{User.objects.count()} {' '.join(names)}")
+
+
+def _write_view(request):
+    from django.contrib.auth.models import User
+    from django.http import HttpResponse
+
+    User.objects.create(username=f"user_{threading.get_ident()}_{time.perf_counter_ns()}")
+    return HttpResponse('ok')
+
+
+urlpatterns = []
+
+
+def _worker(args):
+    """
+    在沙盒中以指定的配置运行服务器与客户端
+    """
+    with sandbox():
+        setup_django({'Website': CONFIGS[args.worker]}, urlconf=__name__)
+        from django.contrib.auth.models import User
+        from django.core.wsgi import get_wsgi_application
+        from django.urls import path
+
+        urlpatterns[:] = [path('read/', _read_view), path('write/', _write_view)]
+        User.objects.bulk_create([User(username=f"seed_{index}") for index in range(args.rows)])
+
+        server = serve(get_wsgi_application(), workers=args.workers)
+        port = server.server_address[1]
+
+        def client(seed: int) -> tuple[list[float], int]:
+            rng = random.Random(seed)
+            latencies, errors = [], 0
+            for _ in range(args.requests):
+                url = '/write/' if rng.random() < args.write_ratio else '/read/'
+                start = time.perf_counter()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                try:
+                    connection.request('GET', url)
+                    response = connection.getresponse()
+                    response.read()
+                    if response.status != 200:
+                        errors += 1
+                except OSError:
+                    errors += 1
+                finally:
+                    connection.close()
+                latencies.append(time.perf_counter() - start)
+            return latencies, errors
+
+        with timer() as t:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=args.clients) as executor:
+                results = list(executor.map(client, range(args.clients)))
+        server.shutdown()
+
+        latencies = sorted(latency for result in results for latency in result[0])
+        report(f"website.{args.worker}", clients=args.clients, requests=len(latencies),
+               errors=sum(result[1] for result in results), seconds=round(t['seconds'], 4),
+               per_second=round(len(latencies) / t['seconds'], 1),
+               p50_ms=round(latencies[len(latencies) // 2] * 1000, 2),
+               p95_ms=round(latencies[int(len(latencies) * 0.95)] * 1000, 2))
+    return
+
+
+def main():
+    parser = argparse.ArgumentParser(description='网站数据库配置的负载测试')
+    parser.add_argument('--clients', type=int, default=16, help='并发的客户端数目')
+    parser.add_argument('--requests', type=int, default=200, help='每个客户端的请求数目')
+    parser.add_argument('--workers', type=int, default=8, help='服务器的线程数目')
+    parser.add_argument('--write-ratio', type=float, default=0.1, help='写入请求的比例')
+    parser.add_argument('--rows', type=int, default=5000, help='预先写入的行数')
+    parser.add_argument('--worker', choices=CONFIGS, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        _worker(args)
+        return
+
+    for name in CONFIGS:
+        subprocess.run([sys.executable, '-m', __spec__.name, *sys.argv[1:], '--worker', name], check=True)
+    return
+
+
+if __name__ == '__main__':
+    main()
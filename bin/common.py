@@ -2,13 +2,11 @@
 
 import os
 import sys
-import webbrowser
 
-from tkinter import Tk
-from tkinter.scrolledtext import ScrolledText
-from tkinter.ttk import Button, Frame, Label, Style
-from tkinter.filedialog import askopenfilename, asksaveasfile
-from tkinter.messagebox import showerror, showwarning, askyesno
+TYPE_CHECKING = False  # 与 typing.TYPE_CHECKING 等价，避免在启动时导入 typing
+
+if TYPE_CHECKING:  # tkinter 只在需要显示窗口时导入，正常启动时不会初始化 Tcl/Tk
+    from tkinter import Tk
 
 
 __all__ = [
@@ -75,13 +73,16 @@ def _text_limit(text: str, limit: int | None) -> str:
     return text
 
 
-def _button_issues_command(root: Tk):
+def _button_issues_command(root: 'Tk'):
     """
     点击后访问 GitHub 项目主页
 
     :param root:
         主窗口
     """
+    import webbrowser
+    from tkinter.messagebox import showerror
+
     root.attributes('-topmost', False)
 
     try:
@@ -92,7 +93,7 @@ def _button_issues_command(root: Tk):
     return
 
 
-def _button_save_command(root: Tk, exc: str):
+def _button_save_command(root: 'Tk', exc: str):
     """
     询问保存的文件地址，并写入日志，未选择则返回至主窗口
 
@@ -103,6 +104,8 @@ def _button_save_command(root: Tk, exc: str):
         异常文本
     """
     import time
+    from tkinter.filedialog import asksaveasfile
+
     fp = asksaveasfile(initialfile=f"ADM_unknown_exc_log-{time.strftime('%Y_%m_%d_%H_%M')}.log",
                        filetypes=[("log 文件", "*.log")])
     if fp is not None:
@@ -112,7 +115,7 @@ def _button_save_command(root: Tk, exc: str):
     return
 
 
-def gui_exc_windows(info=_INFO, exc=_EXC, title=_TITLE, button_names=_BUTTON_NAMES) -> Tk:
+def gui_exc_windows(info=_INFO, exc=_EXC, title=_TITLE, button_names=_BUTTON_NAMES) -> 'Tk':
     """
     异常捕获窗口，用于在启动层捕获所有未经处理的异常链
 
@@ -144,6 +147,9 @@ def gui_exc_windows(info=_INFO, exc=_EXC, title=_TITLE, button_names=_BUTTON_NAM
     :rtype: Tk
     """
     import functools
+    from tkinter import Tk
+    from tkinter.scrolledtext import ScrolledText
+    from tkinter.ttk import Button, Frame, Label, Style
 
     root = Tk()
     root.withdraw()  # 防止设置图标时单独显示
@@ -222,6 +228,7 @@ def check_environ():
 
     """
     if sys.hexversion < 0x030a00f0:  # 3.10.0
+        from tkinter.messagebox import showerror
         showerror(title=_ERROR_TITLE, message=_VERSION_MESSAGE)
         sys.exit('需要高版本的 Python')
 
@@ -229,9 +236,11 @@ def check_environ():
 
     # TODO[中期] (@YHDSL) 添加多平台支持
     if platform.system() not in ('Windows',):  # Windows
+        from tkinter.messagebox import showwarning
         showwarning(title=_ERROR_TITLE, message=_SYSTEM_MESSAGE)
 
     if sys.maxsize <= 2 ** 32:  # 64 bit
+        from tkinter.messagebox import showwarning
         showwarning(title=_ERROR_TITLE, message=_BIT_MESSAGE)
 
     return
@@ -294,66 +303,272 @@ def _venv_activate(address: str):
     return
 
 
+_REQUIREMENTS_NAME = 'requirements.txt'
+_WHEELHOUSE_NAME = 'wheelhouse'  # 离线安装使用的 wheel 文件夹，与 venv 位于同一目录
+_CHECKSUM_NAME = 'SHA256SUMS'  # wheelhouse 中可选的校验文件，格式与 sha256sum 的输出相同
+_STAMP_NAME = 'adm-requirements.json'  # 虚拟环境中记录已安装依赖的文件
+
+
+def _find_file(main_address: str, name: str) -> str | None:
+    """
+    依次在 main_address 与其上级目录中查找文件或文件夹
+
+    :return:
+        绝对地址，均不存在时返回 None
+    """
+    for folder in (main_address, os.path.dirname(main_address)):
+        address = os.path.join(folder, name)
+        if os.path.exists(address):
+            return address
+    return None
+
+
+def _venv_python(address: str) -> str:
+    """
+    返回虚拟环境中 Python 解释器的地址
+    """
+    if sys.platform == 'win32':
+        return os.path.join(address, 'Scripts', 'python.exe')
+    return os.path.join(address, 'bin', 'python')
+
+
+def _venv_stamp(requirements_address: str) -> dict:
+    """
+    返回依赖记录，包含 requirements 文件的 sha256 与 Python 的版本
+
+    requirements 文件或 Python 版本变化后记录随之变化，可以直接判断虚拟环境是否需要更新
+    """
+    import hashlib
+
+    with open(requirements_address, mode='rb') as fp:
+        digest = hashlib.sha256(fp.read()).hexdigest()
+    return {'requirements': digest, 'python': f"{sys.version_info.major}.{sys.version_info.minor}"}
+
+
+def _venv_stamp_read(address: str) -> dict | None:
+    """
+    读取虚拟环境中的依赖记录，不存在或损坏时返回 None
+    """
+    import json
+
+    try:
+        with open(os.path.join(address, _STAMP_NAME), encoding='utf8') as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+def _venv_stamp_write(address: str, stamp: dict):
+    import json
+
+    with open(os.path.join(address, _STAMP_NAME), encoding='utf8', mode='w') as fp:
+        json.dump(stamp, fp)
+    return
+
+
+def _wheel_verify(wheelhouse: str) -> list[str]:
+    """
+    校验 wheelhouse 中的 wheel 文件
+
+    存在 SHA256SUMS 文件时比对其中记录的所有文件的 sha256，
+    否则只检查每个 wheel 文件是否为完整的 zip 文件 (读取其中央目录)
+
+    :param wheelhouse:
+        wheelhouse 的绝对地址
+
+    :return:
+        所有错误的描述，校验通过时为空列表
+    :rtype: list[str]
+    """
+    import hashlib
+    import zipfile
+    import concurrent.futures
+
+    checksum_address = os.path.join(wheelhouse, _CHECKSUM_NAME)
+    if os.path.isfile(checksum_address):
+        expected = {}
+        with open(checksum_address, encoding='utf8') as fp:
+            for line in fp:
+                if line.strip():
+                    digest, name = line.split(maxsplit=1)
+                    expected[name.strip().lstrip('*')] = digest.lower()
+
+        def check(name: str) -> str | None:
+            try:
+                with open(os.path.join(wheelhouse, name), mode='rb') as wheel:
+                    digest = hashlib.sha256(wheel.read()).hexdigest()
+            except OSError:
+                return f"{name} 不存在"
+            return None if digest == expected[name] else f"{name} 的 sha256 不匹配"
+    else:
+        expected = {name: None for name in os.listdir(wheelhouse) if name.endswith('.whl')}
+
+        def check(name: str) -> str | None:
+            try:
+                with zipfile.ZipFile(os.path.join(wheelhouse, name)):
+                    return None
+            except (OSError, zipfile.BadZipFile):
+                return f"{name} 不是完整的 wheel 文件"
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:  # 计算哈希时会释放 GIL
+        return [error for error in executor.map(check, sorted(expected)) if error is not None]
+
+
+def _pip_wheel(wheelhouse: str) -> str | None:
+    """
+    返回 wheelhouse 中 pip 的 wheel 文件，不存在时返回 None
+
+    pip 可以直接从其 wheel 文件运行，此时创建虚拟环境时无需执行 ensurepip
+    """
+    wheels = sorted(name for name in os.listdir(wheelhouse) if name.startswith('pip-') and name.endswith('.whl'))
+    return os.path.join(wheelhouse, wheels[-1]) if wheels else None
+
+
+def _venv_install(address: str, requirements_address: str, wheelhouse: str | None, *, bootstrap=False) -> int:
+    """
+    在虚拟环境中安装 requirements 文件指定的依赖
+
+    指定 wheelhouse 时只从其中离线安装 (--no-index)，否则从网络安装
+
+    :param bootstrap:
+        虚拟环境以 --without-pip 创建，此时从 wheelhouse 中 pip 的 wheel 文件运行 pip，并同时安装 pip 自身，仅限关键字
+
+    :return:
+        pip 的退出状态码
+    :rtype: int
+    """
+    import subprocess
+
+    command = [_venv_python(address), '-m', 'pip', 'install', '--disable-pip-version-check']
+    if wheelhouse is not None:
+        command += ['--no-index', '--find-links', wheelhouse]
+        if bootstrap:
+            pip_wheel = _pip_wheel(wheelhouse)
+            command[1:3] = [os.path.join(pip_wheel, 'pip')]
+            command.append(pip_wheel)
+    command += ['-r', requirements_address]
+    return subprocess.run(command).returncode
+
+
 def _venv_create(address: str):
     """
     在指定位置创建一个虚拟环境，自动激活并安装指定的依赖
 
+    存在 wheelhouse 文件夹时从中离线安装依赖，创建虚拟环境的同时在后台线程中校验 wheel 文件，
+    wheelhouse 中包含 pip 的 wheel 文件时跳过 ensurepip，直接从 wheel 运行 pip，
+    安装完成后在虚拟环境中写入依赖记录，参考 :func:`check_venv`
+
     :param address:
         虚拟环境的绝对地址
     """
     import shutil
     import subprocess
+    import concurrent.futures
 
     address = os.path.abspath(address)
 
-    requirements_address = askopenfilename(title='请选择 requirements 文件',
-                                           initialdir=os.path.dirname(address),
-                                           filetypes=[('requirements 文件', 'requirements.txt')])
+    def fail(title: str, message: str):
+        from tkinter.messagebox import showerror
 
-    if requirements_address == '':  # 获取 requirements 文件位置
         if os.path.isdir(address):
             shutil.rmtree(address)
-        showerror(title='requirements 文件错误',
-                  message='不是正确的 requirements 文件\n'
-                          '软件将无法继续正常工作')
-        sys.exit('requirements 文件错误')
-
-    venv_state = subprocess.run(['python', '-m', 'venv', address])  # 安装虚拟环境
+        showerror(title=title, message=message)
+        sys.exit(title)
+
+    requirements_address = _find_file(os.path.abspath('.'), _REQUIREMENTS_NAME)
+    if requirements_address is None:  # 获取 requirements 文件位置
+        from tkinter.filedialog import askopenfilename
+
+        requirements_address = askopenfilename(title='请选择 requirements 文件',
+                                               initialdir=os.path.dirname(address),
+                                               filetypes=[('requirements 文件', 'requirements.txt')])
+    if requirements_address == '':
+        fail('requirements 文件错误', '不是正确的 requirements 文件\n'
+                                     '软件将无法继续正常工作')
+
+    wheelhouse = _find_file(os.path.dirname(address), _WHEELHOUSE_NAME)
+    if wheelhouse is not None and not os.path.isdir(wheelhouse):
+        wheelhouse = None
+    bootstrap = wheelhouse is not None and _pip_wheel(wheelhouse) is not None
+    command = [sys.executable, '-m', 'venv', *(['--without-pip'] if bootstrap else []), address]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:  # 创建虚拟环境的同时校验 wheel 文件
+        verify = executor.submit(_wheel_verify, wheelhouse) if wheelhouse is not None else None
+        venv_state = subprocess.run(command)  # 安装虚拟环境
+        errors = verify.result() if verify is not None else []
     if venv_state.returncode != 0:
-        if os.path.isdir(address):
-            shutil.rmtree(address)
-        showerror(title='虚拟环境创建失败',
-                  message=f'无法创建虚拟环境，退出状态码为 {venv_state.returncode}\n'
-                          f'请尝试手动创建虚拟环境')
-        sys.exit('虚拟环境创建失败')
+        fail('虚拟环境创建失败', f'无法创建虚拟环境，退出状态码为 {venv_state.returncode}\n'
+                                f'请尝试手动创建虚拟环境')
+    if errors:
+        fail('wheel 文件校验失败', '以下 wheel 文件未能通过校验：\n' + '\n'.join(errors))
 
     _venv_activate(address)  # 环境激活
-    venv_state = subprocess.run(['pip', 'install', '-r', requirements_address])  # 安装依赖
-    if venv_state.returncode != 0:
-        if os.path.isdir(address):
-            shutil.rmtree(address)
-        showerror(title='依赖安装失败',
-                  message=f'无法正确安装 requirements 文件指定的依赖，'
-                          f'退出状态码为 {venv_state.returncode}\n'
-                          f'请尝试手动安装相关依赖')
-        sys.exit('依赖安装失败')
+    returncode = _venv_install(address, requirements_address, wheelhouse, bootstrap=bootstrap)  # 安装依赖
+    if returncode != 0:
+        fail('依赖安装失败', f'无法正确安装 requirements 文件指定的依赖，'
+                            f'退出状态码为 {returncode}\n'
+                            f'请尝试手动安装相关依赖')
+    _venv_stamp_write(address, _venv_stamp(requirements_address))
 
     return
 
 
+def _venv_sync(address: str):
+    """
+    requirements 文件变化后更新已存在的虚拟环境
+
+    依赖记录与当前的 requirements 文件一致时直接返回，只需读取并哈希两个小文件，
+    不一致时重新安装依赖 (存在 wheelhouse 时离线安装)，失败时保留原有的虚拟环境并显示警告
+
+    没有依赖记录的旧虚拟环境只在存在 wheelhouse 时更新，避免在启动时访问网络
+
+    :param address:
+        虚拟环境的绝对地址
+    """
+    requirements_address = _find_file(os.path.abspath('.'), _REQUIREMENTS_NAME)
+    if requirements_address is None:
+        return
+    stamp = _venv_stamp(requirements_address)
+    stamp_old = _venv_stamp_read(address)
+    if stamp_old == stamp:
+        return
+
+    wheelhouse = _find_file(os.path.dirname(address), _WHEELHOUSE_NAME)
+    if wheelhouse is not None and not os.path.isdir(wheelhouse):
+        wheelhouse = None
+    if stamp_old is None and wheelhouse is None:
+        return
+
+    errors = _wheel_verify(wheelhouse) if wheelhouse is not None else []
+    returncode = _venv_install(address, requirements_address, wheelhouse) if not errors else None
+    if returncode == 0:
+        _venv_stamp_write(address, stamp)
+    else:
+        from tkinter.messagebox import showwarning
+
+        showwarning(title='依赖更新失败',
+                    message='requirements 文件已经变化，但未能更新虚拟环境中的依赖\n'
+                            + ('\n'.join(errors) if errors else f'退出状态码为 {returncode}') +
+                            '\n将继续使用原有的虚拟环境')
+    return
+
+
 def check_venv():  # TODO[长期] (@YHDSL) 允许不使用虚拟环境
     if not _is_venv():  # 创建或激活虚拟环境
         main_address = os.path.abspath('.')
         venv_address = fr"{main_address}/venv"
         if not os.path.isdir(venv_address):
             venv_address = fr"{os.path.dirname(main_address)}/venv"
-            if not os.path.isdir(venv_address):
-                ask_create = askyesno(title='创建虚拟环境',
-                                      message='未检测到虚拟环境，是否创建一个新的 venv 虚拟环境？')
-                if ask_create:
-                    _venv_create(venv_address)
-                else:
-                    sys.exit('未能创建虚拟环境')
+        if not os.path.isdir(venv_address):
+            from tkinter.messagebox import askyesno
+            ask_create = askyesno(title='创建虚拟环境',
+                                  message='未检测到虚拟环境，是否创建一个新的 venv 虚拟环境？')
+            if ask_create:
+                _venv_create(venv_address)
+            else:
+                sys.exit('未能创建虚拟环境')
+        else:
+            _venv_sync(venv_address)  # 依赖记录一致时直接返回
         _venv_activate(venv_address)
     return
 
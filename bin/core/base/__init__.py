@@ -1,19 +1,34 @@
 import os
+import logging as _logging  # 避免与子模块 core.base.logging 同名
 
+from . import metrics
 from . import conf
 from . import config
+from . import database
+from . import backup
+from . import plugins
+from . import timing
+from . import jobs
 
 
 __all__ = [
+    "metrics",
     "conf",
     "config",
+    "database",
+    "backup",
     "plugins",
+    "timing",
+    "jobs",
     "translation",
     "mkdir",
     "setup"
 ]
 
 
+_logger = _logging.getLogger(__name__)
+
+
 def mkdir():
     """
     创建 Folder配置 内的所有文件夹
@@ -46,12 +61,15 @@ def _setup_config():
     sort_tup = ('Global', 'Logging', 'Plugins')
     for name in conf.DBToINIAddress.get_data().keys():
         sql_address = str(getattr(conf.DBToINIAddress, name))
-        try:
-            config.create(sql_address, sort_tup=sort_tup)
-        except FileNotFoundError as e:
-            raise FileNotFoundError(f"未能找到 '{sql_address}'，请尝试重新安装") from e
-        config_open = config.fix(sql_address)[0]
-        conf.INIConnect.new(name, config_open)
+        with timing.span(f"DBToINIAddress.{name}", address=sql_address):
+            try:
+                with timing.span('create'):
+                    config.create(sql_address, sort_tup=sort_tup)
+            except FileNotFoundError as e:
+                raise FileNotFoundError(f"未能找到 '{sql_address}'，请尝试重新安装") from e
+            with timing.span('fix'):
+                config_open = config.fix(sql_address)[0]
+            conf.INIConnect.new(name, config_open)
     return
 
 
@@ -63,21 +81,62 @@ def _setup_log():
         1. 读取配置文件中的 number 和 level
         #. 委托 logging 模块的 setup 函数初始化
     """
-    import logging
     from . import logging as log
 
-    log_number = conf.INIConnect['ADM'].getint('Logging', 'number', fallback=0)
-    log_level = conf.INIConnect['ADM'].getint('Logging', 'level', fallback=logging.INFO).upper()
+    log_number = config.get_option('Logging', 'number', 5)
+    log_level = config.get_option('Logging', 'level', 'INFO')
     log.setup(number=log_number, level=log_level)
     return
 
 
+def _setup_plugins():
+    """
+    初始化 plugins
+
+    初始化进程::
+        1. 读取插件文件夹的清单索引并注册插件，插件本身在第一次被调用时才会导入
+    """
+    plugins.registry.load()
+    return
+
+
+def _profile_format() -> str:
+    """
+    返回启动报告的格式，环境变量 ADM_PROFILE 优先于 ADM INI文件 Global 节的 profile 选项
+
+    :return:
+        json 或 chrome，未开启或格式无效时返回空字符串
+    :rtype: str
+    """
+    fmt = (os.environ.get(timing.ENVIRON) or config.get_option('Global', 'profile', '')).strip().lower()
+    if fmt in ('1', 'true', 'yes', 'on'):
+        fmt = timing.JSON
+    elif fmt in ('0', 'false', 'no', 'off'):
+        fmt = ''
+    elif fmt not in ('', timing.JSON, timing.CHROME):
+        _logger.warning("忽略了无效的启动报告格式 '%s'，应为 json 或 chrome", fmt)
+        fmt = ''
+    return fmt
+
+
 def setup():
     """
     初始化进程
+
+    每个阶段均会被计时，开启启动报告时 (参考 :func:`_profile_format`)
+    报告会被写入 Folder.LOGS，初始化失败时同样会写入，写入报告失败时仅记录日志，不会影响初始化的结果
     """
-    mkdir()
-    _setup_conf()
-    _setup_config()
-    _setup_log()
+    profile = timing.Profile('startup')
+    try:
+        with timing.record(profile), timing.span('setup'):
+            for phase in (mkdir, _setup_conf, _setup_config, _setup_log, _setup_plugins):
+                with timing.span(phase.__name__.removeprefix('_setup_')):
+                    phase()
+    finally:
+        try:
+            fmt = _profile_format()
+            if fmt:
+                profile.dump(fmt)
+        except Exception:
+            _logger.exception('未能写入启动报告')
     return
@@ -0,0 +1,352 @@
+# 备份模块 (底层层)
+
+import os
+import json
+import gzip
+import time
+import shutil
+import sqlite3
+import hashlib
+import datetime
+import tempfile
+
+from . import conf as _conf
+from . import config as _config
+from . import database as _database
+
+
+__all__ = [
+    "Backup"
+]
+
+
+_SECTION = 'Backup'  #: ADM INI文件 中备份配置所在的节
+_BUFFER = 1024 * 1024  #: 流式读取与压缩时的缓冲区大小
+_SQLITE_SUFFIXES = ('.db', '.db-wal', '.db-shm', '.db-journal')  #: 缓存文件夹中不进行备份的数据库文件
+
+
+def _hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, mode='rb') as fp:
+        while chunk := fp.read(_BUFFER):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _signature(*paths: str) -> list[list[int] | None]:
+    """
+    返回文件的大小与修改时间，用于在不读取内容的情况下判断文件是否变化
+    """
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            signature.append(None)
+        else:
+            signature.append([stat.st_size, stat.st_mtime_ns])  # 与 JSON 的反序列化结果保持一致
+    return signature
+
+
+class Backup:
+    """
+    备份服务，备份储存于 `Folder.BACKUP` 文件夹中
+
+    每次备份生成一个快照，包括::
+
+        database/  DBToINIAddress 与 DBConnect 中登记的所有数据库
+        config/    Folder.CONFIG 下的 INI文件
+        cache/     Folder.CACHE 下的缓存文件，不包括可以重建的数据库
+
+    数据库使用 :meth:`sqlite3.Connection.backup` 分批复制页面，每批之间会让出数据库，不会长时间阻塞写入；
+    已登记在 DBConnect 中的数据库直接使用其连接作为源，该连接上的写入会同步至备份而不会导致重新开始，
+    复制每批页面时持有该数据库的线程锁，因此不会复制到未提交的事务
+
+    所有内容按照 SHA-256 储存在 objects 文件夹中，并以流的方式使用 gzip 压缩，
+    快照仅是记录了文件对应哈希值的 JSON 清单，未变化的文件不会重复储存，
+    大小与修改时间未变化的文件甚至不会被读取
+
+    配置读取自 ADM INI文件 的 Backup 节::
+
+        pages        每批复制的数据库页面数目
+        sleep        每批之间的等待时间 (秒)
+        level        gzip 压缩等级
+        keep_last    保留最近的快照数目
+        keep_daily   按天保留的快照数目
+        keep_weekly  按周保留的快照数目
+    """
+
+    def __init__(self, folder=None):
+        """
+        :param folder:
+            备份文件夹，默认为 `Folder.BACKUP`
+
+        :type folder: conf.Path.StrPath | None
+        """
+        self.folder = str(folder or _conf.Folder.BACKUP)
+        self.pages = _config.get_option(_SECTION, 'pages', 1024)
+        self.sleep = _config.get_option(_SECTION, 'sleep', 0.005)
+        self.level = _config.get_option(_SECTION, 'level', 6)
+        self.keep_last = _config.get_option(_SECTION, 'keep_last', 10)
+        self.keep_daily = _config.get_option(_SECTION, 'keep_daily', 7)
+        self.keep_weekly = _config.get_option(_SECTION, 'keep_weekly', 4)
+        self.stats = {}  #: 最近一次备份的统计信息
+
+        self._objects = os.path.join(self.folder, 'objects')
+        self._snapshots = os.path.join(self.folder, 'snapshots')
+        return
+
+    # ---------- 对象储存 ----------
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self._objects, digest[:2], f"{digest}.gz")
+
+    def _store(self, path: str, digest: str) -> bool:
+        """
+        以流的方式压缩文件并储存为对象
+
+        :return:
+            对象已存在时返回 False
+        """
+        target = self._object_path(digest)
+        if os.path.exists(target):
+            return False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp = f"{target}.{os.getpid()}.tmp"
+        try:
+            with open(path, mode='rb') as fp_in, open(temp, mode='wb') as fp_out:
+                with gzip.GzipFile(fileobj=fp_out, mode='wb', compresslevel=self.level, mtime=0) as fp_gzip:
+                    shutil.copyfileobj(fp_in, fp_gzip, _BUFFER)
+            os.replace(temp, target)
+        except BaseException:
+            try:
+                os.remove(temp)
+            except FileNotFoundError:
+                pass
+            raise
+        return True
+
+    # ---------- 快照 ----------
+
+    def snapshots(self) -> list[str]:
+        """
+        返回所有快照的名称，按时间排序
+
+        :rtype: list[str]
+        """
+        try:
+            return sorted(name.removesuffix('.json') for name in os.listdir(self._snapshots) if name.endswith('.json'))
+        except FileNotFoundError:
+            return []
+
+    def manifest(self, snapshot: str) -> dict:
+        """
+        返回快照的清单
+
+        :param snapshot:
+            快照名称
+
+        :type snapshot: str
+
+        :return:
+            包括创建时间 (created) 与所有文件 (files) 的字典，
+            files 以快照内的相对地址为键，值为包括哈希值 (hash)、大小 (size) 与签名 (signature) 的字典
+        :rtype: dict
+        """
+        with open(os.path.join(self._snapshots, f"{snapshot}.json"), encoding='utf8') as fp:
+            return json.load(fp)
+
+    def _databases(self) -> dict[str, tuple[str, str | None]]:
+        """
+        返回需要备份的数据库
+
+        :return:
+            以快照内的相对地址为键，值为数据库地址与 DBConnect 中的名称，未打开连接时名称为 None
+        """
+        databases = {}
+        for name in _conf.DBToINIAddress.get_data():
+            databases[f"database/{name}.db"] = (_conf.DBToINIAddress[name], None)
+        for name in _conf.DBConnect.get_data():
+            connection = _conf.DBConnect[name]
+            with _database.get_lock(name):
+                address = connection.execute("PRAGMA database_list").fetchone()[2]
+            if address:  # 跳过内存数据库
+                databases[f"database/{name}.db"] = (address, name)
+        return databases
+
+    def _files(self) -> dict[str, str]:
+        """
+        返回需要备份的 INI文件 与缓存文件
+
+        :return:
+            以快照内的相对地址为键，值为文件地址
+        """
+        files = {}
+        for prefix, folder in (('config', _conf.Folder.CONFIG), ('cache', _conf.Folder.CACHE)):
+            for root, _, names in os.walk(folder):
+                for name in names:
+                    if prefix == 'cache' and name.endswith(_SQLITE_SUFFIXES):
+                        continue
+                    path = os.path.join(root, name)
+                    files[f"{prefix}/{os.path.relpath(path, folder).replace(os.sep, '/')}"] = path
+        return files
+
+    def _copy_database(self, address: str, name: str | None, target: str):
+        """
+        使用在线备份 API 分批复制数据库
+
+        使用共享的连接作为源时，每批页面均在持有数据库线程锁的情况下复制，
+        并在两批之间释放线程锁，避免复制到其他线程尚未提交的事务
+        """
+        destination = sqlite3.connect(target)
+        try:
+            if name is None:
+                source = sqlite3.connect(f"file:{address}?mode=ro", uri=True, check_same_thread=False)
+                try:
+                    source.backup(destination, pages=self.pages, sleep=self.sleep)
+                finally:
+                    source.close()
+                return
+
+            lock = _database.get_lock(name)
+
+            def progress(*_):  # 每批之后让出线程锁，等待后重新获取以复制下一批
+                lock.release()
+                try:
+                    time.sleep(self.sleep)
+                finally:
+                    lock.acquire()
+                return
+
+            with lock:
+                _conf.DBConnect[name].backup(destination, pages=self.pages, progress=progress, sleep=0)
+        finally:
+            destination.close()
+        return
+
+    def snapshot(self) -> str:
+        """
+        创建一个新的快照，并按照保留策略清理旧的快照
+
+        :return:
+            快照名称
+        :rtype: str
+        """
+        snapshots = self.snapshots()
+        previous = self.manifest(snapshots[-1])['files'] if snapshots else {}
+        files = {}
+        self.stats = {'files': 0, 'read': 0, 'stored': 0, 'stored_bytes': 0}
+
+        def add(key: str, path: str, signature):
+            old = previous.get(key)
+            if old is not None and old['signature'] == signature and os.path.exists(self._object_path(old['hash'])):
+                files[key] = old
+                return
+            digest = _hash_file(path)
+            size = os.path.getsize(path)
+            self.stats['read'] += 1
+            if self._store(path, digest):
+                self.stats['stored'] += 1
+                self.stats['stored_bytes'] += os.path.getsize(self._object_path(digest))
+            files[key] = {'hash': digest, 'size': size, 'signature': signature}
+            return
+
+        os.makedirs(_conf.Folder.TEMP, exist_ok=True)
+        for key, (address, name) in self._databases().items():
+            if not os.path.exists(address):
+                continue
+            signature = _signature(address, f"{address}-wal")
+            old = previous.get(key)
+            if old is not None and old['signature'] == signature and os.path.exists(self._object_path(old['hash'])):
+                files[key] = old  # 数据库与 WAL 文件均未变化，无需复制
+                continue
+            fd, temp = tempfile.mkstemp(suffix='.db', dir=_conf.Folder.TEMP)
+            os.close(fd)
+            try:
+                self._copy_database(address, name, temp)
+                add(key, temp, signature)
+            finally:
+                os.remove(temp)
+
+        for key, path in self._files().items():
+            try:
+                add(key, path, _signature(path))
+            except FileNotFoundError:  # 备份期间被删除
+                continue
+        self.stats['files'] = len(files)
+
+        now = datetime.datetime.now()
+        name = now.strftime('%Y%m%d-%H%M%S-%f')
+        os.makedirs(self._snapshots, exist_ok=True)
+        temp = os.path.join(self._snapshots, f"{name}.tmp")
+        with open(temp, mode='w', encoding='utf8') as fp:
+            json.dump({'created': now.timestamp(), 'files': files}, fp, ensure_ascii=False)
+        os.replace(temp, os.path.join(self._snapshots, f"{name}.json"))
+
+        self.prune()
+        return name
+
+    # ---------- 清理与恢复 ----------
+
+    def _retained(self, snapshots: list[str]) -> set[str]:
+        """
+        按照保留策略计算需要保留的快照
+        """
+        retained = set(snapshots[-self.keep_last:]) if self.keep_last > 0 else set()
+        for count, period in ((self.keep_daily, '%Y%m%d'), (self.keep_weekly, '%G%V')):
+            periods = set()
+            for snapshot in reversed(snapshots):  # 每个周期保留最新的快照
+                key = datetime.datetime.strptime(snapshot, '%Y%m%d-%H%M%S-%f').strftime(period)
+                if len(periods) >= count:
+                    break
+                if key not in periods:
+                    periods.add(key)
+                    retained.add(snapshot)
+        return retained
+
+    def prune(self) -> list[str]:
+        """
+        按照保留策略删除旧的快照，并删除不再被引用的对象
+
+        :return:
+            被删除的快照名称
+        :rtype: list[str]
+        """
+        snapshots = self.snapshots()
+        retained = self._retained(snapshots)
+        removed = [snapshot for snapshot in snapshots if snapshot not in retained]
+        for snapshot in removed:
+            os.remove(os.path.join(self._snapshots, f"{snapshot}.json"))
+
+        referenced = {entry['hash'] for snapshot in retained for entry in self.manifest(snapshot)['files'].values()}
+        for root, _, names in os.walk(self._objects):
+            for name in names:
+                if name.endswith('.gz') and name.removesuffix('.gz') not in referenced:
+                    os.remove(os.path.join(root, name))
+        return removed
+
+    def restore(self, snapshot: str, folder, *, keys=None):
+        """
+        将快照中的文件解压至指定文件夹，保持快照内的相对地址
+
+        :param snapshot:
+            快照名称
+
+        :param folder:
+            目标文件夹
+
+        :param keys:
+            需要恢复的相对地址的可迭代对象，默认为 None，即恢复所有文件，仅限关键字
+
+        :type snapshot: str
+        :type folder: conf.Path.StrPath
+        :type keys: list[str] | None
+        """
+        files = self.manifest(snapshot)['files']
+        for key in (files if keys is None else keys):
+            target = os.path.join(folder, *key.split('/'))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with gzip.open(self._object_path(files[key]['hash']), mode='rb') as fp_in, \
+                    open(target, mode='wb') as fp_out:
+                shutil.copyfileobj(fp_in, fp_out, _BUFFER)
+        return
@@ -21,6 +21,8 @@ from typing import (
     Union as _Union
 )
 
+from . import metrics as _metrics
+
 
 __all__ = [
     "get_version_dict",
@@ -771,6 +773,7 @@ def _json_load(conf_cache_folder: pathlib.Path) -> dict[str, dict[str, str]]:
     return dump_info
 
 
+@_metrics.histogram('adm_conf_dump_seconds', '缓存配置类的耗时').time()
 def dump():
     """
     缓存配置类
@@ -818,6 +821,7 @@ def dump():
     return
 
 
+@_metrics.histogram('adm_conf_load_seconds', '从缓存中恢复配置值的耗时').time()
 def load():
     """
     从缓存中恢复配置值
@@ -15,6 +15,7 @@ from configparser import (
 )
 
 from . import conf as _conf
+from . import metrics as _metrics
 
 
 __all__ = ['COMMENT_NAME',
@@ -22,6 +23,7 @@ __all__ = ['COMMENT_NAME',
            'create',
            'fix',
            'get_ini_address_list',
+           'get_option',
            'NoOptionError',
            'NoSectionError',
            'NoCommentError',
@@ -148,6 +150,50 @@ def get_ini_address_list(sql_address_list: str | list) -> list[str]:
     return ini_address_list
 
 
+def get_option(section: str, option: str, fallback, *, name='ADM'):
+    """
+    从 :class:`core.base.conf.INIConnect` 中读取指定的选项
+
+    返回值的类型由 fallback 决定，支持 bool, int, float 以及 str，
+    当 INI文件 尚未初始化，或选项不存在时返回 fallback
+
+    :param section:
+        节名称
+
+    :param option:
+        选项名称
+
+    :param fallback:
+        缺省值，同时决定了返回值的类型
+
+    :param name:
+        INIConnect 中的配置名称，默认为 ADM，仅限关键字
+
+    :type section: str
+    :type option: str
+    :type name: str
+
+    :return:
+        转换类型后的选项值
+
+    :raise ValueError:
+        选项值无法被转换为 fallback 的类型时抛出
+    """
+    try:
+        configparser = _conf.INIConnect[str(name)]
+    except KeyError:
+        return fallback
+
+    if isinstance(fallback, bool):  # bool 需要先于 int 判断
+        return configparser.getboolean(section, option, fallback=fallback)
+    elif isinstance(fallback, int):
+        return configparser.getint(section, option, fallback=fallback)
+    elif isinstance(fallback, float):
+        return configparser.getfloat(section, option, fallback=fallback)
+    else:
+        return configparser.get(section, option, fallback=fallback)
+
+
 class NoCommentError(_Error):
     """当未找到选项对应的注释时引发的异常。"""
 
@@ -524,6 +570,7 @@ class ConfigParser(_ConfigParser):
         return new_fp_list
 
 
+@_metrics.histogram('adm_config_fix_seconds', '修复 INI文件 的耗时').time()
 def fix(sql_address_list: str | list) -> list[ConfigParser]:
     """
     用于修复损坏的 INI文件，并返回包含读取后的 ConfigParser类实例的列表
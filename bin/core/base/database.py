@@ -0,0 +1,130 @@
+# 数据库模块 (底层层)
+
+import os
+import sqlite3
+import threading
+import contextlib
+
+from typing import Iterator as _Iterator
+
+from . import conf as _conf
+
+
+__all__ = [
+    "get_address",
+    "connect",
+    "get_lock",
+    "transaction",
+    "close"
+]
+
+
+_locks: dict[str, threading.RLock] = {}
+_locks_lock = threading.Lock()
+
+
+def get_address(name: str) -> str:
+    """
+    返回位于 `Folder.DATABASE` 下的数据库的绝对地址
+
+    :param name:
+        数据库名称，不包括后缀
+
+    :type name: str
+
+    :return:
+        数据库的绝对地址
+    :rtype: str
+    """
+    return os.path.join(_conf.Folder.DATABASE, f"{name}.db")
+
+
+def connect(name: str) -> sqlite3.Connection:
+    """
+    返回全局共享的数据库连接，如果不存在则创建，并登记至 :class:`core.base.conf.DBConnect`
+
+    连接允许跨线程使用，并开启 WAL 模式，
+    写入时请使用 :func:`transaction` 以保证事务不被其他线程打断
+
+    :param name:
+        数据库名称，同时也是 DBConnect 内的配置名称
+
+    :type name: str
+
+    :return:
+        数据库连接
+    :rtype: sqlite3.Connection
+    """
+    name = str(name)
+    with get_lock(name):
+        try:
+            return _conf.DBConnect[name]
+        except KeyError:
+            pass
+
+        address = get_address(name)
+        os.makedirs(os.path.dirname(address), exist_ok=True)
+        connection = sqlite3.connect(address, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute("PRAGMA foreign_keys = ON")
+        _conf.DBConnect.new(name, connection)
+    return connection
+
+
+def get_lock(name: str) -> threading.RLock:
+    """
+    返回数据库对应的线程锁
+
+    :type name: str
+    :rtype: threading.RLock
+    """
+    with _locks_lock:
+        try:
+            return _locks[str(name)]
+        except KeyError:
+            lock = _locks[str(name)] = threading.RLock()
+            return lock
+
+
+@contextlib.contextmanager
+def transaction(name: str) -> _Iterator[sqlite3.Connection]:
+    """
+    以独占的方式使用数据库连接，退出时提交事务，出现异常时回滚
+
+    >>> with transaction('library') as connection:
+    ...     connection.execute(...)
+
+    :type name: str
+    """
+    connection = connect(name)
+    with get_lock(name):
+        try:
+            yield connection
+        except BaseException:
+            connection.rollback()
+            raise
+        else:
+            connection.commit()
+    return
+
+
+def close(name=None):
+    """
+    关闭数据库连接，并从 DBConnect 中移除
+
+    :param name:
+        数据库名称，默认为 None，即关闭所有的连接
+
+    :type name: str | None
+    """
+    names = list(_conf.DBConnect.get_data()) if name is None else [str(name)]
+    for name in names:
+        with get_lock(name):
+            try:
+                connection = _conf.DBConnect[name]
+            except KeyError:
+                continue
+            connection.close()
+            del _conf.DBConnect[name]
+    return
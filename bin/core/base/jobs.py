@@ -0,0 +1,587 @@
+# 任务调度模块 (底层层)
+
+import os
+import time
+import heapq
+import atexit
+import logging
+import itertools
+import threading
+import collections
+import concurrent.futures
+
+from typing import Callable as _Callable
+
+from . import config as _config
+from . import metrics as _metrics
+
+
+__all__ = [
+    "IO",
+    "CPU",
+    "HIGH",
+    "NORMAL",
+    "LOW",
+    "PENDING",
+    "WAITING",
+    "RUNNING",
+    "DONE",
+    "FAILED",
+    "CANCELLED",
+    "DependencyError",
+    "Job",
+    "Scheduler",
+    "current",
+    "get_scheduler"
+]
+
+
+IO = 'io'  #: I/O 密集的任务，在线程池中执行
+CPU = 'cpu'  #: CPU 密集的任务，在进程池中执行
+
+HIGH = 0  #: 高优先级，例如用户正在等待的任务
+NORMAL = 10  #: 默认优先级
+LOW = 20  #: 低优先级，例如后台的扫描与同步
+
+PENDING = 'pending'  #: 等待调度
+WAITING = 'waiting'  #: 等待依赖的任务完成
+RUNNING = 'running'  #: 正在执行
+DONE = 'done'  #: 已完成
+FAILED = 'failed'  #: 执行时抛出了异常
+CANCELLED = 'cancelled'  #: 已取消，或依赖的任务未能完成
+
+_FINISHED = frozenset({DONE, FAILED, CANCELLED})
+
+_SECTION = 'Jobs'  #: ADM INI文件 中任务配置所在的节
+
+_logger = logging.getLogger(__name__)
+_local = threading.local()
+
+_FINISHED_TOTAL = _metrics.counter('adm_jobs_finished_total', '已结束的任务数目', ('kind', 'status'))
+_SECONDS = _metrics.histogram('adm_jobs_seconds', '任务的执行耗时', ('kind',))
+
+
+class DependencyError(RuntimeError):
+    """
+    当任务依赖的任务失败或被取消时，该任务的 :meth:`Job.result` 抛出
+    """
+    pass
+
+
+class Job:
+    """
+    由 :meth:`Scheduler.submit` 创建的任务
+
+    线程池中的任务可以通过 :func:`current` 获取自身，用于报告进度与检查是否被取消，
+    进程池中的任务只会在开始与结束时更新进度，并且开始执行后无法取消
+    """
+
+    def __init__(self, scheduler: 'Scheduler', func: _Callable, args: tuple, kwargs: dict, *,
+                 name: str, kind: str, priority: int, device: int | None, depends: tuple['Job', ...]):
+        self.id = next(scheduler._ids)
+        self.name = name
+        self.kind = kind
+        self.priority = priority
+        self.device = device  #: 任务读写的设备号，为 None 时不受设备限制
+        self.depends = depends
+        self.status = PENDING
+        self.progress = 0.0  #: 进度，范围为 0 至 1
+        self.message = ''  #: 进度的附加说明
+        self.created = time.time()
+        self.started: float | None = None
+        self.finished: float | None = None
+
+        self._scheduler = scheduler
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._future: concurrent.futures.Future | None = None
+        self._result = None
+        self._error: BaseException | None = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+        return
+
+    @property
+    def cancelled(self) -> bool:
+        """
+        是否已请求取消，长时间运行的任务应定期检查并尽快返回
+        """
+        return self._cancel.is_set()
+
+    def cancel(self) -> bool:
+        """
+        取消任务，依赖该任务的任务也会被取消
+
+        未开始的任务会被直接取消，线程池中正在执行的任务只会被标记，由任务自身检查 :attr:`cancelled`
+
+        :return:
+            任务尚未结束时返回 True
+        :rtype: bool
+        """
+        return self._scheduler._cancel(self)
+
+    def report(self, done: float, total: float | None = None, message=''):
+        """
+        报告任务的进度
+
+        :param done:
+            已完成的数量，未指定 total 时为 0 至 1 的比例
+        :param total:
+            总数量
+        :param message:
+            进度的附加说明
+
+        :type done: float
+        :type total: float | None
+        :type message: str
+        """
+        progress = done / total if total else done
+        self.progress = min(max(float(progress), 0.0), 1.0)
+        self.message = message
+        self._scheduler._notify(self)
+        return
+
+    def done(self) -> bool:
+        """
+        任务是否已经结束，包括完成，失败与取消
+
+        :rtype: bool
+        """
+        return self.status in _FINISHED
+
+    def result(self, timeout=None):
+        """
+        等待任务结束并返回结果
+
+        :param timeout:
+            最长等待的秒数，为 None 时一直等待
+
+        :type timeout: float | None
+
+        :raise TimeoutError:
+            超时时抛出
+        :raise concurrent.futures.CancelledError:
+            任务被取消时抛出
+        :raise DependencyError:
+            依赖的任务失败或被取消时抛出
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"任务 {self.name} 未能在 {timeout} 秒内结束")
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def __lt__(self, other: 'Job') -> bool:
+        return (self.priority, self.id) < (other.priority, other.id)
+
+    def __repr__(self) -> str:
+        return f"<Job {self.id} {self.name} {self.kind} {self.status} {self.progress:.0%}>"
+
+
+def current() -> Job | None:
+    """
+    返回当前线程正在执行的任务，不在线程池的任务中调用时返回 None
+
+    :rtype: Job | None
+    """
+    return getattr(_local, 'job', None)
+
+
+def _parse_device_limits(value: str) -> dict[int, int]:
+    """
+    解析 device_limits 选项，格式为以分号分隔的 地址=数目，例如 D:\\=1; E:\\=4
+
+    地址为该设备上的任意已存在的文件夹，无法访问的地址会被忽略
+    """
+    limits = {}
+    for item in value.split(';'):
+        path, _, limit = item.strip().rpartition('=')
+        if not path:
+            continue
+        try:
+            limits[os.stat(path.strip()).st_dev] = int(limit)
+        except (OSError, ValueError):
+            _logger.warning("忽略了无效的设备限制 '%s'", item.strip())
+    return limits
+
+
+class Scheduler:
+    """
+    按照优先级调度后台任务
+
+    I/O 密集的任务在线程池中执行，CPU 密集的任务在进程池中执行，
+    每个池中同时执行的任务数目不超过池的大小，因此新提交的高优先级任务总是先于已在等待的低优先级任务开始，
+    同一优先级的任务按照提交顺序执行
+
+    指定了设备的任务还受到设备限制，同一设备上同时执行的任务数目不超过该设备的限制，
+    避免机械硬盘因为随机读取而大幅降速，此时会跳过该设备上的任务，先执行其他设备上的任务
+
+    配置读取自 ADM INI文件 的 Jobs 节::
+
+        io_workers     线程池的大小
+        cpu_workers    进程池的大小，默认为 CPU 数目
+        per_device     同一设备上同时执行的任务数目
+        device_limits  单独设置某些设备的限制，格式为以分号分隔的 地址=数目，例如 D:\\=1; E:\\=4
+    """
+
+    def __init__(self, *, io_workers=None, cpu_workers=None, per_device=None, device_limits=None):
+        """
+        :param io_workers:
+            线程池的大小，默认读取配置，仅限关键字
+        :param cpu_workers:
+            进程池的大小，默认读取配置，仅限关键字
+        :param per_device:
+            同一设备上同时执行的任务数目，默认读取配置，仅限关键字
+        :param device_limits:
+            以设备号为键的单独限制，默认读取配置，仅限关键字
+
+        :type io_workers: int | None
+        :type cpu_workers: int | None
+        :type per_device: int | None
+        :type device_limits: dict[int, int] | None
+        """
+        self.workers = {
+            IO: io_workers or _config.get_option(_SECTION, 'io_workers', min(32, (os.cpu_count() or 1) + 4)),
+            CPU: cpu_workers or _config.get_option(_SECTION, 'cpu_workers', os.cpu_count() or 1)
+        }
+        self.per_device = per_device or _config.get_option(_SECTION, 'per_device', 2)
+        self.device_limits = _parse_device_limits(_config.get_option(_SECTION, 'device_limits', '')) \
+            if device_limits is None else dict(device_limits)
+
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+        self._ready: dict[str, list[Job]] = {IO: [], CPU: []}  #: 可以执行的任务，按优先级排列的堆
+        self._running: collections.Counter[str] = collections.Counter()
+        self._devices: collections.Counter[int] = collections.Counter()
+        self._waiting: dict[Job, set[Job]] = {}  #: 等待依赖的任务与其未完成的依赖
+        self._dependents: dict[Job, list[Job]] = collections.defaultdict(list)
+        self._jobs: dict[int, Job] = {}
+        self._listeners: list[_Callable[[Job], None]] = []
+        self._executors: dict[str, concurrent.futures.Executor] = {}
+        self._closed = False
+        return
+
+    # ---------- 提交 ----------
+
+    def submit(self, func: _Callable, /, *args, kind=IO, priority=NORMAL, device=None, depends=(), name=None,
+               **kwargs) -> Job:
+        """
+        提交一个任务
+
+        :param func:
+            任务函数，CPU 任务的函数与参数需要可以被序列化
+        :param args:
+            任务函数的位置参数
+        :param kind:
+            IO 或 CPU，仅限关键字
+        :param priority:
+            优先级，数字越小越先执行，仅限关键字
+        :param device:
+            任务读写的设备，可以为设备号或该设备上的地址，仅限关键字
+        :param depends:
+            依赖的任务，全部完成后才会开始，仅限关键字
+        :param name:
+            任务名称，默认为函数名称，仅限关键字
+        :param kwargs:
+            任务函数的关键字参数
+
+        :type func: _Callable
+        :type kind: str
+        :type priority: int
+        :type device: int | conf.Path.StrPath | None
+        :type depends: typing.Iterable[Job]
+        :type name: str | None
+
+        :rtype: Job
+
+        :raise ValueError:
+            未知的任务类型时抛出
+        :raise RuntimeError:
+            调度器已关闭时抛出
+        """
+        if kind not in self.workers:
+            raise ValueError(f"'{kind}' 为未知的任务类型")
+        if device is not None and not isinstance(device, int):
+            device = os.stat(device).st_dev
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('调度器已关闭')
+            job = Job(self, func, args, kwargs, name=name or getattr(func, '__name__', repr(func)),
+                      kind=kind, priority=priority, device=device, depends=tuple(depends))
+            self._jobs[job.id] = job
+
+            failed = [item for item in job.depends if item.status in (FAILED, CANCELLED)]
+            pending = {item for item in job.depends if item.status not in _FINISHED}
+            if failed:
+                self._finish(job, CANCELLED, error=DependencyError(f"依赖的任务 {failed[0].name} 未能完成"))
+            elif pending:
+                job.status = WAITING
+                self._waiting[job] = pending
+                for item in pending:
+                    self._dependents[item].append(job)
+            else:
+                heapq.heappush(self._ready[kind], job)
+            self._dispatch()
+        return job
+
+    def map(self, func: _Callable, iterable, **options) -> list[Job]:
+        """
+        为 iterable 中的每个元素提交一个任务，options 与 :meth:`submit` 的关键字参数相同
+
+        :rtype: list[Job]
+        """
+        return [self.submit(func, item, **options) for item in iterable]
+
+    # ---------- 查询 ----------
+
+    def jobs(self) -> list[Job]:
+        """
+        返回所有未结束的任务
+
+        :rtype: list[Job]
+        """
+        with self._lock:
+            return [job for job in self._jobs.values() if not job.done()]
+
+    def subscribe(self, callback: _Callable[[Job], None]):
+        """
+        任务的状态或进度变化时调用 callback
+
+        callback 在任务所在的线程或调度器的内部线程中调用，应尽快返回且不应抛出异常
+
+        :type callback: _Callable[[Job], None]
+        """
+        with self._lock:
+            self._listeners.append(callback)
+        return
+
+    def unsubscribe(self, callback: _Callable[[Job], None]):
+        with self._lock:
+            self._listeners.remove(callback)
+        return
+
+    def _notify(self, job: Job):
+        for callback in list(self._listeners):
+            try:
+                callback(job)
+            except Exception:
+                _logger.exception('任务的监听函数抛出了异常')
+        return
+
+    # ---------- 调度 ----------
+
+    def _executor(self, kind: str) -> concurrent.futures.Executor:
+        executor = self._executors.get(kind)
+        if executor is None:
+            if kind == IO:
+                executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers[IO], thread_name_prefix='job')
+            else:
+                executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers[CPU])
+            self._executors[kind] = executor
+        return executor
+
+    def _discard(self, kind: str, executor: concurrent.futures.Executor):
+        """
+        丢弃因工作进程意外退出而损坏的池，下次提交时重新创建，需要持有锁
+        """
+        if self._executors.get(kind) is executor:
+            del self._executors[kind]
+            _logger.warning('%s 任务的池已损坏，将在下次提交时重新创建', kind)
+        return
+
+    def _limit(self, device: int) -> int:
+        return self.device_limits.get(device, self.per_device)
+
+    def _dispatch(self):
+        """
+        在池的空闲数目内按优先级开始任务，需要持有锁
+        """
+        for kind, ready in self._ready.items():
+            blocked = []
+            while ready and self._running[kind] < self.workers[kind]:
+                job = heapq.heappop(ready)
+                if job.device is not None and self._devices[job.device] >= self._limit(job.device):
+                    blocked.append(job)
+                    continue
+                self._start(job)
+            for job in blocked:
+                heapq.heappush(ready, job)
+        return
+
+    def _start(self, job: Job):
+        job.status = RUNNING
+        job.started = time.time()
+        self._running[job.kind] += 1
+        if job.device is not None:
+            self._devices[job.device] += 1
+        for _ in range(2):  # 池已损坏时重新创建后再尝试一次
+            executor = self._executor(job.kind)
+            try:
+                if job.kind == IO:
+                    future = executor.submit(self._run, job)
+                else:
+                    future = executor.submit(job._func, *job._args, **job._kwargs)
+                break
+            except concurrent.futures.BrokenExecutor as e:
+                self._discard(job.kind, executor)
+                error = e
+        else:
+            self._release(job)
+            self._finish(job, FAILED, error=error)
+            return
+        job._future = future
+        self._notify(job)
+        future.add_done_callback(lambda done: self._complete(job, done, executor))
+        return
+
+    @staticmethod
+    def _run(job: Job):
+        if job.cancelled:
+            raise concurrent.futures.CancelledError()
+        _local.job = job
+        try:
+            return job._func(*job._args, **job._kwargs)
+        finally:
+            _local.job = None
+
+    def _release(self, job: Job):
+        """
+        释放任务占用的池与设备的名额，需要持有锁
+        """
+        self._running[job.kind] -= 1
+        if job.device is not None:
+            self._devices[job.device] -= 1
+        return
+
+    def _complete(self, job: Job, future: concurrent.futures.Future, executor: concurrent.futures.Executor):
+        with self._lock:
+            self._release(job)
+            if future.cancelled():
+                self._finish(job, CANCELLED, error=concurrent.futures.CancelledError())
+            elif future.exception() is not None:
+                error = future.exception()
+                if isinstance(error, concurrent.futures.BrokenExecutor):  # 工作进程意外退出，池中所有的任务均失败
+                    self._discard(job.kind, executor)
+                self._finish(job, CANCELLED if isinstance(error, concurrent.futures.CancelledError) else FAILED,
+                             error=error)
+            elif job.cancelled:  # 任务检查到取消请求后提前返回
+                self._finish(job, CANCELLED, error=concurrent.futures.CancelledError())
+            else:
+                job.progress = 1.0
+                self._finish(job, DONE, result=future.result())
+            self._dispatch()
+        return
+
+    def _finish(self, job: Job, status: str, *, result=None, error=None):
+        """
+        结束任务并更新依赖该任务的任务，需要持有锁
+        """
+        job.status = status
+        job.finished = time.time()
+        job._result = result
+        job._error = error
+        job._func = job._args = job._kwargs = None  # 尽早释放参数与结果以外的引用
+        del self._jobs[job.id]
+        job._done.set()
+        _FINISHED_TOTAL.labels(job.kind, status).inc()
+        if job.started is not None:
+            _SECONDS.labels(job.kind).observe(job.finished - job.started)
+        if status == FAILED:
+            _logger.warning('任务 %s 执行失败: %r', job.name, error)
+        self._notify(job)
+
+        for dependent in self._dependents.pop(job, ()):
+            pending = self._waiting.get(dependent)
+            if pending is None:
+                continue
+            if status != DONE:
+                del self._waiting[dependent]
+                self._finish(dependent, CANCELLED, error=DependencyError(f"依赖的任务 {job.name} 未能完成"))
+                continue
+            pending.discard(job)
+            if not pending:
+                del self._waiting[dependent]
+                dependent.status = PENDING
+                heapq.heappush(self._ready[dependent.kind], dependent)
+        return
+
+    def _cancel(self, job: Job) -> bool:
+        with self._lock:
+            if job.done():
+                return False
+            job._cancel.set()
+            if job.status == RUNNING:
+                job._future.cancel()  # 仍在池的队列中时可以取消，否则由任务自身检查
+                self._notify(job)
+                return True
+            if job.status == WAITING:
+                for item in self._waiting.pop(job):
+                    self._dependents[item].remove(job)
+            else:
+                self._ready[job.kind].remove(job)
+                heapq.heapify(self._ready[job.kind])
+            self._finish(job, CANCELLED, error=concurrent.futures.CancelledError())
+        return True
+
+    # ---------- 关闭 ----------
+
+    def shutdown(self, wait=True, *, cancel=False):
+        """
+        关闭调度器，之后不能再提交任务
+
+        :param wait:
+            是否等待所有任务结束
+        :param cancel:
+            是否取消所有未结束的任务，仅限关键字
+
+        :type wait: bool
+        :type cancel: bool
+        """
+        with self._lock:
+            self._closed = True
+            jobs = list(self._jobs.values())
+        if cancel:
+            for job in jobs:
+                job.cancel()
+        if wait:
+            for job in jobs:
+                job._done.wait()
+        with self._lock:
+            executors, self._executors = self._executors, {}
+        for executor in executors.values():
+            executor.shutdown(wait=wait, cancel_futures=cancel)
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        return False
+
+
+_default: Scheduler | None = None
+_default_lock = threading.Lock()
+
+
+def get_scheduler() -> Scheduler:
+    """
+    返回全局共享的调度器，第一次调用时创建，因此应在 ADM INI文件 载入后调用
+
+    进程退出时会取消所有未结束的任务，其等待与正在执行的任务数目会被报告至 adm_jobs_queued 与 adm_jobs_running
+
+    :rtype: Scheduler
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Scheduler()
+            atexit.register(_default.shutdown, wait=False, cancel=True)
+            queued = _metrics.gauge('adm_jobs_queued', '等待执行的任务数目，不包括等待依赖的任务', ('kind',))
+            running = _metrics.gauge('adm_jobs_running', '正在执行的任务数目', ('kind',))
+            for kind in (IO, CPU):
+                queued.labels(kind).callback = lambda kind=kind: len(_default._ready[kind])
+                running.labels(kind).callback = lambda kind=kind: _default._running[kind]
+        return _default
@@ -0,0 +1,247 @@
+# 日志模块 (底层层)
+
+import os
+import atexit
+import logging
+import threading
+import logging.handlers
+
+from queue import SimpleQueue
+
+from . import conf as _conf
+from . import config as _config
+
+
+__all__ = [
+    "FORMAT",
+    "setup",
+    "shutdown",
+    "register",
+    "get_level"
+]
+
+
+FORMAT = '%(asctime)s [%(levelname)s] %(name)s (%(threadName)s): %(message)s'  #: 日志文件的格式
+
+_SECTION = 'Logging'  #: ADM INI文件 中日志配置所在的节
+_SIZE = 5 * 1024 * 1024  #: 单个日志文件的默认大小上限 (字节)
+
+_lock = threading.Lock()
+_state: dict = {}  #: 当前的 listener, queue_handler, router 与配置
+
+
+def get_level(level: int | str) -> int:
+    """
+    将日志等级的名称或数字统一为数字
+
+    :param level:
+        日志等级，例如 'info', 'INFO', '20' 或 20
+
+    :type level: int | str
+
+    :rtype: int
+
+    :raise ValueError:
+        未知的日志等级时抛出
+    """
+    if isinstance(level, int):
+        return level
+    level = str(level).strip().upper()
+    if level.isdigit():
+        return int(level)
+    value = logging.getLevelName(level)
+    if not isinstance(value, int):
+        raise ValueError(f"'{level}' 为未知的日志等级")
+    return value
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    只在调用线程中合并消息参数，格式化 (包括异常) 均在监听线程中完成
+
+    记录只在进程内传递，因此无需像默认实现一样复制记录并预先格式化
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()  # 参数可能在之后被修改，需要立即合并
+        record.args = None
+        return record
+
+
+class _RotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    按大小轮转的文件处理器，只在监听线程中使用
+
+    与默认实现相比::
+
+        1. 自行累计写入的字节数判断是否需要轮转，而不是每条记录都查询文件状态并重复格式化一次
+        #. 写入后不立即刷新缓冲区，由 _Router 在队列为空时统一刷新
+    """
+
+    def _open(self):
+        stream = super()._open()
+        self._size = os.fstat(stream.fileno()).st_size
+        return stream
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            message = self.format(record) + self.terminator
+            length = len(message.encode('utf8'))
+            if self.stream is None:
+                self.stream = self._open()
+            if 0 < self.maxBytes < self._size + length and self._size > 0:
+                self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+            self.stream.write(message)
+            self._size += length
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+        return
+
+
+class _Router(logging.Handler):
+    """
+    在监听线程中按照日志记录器的名称分发记录
+
+    名称以已注册的名称开头的记录写入对应的日志文件，其他记录写入主日志文件，
+    写入的文件在队列为空时才刷新，繁忙时多条记录合并为一次写入
+    """
+
+    def __init__(self, default: logging.Handler, queue: SimpleQueue):
+        super().__init__()
+        self.default = default
+        self.handlers: dict[str, logging.Handler] = {}
+        self._queue = queue
+        self._dirty: set[logging.Handler] = set()
+        return
+
+    def add(self, name: str, handler: logging.Handler):
+        handlers = dict(self.handlers)
+        handlers[name] = handler
+        self.handlers = dict(sorted(handlers.items(), key=lambda item: len(item[0]), reverse=True))  # 最长匹配优先
+        return
+
+    def emit(self, record: logging.LogRecord):
+        handler = self.default
+        name = record.name
+        for prefix, candidate in self.handlers.items():
+            if name == prefix or name.startswith(prefix + '.'):
+                handler = candidate
+                break
+        if record.levelno >= handler.level:
+            handler.handle(record)
+            self._dirty.add(handler)
+        if self._queue.empty():
+            self.flush()
+        return
+
+    def flush(self):
+        while self._dirty:
+            self._dirty.pop().flush()
+        return
+
+    def close(self):
+        self.flush()
+        for handler in (self.default, *self.handlers.values()):
+            handler.close()
+        super().close()
+        return
+
+
+def _file_handler(filename: str, number: int, size: int, level: int) -> logging.Handler:
+    handler = _RotatingFileHandler(os.path.join(_conf.Folder.LOGS, filename),
+                                   maxBytes=size if number > 0 else 0, backupCount=number,
+                                   encoding='utf8', delay=True)
+    handler.setFormatter(logging.Formatter(FORMAT))
+    handler.setLevel(level)
+    return handler
+
+
+def setup(number=5, level=logging.INFO, *, size=None):
+    """
+    初始化日志
+
+    根日志记录器只挂载一个将记录放入队列的处理器，
+    文件的写入与轮转均由后台的监听线程完成，记录日志的线程不会进行任何文件操作
+
+    日志写入 `Folder.LOGS` 下的 ADM.log，单个文件超过 size 后轮转，保留 number 个旧文件，
+    已登记在 `LogName` 中的日志会被写入各自的文件，参考 :func:`register`
+
+    重复调用时会先关闭之前的监听线程
+
+    :param number:
+        保留的旧日志文件数目，为 0 时不进行轮转
+    :param level:
+        日志等级，可以为名称或数字
+    :param size:
+        单个日志文件的大小上限 (字节)，默认读取 ADM INI文件 Logging 节的 size 选项，仅限关键字
+
+    :type number: int
+    :type level: int | str
+    :type size: int | None
+    """
+    level = get_level(level)
+    size = size or _config.get_option(_SECTION, 'size', _SIZE)
+    shutdown()
+
+    with _lock:
+        os.makedirs(_conf.Folder.LOGS, exist_ok=True)
+        queue = SimpleQueue()
+        router = _Router(_file_handler(f"{_conf.Project.SHORT_NAME.value}.log", number, size, level), queue)
+        for name in _conf.LogName.get_data():
+            router.add(name, _file_handler(_conf.LogName[name], number, size, level))
+
+        queue_handler = _QueueHandler(queue)
+        listener = logging.handlers.QueueListener(queue, router)
+        listener.start()
+
+        root = logging.getLogger()
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+        _state.update(listener=listener, queue_handler=queue_handler, router=router,
+                      number=number, size=size, level=level)
+    return
+
+
+def shutdown():
+    """
+    写入队列中剩余的记录并关闭监听线程与日志文件，未初始化时不做任何事
+
+    在进程退出时会被自动调用
+    """
+    with _lock:
+        if not _state:
+            return
+        logging.getLogger().removeHandler(_state['queue_handler'])
+        _state['listener'].stop()  # 等待监听线程处理完队列中的记录
+        _state['router'].close()
+        _state.clear()
+    return
+
+
+def register(name: str, filename: str | None = None):
+    """
+    将名称为 name 的日志记录器 (包括其子记录器) 的记录写入单独的日志文件
+
+    名称与文件名会被记录在 `LogName` 中，之后的 :func:`setup` 会自动恢复
+
+    :param name:
+        日志记录器的名称
+    :param filename:
+        `Folder.LOGS` 下的文件名，默认为 name 加上 .log 后缀
+
+    :type name: str
+    :type filename: str | None
+    """
+    filename = filename or f"{name}.log"
+    _conf.LogName[name] = filename
+    with _lock:
+        if _state:
+            _state['router'].add(name, _file_handler(filename, _state['number'], _state['size'], _state['level']))
+    return
+
+
+atexit.register(shutdown)
@@ -0,0 +1,429 @@
+# 指标模块 (底层层)
+
+import re
+import math
+import time
+import bisect
+import threading
+import contextlib
+
+from typing import Callable as _Callable, Iterator as _Iterator
+
+
+__all__ = [
+    "CONTENT_TYPE",
+    "DEFAULT_BUCKETS",
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "Registry",
+    "registry",
+    "counter",
+    "gauge",
+    "histogram",
+    "expose"
+]
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'  #: Prometheus 文本格式的 Content-Type
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  #: 默认的直方图桶上限 (秒)
+
+_NAME = re.compile(r'[a-zA-Z_:][a-zA-Z0-9_:]*')
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _escape_help(value: str) -> str:
+    return value.replace('\\', r'\\').replace('\n', r'\n')
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Sharded:
+    """
+    按线程分片储存数据的基类
+
+    每个线程第一次写入时创建自己的分片，之后的写入只修改该分片，无需加锁，
+    读取时合并所有分片，已退出的线程的分片会被合并进 _retired 后丢弃
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: list[tuple[threading.Thread, list]] = []
+        self._retired = self._new()
+        return
+
+    def _new(self) -> list:
+        raise NotImplementedError
+
+    @staticmethod
+    def _merge(target: list, shard: list):
+        raise NotImplementedError
+
+    def _shard(self) -> list:
+        shard = self._new()
+        with self._lock:
+            self._shards.append((threading.current_thread(), shard))
+        self._local.shard = shard
+        return shard
+
+    def _collect(self) -> list:
+        """
+        返回合并所有分片后的数据
+        """
+        with self._lock:
+            alive = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    self._merge(self._retired, shard)
+            self._shards = alive
+            total = list(self._retired)
+            for _, shard in alive:
+                self._merge(total, shard)
+        return total
+
+
+class _Metric:
+    """
+    指标的基类
+
+    指定了 labelnames 的指标本身不储存数据，需要通过 :meth:`labels` 获取对应标签值的子指标
+    """
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames=(), *, _labels=None):
+        if not _NAME.fullmatch(name):
+            raise ValueError(f"'{name}' 不是有效的指标名称")
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._labels: dict[str, str] = _labels or {}
+        self._children: dict[tuple[str, ...], _Metric] = {}
+        self._children_lock = threading.Lock()
+        return
+
+    def labels(self, *values) -> '_Metric':
+        """
+        返回标签值对应的子指标，第一次调用时创建
+
+        :param values:
+            按照 labelnames 顺序排列的标签值
+
+        :raise ValueError:
+            标签值的数目与 labelnames 不一致时抛出
+        """
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"指标 {self.name} 需要 {len(self.labelnames)} 个标签值")
+            with self._children_lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._child(dict(zip(self.labelnames, values)))
+                    self._children[values] = child
+        return child
+
+    def _child(self, labels: dict[str, str]) -> '_Metric':
+        raise NotImplementedError
+
+    def _samples(self) -> _Iterator[tuple[str, dict[str, str], float]]:
+        raise NotImplementedError
+
+    def samples(self) -> list[tuple[str, dict[str, str], float]]:
+        """
+        返回指标的所有样本，每个样本为 (名称, 标签, 值)
+
+        :rtype: list[tuple[str, dict[str, str], float]]
+        """
+        if self.labelnames:
+            with self._children_lock:
+                children = list(self._children.values())
+            return [sample for child in children for sample in child._samples()]
+        return list(self._samples())
+
+
+class Counter(_Metric, _Sharded):
+    """
+    只增不减的计数器，例如请求数目，缓存命中数目
+    """
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), *, _labels=None):
+        _Metric.__init__(self, name, documentation, labelnames, _labels=_labels)
+        _Sharded.__init__(self)
+        return
+
+    def _new(self) -> list:
+        return [0]
+
+    @staticmethod
+    def _merge(target: list, shard: list):
+        target[0] += shard[0]
+        return
+
+    def _child(self, labels: dict[str, str]) -> 'Counter':
+        return Counter(self.name, self.documentation, _labels=labels)
+
+    def inc(self, amount=1):
+        """
+        增加计数
+
+        :type amount: int | float
+        """
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._shard()
+        shard[0] += amount
+        return
+
+    @property
+    def value(self) -> float:
+        return self._collect()[0]
+
+    def _samples(self):
+        yield self.name, self._labels, self.value
+
+
+class Gauge(_Metric):
+    """
+    可增可减的测量值，例如队列长度
+
+    指定 callback 时在读取时调用 callback 获取当前值，适用于已有数据结构的长度等无需主动更新的值
+    """
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), *, callback=None, _labels=None):
+        super().__init__(name, documentation, labelnames, _labels=_labels)
+        self.callback: _Callable[[], float] | None = callback
+        self._value = 0
+        self._lock = threading.Lock()
+        return
+
+    def _child(self, labels: dict[str, str]) -> 'Gauge':
+        return Gauge(self.name, self.documentation, _labels=labels)
+
+    def set(self, value: float):
+        self._value = value
+        return
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+        return
+
+    def dec(self, amount=1):
+        with self._lock:
+            self._value -= amount
+        return
+
+    @property
+    def value(self) -> float:
+        if self.callback is not None:
+            return self.callback()
+        return self._value
+
+    def _samples(self):
+        yield self.name, self._labels, self.value
+
+
+class Histogram(_Metric, _Sharded):
+    """
+    固定桶的直方图，例如耗时的分布
+
+    每个样本只会被计入其所在的一个桶，读取时再累加为 Prometheus 所需的累计计数
+    """
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), *, buckets=DEFAULT_BUCKETS, _labels=None):
+        _Metric.__init__(self, name, documentation, labelnames, _labels=_labels)
+        self.buckets = tuple(sorted(float(bucket) for bucket in buckets if bucket != math.inf))
+        _Sharded.__init__(self)
+        return
+
+    def _new(self) -> list:
+        return [0] * (len(self.buckets) + 1) + [0.0, 0]  # 各个桶 (最后一个为 +Inf), 总和, 数目
+
+    @staticmethod
+    def _merge(target: list, shard: list):
+        for index, value in enumerate(shard):
+            target[index] += value
+        return
+
+    def _child(self, labels: dict[str, str]) -> 'Histogram':
+        return Histogram(self.name, self.documentation, buckets=self.buckets, _labels=labels)
+
+    def observe(self, value: float):
+        """
+        记录一个样本
+
+        :type value: float
+        """
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._shard()
+        shard[bisect.bisect_left(self.buckets, value)] += 1
+        shard[-2] += value
+        shard[-1] += 1
+        return
+
+    @contextlib.contextmanager
+    def time(self) -> _Iterator[None]:
+        """
+        记录上下文的耗时 (秒)::
+
+            with histogram.time():
+                ...
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+        return
+
+    def _samples(self):
+        data = self._collect()
+        cumulative = 0
+        for bucket, count in zip((*self.buckets, math.inf), data):
+            cumulative += count
+            yield f"{self.name}_bucket", {**self._labels, 'le': _format_value(bucket)}, cumulative
+        yield f"{self.name}_sum", self._labels, data[-2]
+        yield f"{self.name}_count", self._labels, data[-1]
+
+
+class Registry:
+    """
+    指标的集合，同一名称的指标只会被创建一次
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+        return
+
+    def _get(self, cls: type, name: str, documentation: str, labelnames, **kwargs) -> _Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"指标 {name} 已被注册为不同的类型或标签")
+        return metric
+
+    def counter(self, name: str, documentation='', labelnames=()) -> Counter:
+        """
+        返回名称为 name 的计数器，不存在时创建
+
+        :rtype: Counter
+
+        :raise ValueError:
+            名称已被注册为不同的类型或标签时抛出
+        """
+        return self._get(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation='', labelnames=(), *, callback=None) -> Gauge:
+        """
+        返回名称为 name 的测量值，不存在时创建，已存在时 callback 会被替换
+
+        :rtype: Gauge
+
+        :raise ValueError:
+            名称已被注册为不同的类型或标签时抛出
+        """
+        metric = self._get(Gauge, name, documentation, labelnames)
+        if callback is not None:
+            metric.callback = callback
+        return metric
+
+    def histogram(self, name: str, documentation='', labelnames=(), *, buckets=DEFAULT_BUCKETS) -> Histogram:
+        """
+        返回名称为 name 的直方图，不存在时创建
+
+        :rtype: Histogram
+
+        :raise ValueError:
+            名称已被注册为不同的类型或标签时抛出
+        """
+        return self._get(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def unregister(self, name: str):
+        with self._lock:
+            self._metrics.pop(name, None)
+        return
+
+    def metrics(self) -> list[_Metric]:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def expose(self) -> str:
+        """
+        返回所有指标的 Prometheus 文本格式
+
+        :rtype: str
+        """
+        lines = []
+        for metric in sorted(self.metrics(), key=lambda item: item.name):
+            try:
+                samples = metric.samples()
+            except Exception as e:  # callback 的异常不影响其他指标
+                lines.append(f"# {metric.name} 读取失败: {e!r}".replace('\n', ' '))
+                continue
+            if metric.documentation:
+                lines.append(f"# HELP {metric.name} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()  #: 全局的指标集合
+
+
+def counter(name: str, documentation='', labelnames=()) -> Counter:
+    """
+    返回全局指标集合中名称为 name 的计数器，参考 :meth:`Registry.counter`
+    """
+    return registry.counter(name, documentation, labelnames)
+
+
+def gauge(name: str, documentation='', labelnames=(), *, callback=None) -> Gauge:
+    """
+    返回全局指标集合中名称为 name 的测量值，参考 :meth:`Registry.gauge`
+    """
+    return registry.gauge(name, documentation, labelnames, callback=callback)
+
+
+def histogram(name: str, documentation='', labelnames=(), *, buckets=DEFAULT_BUCKETS) -> Histogram:
+    """
+    返回全局指标集合中名称为 name 的直方图，参考 :meth:`Registry.histogram`
+    """
+    return registry.histogram(name, documentation, labelnames, buckets=buckets)
+
+
+def expose() -> str:
+    """
+    返回全局指标集合的 Prometheus 文本格式
+    """
+    return registry.expose()
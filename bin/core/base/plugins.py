@@ -0,0 +1,977 @@
+# 插件模块 (底层层)
+
+import io
+import os
+import re
+import ast
+import sys
+import json
+import time
+import queue
+import types
+import logging
+import traceback
+import functools
+import tokenize
+import threading
+import importlib.util
+import multiprocessing
+
+from multiprocessing import shared_memory
+
+from . import conf as _conf
+from . import config as _config
+
+
+__all__ = [
+    "REPLACE",
+    "DEFAULT",
+    "MANIFEST_NAME",
+    "read_manifest",
+    "PluginProcessError",
+    "Plugin",
+    "ProcessPool",
+    "Registry",
+    "registry",
+    "hook"
+]
+
+
+REPLACE = 'r'  #: 钩子的 r 模式，被钩住的方法没有实现，未被插件钩住时抛出 NeedHookError
+DEFAULT = 'd'  #: 钩子的 d 模式，未被插件钩住或插件均不支持当前调用时执行原方法
+
+MANIFEST_NAME = 'PLUGIN'  #: 插件清单的变量名称
+
+_MANIFEST_PATTERN = re.compile(rf'^{MANIFEST_NAME}\s*(?::[^=\n]*)?='.encode(), flags=re.M)  #: 清单赋值语句的开头
+
+_PACKAGE = 'adm_plugins'  #: 插件被导入时所在的包名称
+_SECTION = 'Plugins'  #: ADM INI文件 中插件配置所在的节
+_INDEX_VERSION = 2  #: 清单索引的格式版本，变化时索引缓存失效
+
+_logger = logging.getLogger(__name__)
+
+
+def _parse_statement(source: bytes) -> ast.Assign | ast.AnnAssign | None:
+    """
+    解析 source 开头的一条赋值语句
+
+    :return:
+        赋值语句的节点，无法解析时返回 None
+    :rtype: ast.Assign | ast.AnnAssign | None
+    """
+    try:
+        for token in tokenize.tokenize(io.BytesIO(source).readline):
+            if token.type == tokenize.NEWLINE:  # 括号内的换行为 NL，NEWLINE 即为语句的结束
+                break
+        else:
+            return None
+        tree = ast.parse(b'\n'.join(source.splitlines()[:token.end[0]]))
+    except (SyntaxError, tokenize.TokenError):
+        return None
+    node = tree.body[0] if tree.body else None
+    return node if isinstance(node, (ast.Assign, ast.AnnAssign)) and node.value is not None else None
+
+
+def read_manifest(path: str) -> dict:
+    """
+    在不执行代码的情况下读取插件清单
+
+    插件清单是插件模块 (单文件插件) 或 `__init__.py` (包插件) 中顶层的 PLUGIN 字典，
+    其中只能包含字面量，例如::
+
+        PLUGIN = {
+            'version': '0.1.0',
+            'priority': 0,
+            'heavy': False,
+            'hooks': {
+                'core.rule.organise.parse': 'parse',
+                'core.net.rss.fetch': 'Fetcher.fetch',
+            },
+        }
+
+    hooks 的键为钩子名称，值为模块内实现的属性名称，可以使用 `.` 访问嵌套的属性，
+    heavy 为 True 的插件会在 :class:`ProcessPool` 的子进程中执行
+
+    清单需要位于行首，读取时只会解析清单所在的语句，插件中其他部分的语法错误在导入时才会发现
+
+    :param path:
+        插件模块或 `__init__.py` 的地址
+
+    :type path: str
+
+    :return:
+        规范化后的清单，包括 version, priority, heavy 和 hooks
+    :rtype: dict
+
+    :raise ValueError:
+        未找到清单或清单格式错误时抛出
+    """
+    with open(path, mode='rb') as fp:
+        source = fp.read()
+
+    error = f"'{path}' 中未找到插件清单 {MANIFEST_NAME}"
+    for match in _MANIFEST_PATTERN.finditer(source):  # 只解析清单所在的语句，不解析整个模块
+        node = _parse_statement(source[match.start():])
+        if node is None:
+            error = f"'{path}' 中的插件清单 {MANIFEST_NAME} 存在语法错误"
+            continue
+        try:
+            manifest = ast.literal_eval(node.value)
+        except ValueError:  # 也可能是位于文档字符串中的示例，继续查找
+            error = f"'{path}' 中的插件清单 {MANIFEST_NAME} 只能包含字面量"
+            continue
+        break
+    else:
+        raise ValueError(error)
+
+    if not isinstance(manifest, dict):
+        raise ValueError(f"'{path}' 中的插件清单应当为字典")
+    hooks = manifest.get('hooks', {})
+    if not isinstance(hooks, dict) or not all(isinstance(key, str) and isinstance(value, str)
+                                              for key, value in hooks.items()):
+        raise ValueError(f"'{path}' 中插件清单的 hooks 应当为字符串到字符串的字典")
+    priority = manifest.get('priority', 0)
+    if not isinstance(priority, int):
+        raise ValueError(f"'{path}' 中插件清单的 priority 应当为整数")
+    heavy = manifest.get('heavy', False)
+    if not isinstance(heavy, bool):
+        raise ValueError(f"'{path}' 中插件清单的 heavy 应当为布尔值")
+    return {'version': str(manifest.get('version', '')), 'priority': priority, 'heavy': heavy, 'hooks': hooks}
+
+
+def _candidate(entry: os.DirEntry) -> tuple[str, str] | None:
+    """
+    判断文件夹中的条目是否为插件
+
+    :return:
+        插件名称与清单所在文件的地址，不是插件时返回 None
+    :rtype: tuple[str, str] | None
+    """
+    if entry.name.startswith(('_', '.')):
+        return None
+    if entry.is_dir():
+        init = os.path.join(entry.path, '__init__.py')
+        return (entry.name, init) if os.path.isfile(init) else None
+    if entry.name.endswith('.py'):
+        return entry.name.removesuffix('.py'), entry.path
+    return None
+
+
+class Plugin:
+    """
+    一个插件，模块在第一次被使用时才会导入
+
+    导入耗时记录在 import_time 中，导入失败时插件会被停用，错误记录在 error 中
+    """
+
+    def __init__(self, name: str, path: str, manifest: dict, *, builtin=False):
+        """
+        :param name:
+            插件名称
+        :param path:
+            清单所在文件的地址
+        :param manifest:
+            :func:`read_manifest` 返回的清单
+        :param builtin:
+            是否为内置插件
+
+        :type name: str
+        :type path: str
+        :type manifest: dict
+        :type builtin: bool
+        """
+        self.name = name
+        self.path = path
+        self.version = manifest['version']
+        self.priority = manifest['priority']
+        self.hooks: dict[str, str] = manifest['hooks']
+        self.heavy: bool = manifest.get('heavy', False)
+        self.builtin = builtin
+
+        self.import_time: float | None = None  #: 导入耗时 (秒)，尚未导入时为 None
+        self.error: BaseException | None = None  #: 导致插件被停用的异常
+
+        self._module = None
+        self._resolved = {}
+        self._lock = threading.Lock()
+        return
+
+    def __repr__(self) -> str:
+        return f"<Plugin {self.name} {'loaded' if self.loaded else 'lazy'}>"
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    @property
+    def module(self) -> types.ModuleType:
+        """
+        插件模块，第一次访问时导入
+
+        :raise ImportError:
+            插件已停用或导入失败时抛出
+        """
+        if self._module is not None:
+            return self._module
+        with self._lock:
+            if self._module is None:
+                if self.error is not None:
+                    raise ImportError(f"插件 '{self.name}' 已停用") from self.error
+                try:
+                    self._module = self._import()
+                except BaseException as e:
+                    self.error = e
+                    _logger.exception("插件 '%s' 导入失败，已停用", self.name)
+                    raise ImportError(f"插件 '{self.name}' 导入失败") from e
+        return self._module
+
+    def _import(self) -> types.ModuleType:
+        if _PACKAGE not in sys.modules:  # 插件的父包，使插件之间可以互相导入
+            package = types.ModuleType(_PACKAGE)
+            package.__path__ = []
+            sys.modules[_PACKAGE] = package
+
+        fullname = f"{_PACKAGE}.{self.name}"
+        is_package = os.path.basename(self.path) == '__init__.py'
+        spec = importlib.util.spec_from_file_location(
+            fullname, self.path,
+            submodule_search_locations=[os.path.dirname(self.path)] if is_package else None)
+        module = importlib.util.module_from_spec(spec)
+
+        start = time.perf_counter()
+        sys.modules[fullname] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            sys.modules.pop(fullname, None)
+            raise
+        finally:
+            self.import_time = time.perf_counter() - start
+        _logger.debug("插件 '%s' 导入耗时 %.2f ms", self.name, self.import_time * 1000)
+        return module
+
+    def resolve(self, point: str):
+        """
+        返回插件中 point 钩子的实现，必要时导入插件
+
+        :param point:
+            钩子名称
+
+        :type point: str
+
+        :return:
+            钩子的实现，清单中声明的属性不存在时返回 None
+
+        :raise ImportError:
+            插件已停用或导入失败时抛出
+        """
+        try:
+            return self._resolved[point]
+        except KeyError:
+            pass
+        target = self.module
+        try:
+            for attr in self.hooks[point].split('.'):
+                target = getattr(target, attr)
+        except AttributeError:
+            _logger.error("插件 '%s' 未实现清单中声明的 '%s'，已忽略钩子 '%s'", self.name, self.hooks[point], point)
+            target = None
+        self._resolved[point] = target
+        return target
+
+
+class PluginProcessError(RuntimeError):
+    """
+    当执行插件的子进程意外退出时抛出
+
+    子进程会被自动重启，不影响之后的调用
+    """
+    pass
+
+
+# ---------- 进程池 ----------
+# 在子进程中执行 heavy 插件，避免占用主进程的 GIL
+
+_OK = 'ok'  #: 调用成功
+_ERROR = 'error'  #: 插件实现抛出了异常
+_UNAVAILABLE = 'unavailable'  #: 插件在子进程中导入失败
+_MISSING = 'missing'  #: 插件未实现清单中声明的属性
+
+
+class _Unavailable(Exception):
+    pass
+
+
+class _Missing(Exception):
+    pass
+
+
+class _Shared:
+    """
+    通过共享内存传递的缓冲区，只记录共享内存的名称与大小
+    """
+    __slots__ = ('name', 'size')
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+        return
+
+    def __getstate__(self):
+        return self.name, self.size
+
+    def __setstate__(self, state):
+        self.name, self.size = state
+        return
+
+
+def _pack(value, threshold: int, created: list):
+    """
+    将不小于 threshold 字节的缓冲区写入新建的共享内存，其他值原样返回
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        view = memoryview(value).cast('B')
+        if view.nbytes >= threshold:
+            shm = shared_memory.SharedMemory(create=True, size=view.nbytes)
+            created.append(shm)
+            shm.buf[:view.nbytes] = view
+            return _Shared(shm.name, view.nbytes)
+    return value
+
+
+def _release(opened: list):
+    for shm, view in opened:
+        try:
+            view.release()
+            shm.close()
+        except BufferError:  # 插件仍持有缓冲区的引用，映射在其被回收后释放
+            pass
+    opened.clear()
+    return
+
+
+def _worker(connection, threshold: int):
+    """
+    子进程的入口，依次执行主进程发送的调用
+
+    共享内存中的参数以 memoryview 的形式传入插件实现，调用结束后失效；
+    不小于 threshold 字节的返回值通过共享内存返回，在接收下一个调用时关闭
+    (Windows 中共享内存在所有句柄关闭后即被销毁，需要等待主进程打开)
+    """
+    _logger.disabled = True  # 错误均会返回主进程记录，避免重复输出
+    plugins: dict[str, Plugin] = {}
+    created = []
+    opened = []
+    while True:
+        try:
+            name, path, hooks, point, args, kwargs = connection.recv()
+        except (EOFError, OSError):
+            return
+        for shm in created:
+            shm.close()
+        created.clear()
+
+        plugin = plugins.get(name)
+        if plugin is None or plugin.path != path or plugin.hooks != hooks:
+            plugin = plugins[name] = Plugin(name, path, {'version': '', 'priority': 0, 'hooks': hooks})
+        try:
+            implementation = plugin.resolve(point)
+        except ImportError as e:
+            connection.send((_UNAVAILABLE, ''.join(traceback.format_exception(e.__cause__ or e)).rstrip()))
+            continue
+        if implementation is None:
+            connection.send((_MISSING, plugin.hooks[point]))
+            continue
+
+        try:
+            args = [_unpack(value, opened) for value in args]
+            kwargs = {key: _unpack(value, opened) for key, value in kwargs.items()}
+            message = (_OK, _pack(implementation(*args, **kwargs), threshold, created))
+        except BaseException as e:
+            message = (_ERROR, e)
+        finally:
+            del args, kwargs
+            _release(opened)
+
+        try:
+            connection.send(message)
+        except Exception:  # 结果或异常无法序列化，序列化在写入前完成，不会破坏管道
+            connection.send((_ERROR, PluginProcessError(''.join(traceback.format_exception(*sys.exc_info())))))
+
+
+def _unpack(value, opened: list):
+    if isinstance(value, _Shared):
+        shm = shared_memory.SharedMemory(name=value.name)
+        view = shm.buf[:value.size]
+        opened.append((shm, view))
+        return view
+    return value
+
+
+class _Process:
+    """
+    进程池中的一个子进程与其管道
+    """
+
+    def __init__(self, context, threshold: int):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_worker, args=(child, threshold), daemon=True,
+                                       name='ADM-Plugin-Worker')
+        self.process.start()
+        child.close()
+        return
+
+    def stop(self, *, kill=False):
+        if kill:
+            self.process.kill()
+        self.connection.close()  # 子进程读取到 EOF 后退出
+        self.process.join(None if kill else 1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        return
+
+
+class ProcessPool:
+    """
+    执行 heavy 插件的进程池
+
+    子进程在 :meth:`start` 时预先创建，每个子进程同一时间只执行一个调用，
+    超时的调用所在的子进程会被终止，意外退出的子进程会被替换，均不影响主进程与其他调用
+
+    参数与返回值需要能被序列化，其中顶层的 bytes, bytearray 与 memoryview
+    在不小于阈值时通过共享内存传递，子进程中的插件实现会获得只在调用期间有效的 memoryview
+
+    配置读取自 ADM INI文件 的 Plugins 节::
+
+        workers        子进程数目
+        timeout        单个调用的超时时间 (秒)
+        shared_memory  使用共享内存传递缓冲区的阈值 (字节)
+    """
+
+    def __init__(self, workers=None, *, timeout=None, threshold=None):
+        """
+        :param workers:
+            子进程数目，默认读取配置
+        :param timeout:
+            单个调用的超时时间 (秒)，默认读取配置，仅限关键字
+        :param threshold:
+            使用共享内存传递缓冲区的阈值 (字节)，默认读取配置，仅限关键字
+
+        :type workers: int | None
+        :type timeout: float | None
+        :type threshold: int | None
+        """
+        self.workers = workers or _config.get_option(_SECTION, 'workers', min(4, os.cpu_count() or 1))
+        self.timeout = timeout or _config.get_option(_SECTION, 'timeout', 60.0)
+        self.threshold = threshold or _config.get_option(_SECTION, 'shared_memory', 1024 * 1024)
+        self.stats = {'tasks': 0, 'timeouts': 0, 'crashes': 0}  #: 调用，超时与意外退出的次数
+
+        self._context = multiprocessing.get_context('spawn')  # 与 Windows 保持一致，同时避免 fork 带有线程的进程
+        self._idle: queue.SimpleQueue[_Process] = queue.SimpleQueue()
+        self._processes: set[_Process] = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        return
+
+    def start(self):
+        """
+        创建所有子进程，已经创建时不做任何事
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('进程池已关闭')
+            while len(self._processes) < self.workers:
+                process = _Process(self._context, self.threshold)
+                self._processes.add(process)
+                self._idle.put(process)
+        return
+
+    def close(self):
+        """
+        关闭所有子进程，正在执行的调用会被终止
+        """
+        with self._lock:
+            self._closed = True
+            processes, self._processes = self._processes, set()
+        for process in processes:
+            process.stop()
+        return
+
+    def _replace(self, process: _Process):
+        """
+        终止子进程并创建新的子进程替代
+        """
+        process.stop(kill=True)
+        with self._lock:
+            self._processes.discard(process)
+            if not self._closed:
+                process = _Process(self._context, self.threshold)
+                self._processes.add(process)
+                self._idle.put(process)
+        return
+
+    def call(self, plugin: Plugin, point: str, args: tuple, kwargs: dict, *, timeout=None):
+        """
+        在子进程中调用插件 point 钩子的实现，没有空闲的子进程时等待
+
+        :param plugin:
+            插件
+        :param point:
+            钩子名称
+        :param args:
+            位置参数
+        :param kwargs:
+            关键字参数
+        :param timeout:
+            超时时间 (秒)，默认为 timeout 属性，仅限关键字
+
+        :type plugin: Plugin
+        :type point: str
+        :type args: tuple
+        :type kwargs: dict
+        :type timeout: float | None
+
+        :return:
+            插件实现的返回值，通过共享内存返回的缓冲区为 bytes
+
+        :raise TimeoutError:
+            调用超时时抛出
+        :raise PluginProcessError:
+            子进程意外退出时抛出
+        """
+        if not self._processes:
+            self.start()
+        timeout = self.timeout if timeout is None else timeout
+
+        created = []
+        try:
+            task = (plugin.name, plugin.path, plugin.hooks, point,
+                    [_pack(value, self.threshold, created) for value in args],
+                    {key: _pack(value, self.threshold, created) for key, value in kwargs.items()})
+            process = self._idle.get()
+            self.stats['tasks'] += 1
+            try:
+                process.connection.send(task)
+                if not process.connection.poll(timeout):
+                    self.stats['timeouts'] += 1
+                    self._replace(process)
+                    raise TimeoutError(f"插件 '{plugin.name}' 的钩子 '{point}' 超过 {timeout} 秒未返回")
+                status, value = process.connection.recv()
+            except (EOFError, ConnectionError) as e:
+                self.stats['crashes'] += 1
+                process.process.join(1)
+                exitcode = process.process.exitcode
+                self._replace(process)
+                raise PluginProcessError(f"执行插件 '{plugin.name}' 的子进程意外退出，"
+                                         f"退出码为 {exitcode}") from e
+            else:
+                if isinstance(value, _Shared):  # 在子进程接收下一个调用前打开共享内存
+                    shm = shared_memory.SharedMemory(name=value.name)
+                    try:
+                        value = bytes(shm.buf[:value.size])
+                    finally:
+                        shm.close()
+                        shm.unlink()
+                self._idle.put(process)
+        finally:
+            for shm in created:
+                shm.close()
+                shm.unlink()
+
+        if status == _OK:
+            return value
+        if status == _UNAVAILABLE:
+            raise _Unavailable(value)
+        if status == _MISSING:
+            raise _Missing(value)
+        raise value
+
+
+def _need_hook(point: str, *args, **kwargs):
+    raise _conf.NeedHookError(f"'{point}' 未被插件钩住")
+
+
+def _dispatcher(table: tuple, fallback):
+    """
+    将调度表编译为调用入口
+
+    依次调用 table 中的实现，返回第一个支持当前调用的结果，均不支持时调用 fallback；
+    没有实现时直接返回 fallback，只有一个实现时省去循环
+    """
+    if not table:
+        return fallback
+
+    if len(table) == 1:
+        implementation = table[0]
+
+        def call(*args, **kwargs):
+            try:
+                return implementation(*args, **kwargs)
+            except _conf.PluginsTypeError:
+                pass
+            return fallback(*args, **kwargs)
+
+        return call
+
+    def call(*args, **kwargs):
+        for implementation in table:
+            try:
+                return implementation(*args, **kwargs)
+            except _conf.PluginsTypeError:
+                continue
+        return fallback(*args, **kwargs)
+
+    return call
+
+
+class _Slot:
+    """
+    一个被钩住的函数的调度表
+
+    table 为按调用顺序排列的实现，尚未导入的插件以导入后重新编译的跳板占位，
+    call 为编译后的调用入口，插件变化时由注册表重新编译
+    """
+    __slots__ = ('point', 'default', 'table', 'call')
+
+    def __init__(self, point: str, default):
+        self.point = point
+        self.default = default
+        self.table = ()
+        self.call = default or functools.partial(_need_hook, point)
+        return
+
+
+class Registry:
+    """
+    插件注册表
+
+    启动时只读取 `Folder.PLUGINS` 中各个插件的清单而不导入代码，
+    清单被缓存在 `Folder.CACHE` 下的 plugins.json 中，
+    只有大小或修改时间发生变化的插件才会被重新解析，
+    插件在第一次有钩子被调用时才会导入
+
+    每个被钩住的函数在注册表中都有一个调度表，插件变化时重新编译，
+    调用时不再查找插件，没有插件钩住时直接调用原方法
+
+    heavy 插件不会在主进程中导入，其钩子在 :class:`ProcessPool` 的子进程中执行
+    """
+
+    def __init__(self):
+        self._plugins: dict[str, Plugin] = {}
+        self._hooks: dict[str, list[Plugin]] = {}
+        self._slots: dict[str, list[_Slot]] = {}
+        self._lock = threading.Lock()
+        self._pool: ProcessPool | None = None
+        self.stats = {}  #: 最近一次载入的统计信息
+        return
+
+    @property
+    def pool(self) -> ProcessPool:
+        """
+        执行 heavy 插件的进程池，第一次访问时创建
+        """
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPool()
+        return self._pool
+
+    def close(self):
+        """
+        关闭进程池
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
+        return
+
+    # ---------- 清单索引 ----------
+
+    @staticmethod
+    def _read_index(path: str) -> dict:
+        try:
+            with open(path, encoding='utf8') as fp:
+                index = json.load(fp)
+        except (FileNotFoundError, ValueError):
+            return {}
+        if index.get('version') != _INDEX_VERSION:
+            return {}
+        return index.get('plugins', {})
+
+    @staticmethod
+    def _write_index(path: str, plugins: dict):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, encoding='utf8', mode='w') as fp:
+            json.dump({'version': _INDEX_VERSION, 'plugins': plugins}, fp, ensure_ascii=False)
+        os.replace(temp, path)
+        return
+
+    def index(self, folder=None, *, cache=None) -> dict[str, dict]:
+        """
+        返回插件文件夹的清单索引，只重新解析发生变化的插件
+
+        解析失败的插件也会被记录在索引中 (包含 error)，在其变化前不会被重复解析
+
+        :param folder:
+            插件文件夹，默认为 `Folder.PLUGINS`
+        :param cache:
+            索引缓存文件，默认为 `Folder.CACHE` 下的 plugins.json
+
+        :type folder: conf.Path.StrPath | None
+        :type cache: conf.Path.StrPath | None
+
+        :return:
+            以插件名称为键，值为包含 path, signature 以及清单内容或 error 的字典
+        :rtype: dict[str, dict]
+        """
+        folder = str(folder or _conf.Folder.PLUGINS)
+        cache = str(cache or os.path.join(_conf.Folder.CACHE, 'plugins.json'))
+
+        cached = self._read_index(cache)
+        index = {}
+        parsed = 0
+        try:
+            entries = list(os.scandir(folder))
+        except FileNotFoundError:
+            entries = []
+        for entry in sorted(entries, key=lambda e: e.name):
+            candidate = _candidate(entry)
+            if candidate is None:
+                continue
+            name, path = candidate
+            stat = os.stat(path)
+            signature = [stat.st_size, stat.st_mtime_ns]
+            old = cached.get(name)
+            if old is not None and old['path'] == path and old['signature'] == signature:
+                index[name] = old
+                continue
+
+            parsed += 1
+            item = {'path': path, 'signature': signature}
+            try:
+                item.update(read_manifest(path))
+            except (ValueError, OSError) as e:
+                item['error'] = f"{e.__class__.__name__}: {e}"
+                _logger.warning("插件 '%s' 的清单无法读取: %s", name, item['error'])
+            index[name] = item
+
+        if index != cached:
+            self._write_index(cache, index)
+        self.stats['parsed'] = parsed
+        return index
+
+    # ---------- 注册 ----------
+
+    def load(self, folder=None, *, cache=None):
+        """
+        读取清单索引并注册其中的所有插件，已注册的插件会被替换
+
+        :param folder:
+            插件文件夹，默认为 `Folder.PLUGINS`
+        :param cache:
+            索引缓存文件，默认为 `Folder.CACHE` 下的 plugins.json
+
+        :type folder: conf.Path.StrPath | None
+        :type cache: conf.Path.StrPath | None
+        """
+        start = time.perf_counter()
+        builtin = {str(member.value) for member in _conf.BuiltinPlugins}
+        plugins = [Plugin(name, item['path'], item, builtin=name in builtin)
+                   for name, item in self.index(folder, cache=cache).items() if 'error' not in item]
+        with self._lock:
+            self._plugins = {}
+            for plugin in plugins:
+                self._plugins[plugin.name] = plugin
+            self._rebuild()
+        if any(plugin.heavy for plugin in plugins):  # 预先创建子进程
+            self.pool.start()
+        self.stats.update(plugins=len(plugins), seconds=time.perf_counter() - start)
+        return
+
+    def register(self, plugin: Plugin):
+        """
+        注册一个插件，同名插件会被替换
+
+        :type plugin: Plugin
+        """
+        with self._lock:
+            self._plugins[plugin.name] = plugin
+            self._rebuild()
+        return
+
+    def unregister(self, name: str):
+        """
+        移除一个插件，插件不存在时不做任何事
+
+        :type name: str
+        """
+        with self._lock:
+            if self._plugins.pop(name, None) is not None:
+                self._rebuild()
+        return
+
+    def _rebuild(self):
+        """
+        重建钩子到插件的映射并重新编译所有调度表，优先级高的插件在前，同优先级时用户插件先于内置插件
+        """
+        hooks = {}
+        order = sorted(self._plugins.values(), key=lambda p: (-p.priority, p.builtin, p.name))
+        for plugin in order:
+            for point in plugin.hooks:
+                hooks.setdefault(point, []).append(plugin)
+        self._hooks = hooks
+        for slots in self._slots.values():
+            for slot in slots:
+                self._compile(slot)
+        return
+
+    def _compile(self, slot: _Slot):
+        table = []
+        for plugin in self._hooks.get(slot.point, ()):
+            if plugin.error is not None:
+                continue
+            if plugin.heavy:
+                if plugin._resolved.get(slot.point, True) is not None:
+                    table.append(functools.partial(self._remote, plugin, slot.point))
+            elif slot.point in plugin._resolved:
+                implementation = plugin._resolved[slot.point]
+                if implementation is not None:
+                    table.append(implementation)
+            else:
+                table.append(functools.partial(self._lazy, plugin, slot.point))
+        slot.table = tuple(table)
+        slot.call = _dispatcher(slot.table, slot.default or functools.partial(_need_hook, slot.point))
+        return
+
+    def _lazy(self, plugin: Plugin, point: str, *args, **kwargs):
+        """
+        调度表中尚未导入的插件的跳板，导入插件后重新编译其钩住的所有调度表，再调用其实现
+        """
+        try:
+            for name in plugin.hooks:
+                plugin.resolve(name)
+        except ImportError:
+            pass
+        with self._lock:
+            for name in plugin.hooks:
+                for slot in self._slots.get(name, ()):
+                    self._compile(slot)
+        implementation = plugin._resolved.get(point)
+        if implementation is None:  # 导入失败或实现不存在，交由下一个插件处理
+            raise _conf.PluginsTypeError
+        return implementation(*args, **kwargs)
+
+    def _remote(self, plugin: Plugin, point: str, *args, **kwargs):
+        """
+        调度表中 heavy 插件的实现，在进程池中执行
+        """
+        try:
+            return self.pool.call(plugin, point, args, kwargs)
+        except _Unavailable as e:
+            plugin.error = ImportError(f"插件 '{plugin.name}' 导入失败")
+            _logger.error("插件 '%s' 在子进程中导入失败，已停用\n%s", plugin.name, e)
+        except _Missing as e:
+            plugin._resolved[point] = None
+            _logger.error("插件 '%s' 未实现清单中声明的 '%s'，已忽略钩子 '%s'", plugin.name, e, point)
+        with self._lock:
+            for name in plugin.hooks:
+                for slot in self._slots.get(name, ()):
+                    self._compile(slot)
+        raise _conf.PluginsTypeError  # 交由下一个插件处理
+
+    def attach(self, point: str, default) -> _Slot:
+        """
+        为被钩住的函数创建调度表
+
+        :param point:
+            钩子名称
+        :param default:
+            没有插件支持当前调用时调用的原方法，为 None 时抛出 NeedHookError
+
+        :type point: str
+
+        :rtype: _Slot
+        """
+        slot = _Slot(point, default)
+        with self._lock:
+            self._slots.setdefault(point, []).append(slot)
+            self._compile(slot)
+        return slot
+
+    def plugins(self) -> list[Plugin]:
+        """
+        返回所有已注册的插件
+
+        :rtype: list[Plugin]
+        """
+        return list(self._plugins.values())
+
+    def implementations(self, point: str) -> list[Plugin]:
+        """
+        返回钩住 point 的插件，按调用顺序排列
+
+        :type point: str
+
+        :rtype: list[Plugin]
+        """
+        return self._hooks.get(point, [])
+
+    def timings(self) -> dict[str, float]:
+        """
+        返回已导入插件的导入耗时 (秒)，按耗时从高到低排列
+
+        :rtype: dict[str, float]
+        """
+        loaded = [plugin for plugin in self._plugins.values() if plugin.import_time is not None]
+        loaded.sort(key=lambda p: p.import_time, reverse=True)
+        return {plugin.name: plugin.import_time for plugin in loaded}
+
+
+registry = Registry()  #: 全局的插件注册表，由 :func:`core.base.setup` 载入
+
+
+def hook(point: str, mode=DEFAULT, *, target: Registry | None = None):
+    """
+    将函数或方法标记为名称为 point 的钩子，调用时会先交由插件处理
+
+    用法如下::
+
+        @plugins.hook('core.rule.organise.parse')
+        def parse(name):
+            ...  # 没有插件支持时的默认实现
+
+        @plugins.hook('core.net.rss.fetch', plugins.REPLACE)
+        def fetch(self, url):
+            ...  # 必须由插件实现
+
+    插件实现抛出 :class:`core.base.conf.PluginsTypeError` 表示不支持当前的调用，
+    此时会尝试下一个插件，该插件仍然保持注册；
+    导入失败的插件与不存在的实现会被跳过
+
+    :param point:
+        钩子名称，建议使用被钩住函数的完整名称
+    :param mode:
+        钩子模式，为 REPLACE 或 DEFAULT
+    :param target:
+        使用的注册表，默认为全局的 registry，仅限关键字
+
+    :type point: str
+    :type mode: str
+    :type target: Registry | None
+    """
+    if mode not in (REPLACE, DEFAULT):
+        raise ValueError(f"'{mode}' 为不支持的钩子模式")
+
+    def decorator(func):
+        slot = (target or registry).attach(point, None if mode == REPLACE else func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return slot.call(*args, **kwargs)
+
+        wrapper.hook_point = point
+        return wrapper
+
+    return decorator
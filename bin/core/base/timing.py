@@ -0,0 +1,253 @@
+# 计时模块 (底层层)
+
+import os
+import json
+import time
+import datetime
+import threading
+import contextlib
+
+from typing import Iterator as _Iterator
+
+from . import conf as _conf
+
+
+__all__ = [
+    "ENVIRON",
+    "JSON",
+    "CHROME",
+    "Span",
+    "Profile",
+    "span",
+    "record",
+    "active"
+]
+
+
+ENVIRON = 'ADM_PROFILE'  #: 开启启动报告的环境变量，值为报告格式
+JSON = 'json'  #: JSON 树格式的报告
+CHROME = 'chrome'  #: Chrome trace 格式的报告，可以在 chrome://tracing 或 Perfetto 中打开
+
+_active = None  #: 正在记录的 Profile，为 None 时 span 不做任何事
+
+
+class _NullSpan:
+    """
+    未在记录时 span 返回的空上下文管理器，所有调用共享同一个实例
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL = _NullSpan()
+
+
+class Span:
+    """
+    一个计时区间，可以嵌套
+    """
+    __slots__ = ('name', 'attrs', 'thread', 'start', 'end', 'children', '_profile')
+
+    def __init__(self, profile: 'Profile', name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.thread = threading.get_ident()
+        self.start = 0  #: 开始时间 (纳秒)
+        self.end = 0  #: 结束时间 (纳秒)
+        self.children: list[Span] = []
+        self._profile = profile
+        return
+
+    @property
+    def duration(self) -> float:
+        """
+        持续时间 (秒)
+        """
+        return (self.end - self.start) / 1e9
+
+    def __enter__(self):
+        self._profile._push(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.end = time.perf_counter_ns()
+        self._profile._pop(self)
+        return False
+
+    def __repr__(self) -> str:
+        return f"<Span {self.name} {self.duration * 1000:.3f} ms>"
+
+
+class Profile:
+    """
+    一次记录中的所有计时区间
+
+    每个线程各自维护嵌套关系，没有父区间的区间为根区间
+    """
+
+    def __init__(self, name: str):
+        """
+        :param name:
+            记录的名称，同时用于报告的文件名
+
+        :type name: str
+        """
+        self.name = name
+        self.created = datetime.datetime.now()
+        self.origin = time.perf_counter_ns()
+        self.roots: list[Span] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        return
+
+    def _push(self, item: Span):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        if stack:
+            stack[-1].children.append(item)
+        else:
+            with self._lock:
+                self.roots.append(item)
+        stack.append(item)
+        return
+
+    def _pop(self, item: Span):
+        stack = self._local.stack
+        while stack and stack.pop() is not item:  # 未正确退出的子区间一并结束
+            pass
+        return
+
+    # ---------- 报告 ----------
+
+    def _tree(self, item: Span) -> dict:
+        return {
+            'name': item.name,
+            'attrs': item.attrs,
+            'thread': item.thread,
+            'start_ms': round((item.start - self.origin) / 1e6, 3),
+            'duration_ms': round((item.end - item.start) / 1e6, 3),
+            'children': [self._tree(child) for child in item.children]
+        }
+
+    def to_json(self) -> dict:
+        """
+        返回 JSON 树格式的报告
+
+        :rtype: dict
+        """
+        return {
+            'name': self.name,
+            'created': self.created.isoformat(),
+            'pid': os.getpid(),
+            'spans': [self._tree(item) for item in self.roots]
+        }
+
+    def to_chrome(self) -> dict:
+        """
+        返回 Chrome trace 格式的报告，每个区间为一个完整事件 (ph 为 X)
+
+        :rtype: dict
+        """
+        events = []
+        pid = os.getpid()
+        pending = list(self.roots)
+        while pending:
+            item = pending.pop()
+            events.append({
+                'name': item.name,
+                'cat': self.name,
+                'ph': 'X',
+                'ts': (item.start - self.origin) / 1000,
+                'dur': (item.end - item.start) / 1000,
+                'pid': pid,
+                'tid': item.thread,
+                'args': item.attrs
+            })
+            pending.extend(item.children)
+        events.sort(key=lambda event: event['ts'])
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def dump(self, fmt=JSON, folder=None) -> str:
+        """
+        将报告写入文件，文件名包含记录的名称，创建时间与进程号
+
+        :param fmt:
+            报告格式，为 JSON 或 CHROME
+        :param folder:
+            报告所在的文件夹，默认为 `Folder.LOGS`
+
+        :type fmt: str
+        :type folder: conf.Path.StrPath | None
+
+        :return:
+            报告的绝对地址
+        :rtype: str
+
+        :raise ValueError:
+            不支持的报告格式时抛出
+        """
+        if fmt == JSON:
+            data, suffix = self.to_json(), '.json'
+        elif fmt == CHROME:
+            data, suffix = self.to_chrome(), '.trace.json'
+        else:
+            raise ValueError(f"'{fmt}' 为不支持的报告格式")
+        folder = str(folder or _conf.Folder.LOGS)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{self.name}-{self.created:%Y%m%d-%H%M%S}-{os.getpid()}{suffix}")
+        with open(path, encoding='utf8', mode='w') as fp:
+            json.dump(data, fp, ensure_ascii=False, indent=1)
+        return path
+
+
+def span(name: str, /, **attrs) -> Span | _NullSpan:
+    """
+    创建一个计时区间，用作上下文管理器::
+
+        with timing.span('config', name='ADM'):
+            ...
+
+    未在记录时返回共享的空上下文管理器，开销仅为一次全局变量的读取
+
+    :param name:
+        区间名称
+    :param attrs:
+        附加信息，会被写入报告
+
+    :type name: str
+    """
+    if _active is None:
+        return _NULL
+    return Span(_active, name, attrs)
+
+
+@contextlib.contextmanager
+def record(profile: Profile) -> _Iterator[Profile]:
+    """
+    在上下文中将所有线程的计时区间记录至 profile，退出时恢复之前的状态
+
+    :type profile: Profile
+    """
+    global _active
+    previous, _active = _active, profile
+    try:
+        yield profile
+    finally:
+        _active = previous
+    return
+
+
+def active() -> Profile | None:
+    """
+    返回正在记录的 Profile，未在记录时返回 None
+
+    :rtype: Profile | None
+    """
+    return _active
@@ -0,0 +1,6 @@
+from . import library
+
+
+__all__ = [
+    "library"
+]
@@ -0,0 +1,428 @@
+# 媒体库模块 (数据层)
+
+import os
+import json
+import time
+import base64
+import sqlite3
+import threading
+
+from typing import Iterator as _Iterator
+
+from ..base import config as _config
+from ..base import database as _database
+
+
+__all__ = [
+    "LIBRARY",
+    "series_scope",
+    "encode_cursor",
+    "decode_cursor",
+    "Library"
+]
+
+
+LIBRARY = 'library'  #: 整个媒体库的代数范围，任何写入均会增加
+
+_SECTION = 'Library'  #: ADM INI文件 中媒体库配置所在的节
+_DATABASE = 'library'  #: 媒体库的数据库名称
+
+# 每个查询由表、列、排序键与过滤条件构成，排序键均被索引覆盖，并且以 id 结尾以保证唯一
+_SERIES = ('series', 'id, title, year, added', ('title', 'id'), '1')
+_EPISODES = ('episode', 'id, series, season, number, title, aired', ('season', 'number', 'id'), 'series = ?')
+_FILES = ('media_file', 'id, episode, path, size, mtime', ('id',), 'episode = ?')
+_ALL_FILES = ('media_file', 'id, episode, path, size, mtime', ('id',), '1')
+
+
+def series_scope(series: int) -> str:
+    """
+    返回系列的代数范围，该系列及其剧集与文件的写入均会增加
+
+    :type series: int
+    :rtype: str
+    """
+    return f"series:{series}"
+
+
+def encode_cursor(values) -> str:
+    """
+    将排序键的值编码为不透明的游标
+
+    :rtype: str
+    """
+    return base64.urlsafe_b64encode(json.dumps(list(values), ensure_ascii=False).encode('utf8')).decode('ascii')
+
+
+def decode_cursor(cursor: str, length: int) -> list:
+    """
+    解码游标
+
+    :param cursor:
+        :func:`encode_cursor` 返回的游标
+
+    :param length:
+        排序键的数目
+
+    :type cursor: str
+    :type length: int
+
+    :rtype: list
+
+    :raise ValueError:
+        游标无效时抛出
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"无效的游标 '{cursor}'") from e
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError(f"无效的游标 '{cursor}'")
+    return values
+
+
+# noinspection SqlResolve
+class Library:
+    """
+    媒体库，储存于 library 数据库中，由系列、剧集与文件三张表构成
+
+    查询均使用键集分页 (keyset pagination)，即根据上一页最后一行的排序键继续查询，
+    查询代价只与每页的大小有关，而与页面的深度无关
+
+    读取使用每个线程独立的只读连接，在 WAL 模式下不会与写入互相阻塞，
+    写入使用 :func:`core.base.database.transaction`
+
+    每次写入均会在同一事务中增加受影响范围的代数 (generation)，即 LIBRARY 与 :func:`series_scope`，
+    缓存的键包含代数，因此扫描后只有实际变化的内容会失效
+
+    配置读取自 ADM INI文件 的 Library 节::
+
+        page_size      默认的每页行数
+        max_page_size  每页行数的上限
+    """
+
+    def __init__(self, *, database=_DATABASE):
+        """
+        :param database:
+            媒体库的数据库名称，仅限关键字
+
+        :type database: str
+        """
+        self.page_size = _config.get_option(_SECTION, 'page_size', 100)
+        self.max_page_size = _config.get_option(_SECTION, 'max_page_size', 1000)
+
+        self._database = database
+        self._local = threading.local()
+        with _database.transaction(self._database) as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS series ("
+                               "id INTEGER PRIMARY KEY, "
+                               "title TEXT NOT NULL, "
+                               "year INTEGER, "
+                               "added REAL NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS episode ("
+                               "id INTEGER PRIMARY KEY, "
+                               "series INTEGER NOT NULL REFERENCES series (id) ON DELETE CASCADE, "
+                               "season INTEGER NOT NULL DEFAULT 1, "
+                               "number INTEGER NOT NULL, "
+                               "title TEXT, "
+                               "aired TEXT)")
+            connection.execute("CREATE TABLE IF NOT EXISTS media_file ("
+                               "id INTEGER PRIMARY KEY, "
+                               "episode INTEGER REFERENCES episode (id) ON DELETE SET NULL, "
+                               "path TEXT NOT NULL UNIQUE, "
+                               "size INTEGER NOT NULL, "
+                               "mtime REAL NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS generation ("
+                               "scope TEXT PRIMARY KEY, "
+                               "value INTEGER NOT NULL) WITHOUT ROWID")
+            connection.execute("CREATE INDEX IF NOT EXISTS series_title ON series (title, id)")
+            connection.execute("CREATE INDEX IF NOT EXISTS episode_order ON episode (series, season, number, id)")
+            connection.execute("CREATE INDEX IF NOT EXISTS media_file_episode ON media_file (episode, id)")
+        return
+
+    @property
+    def reader(self) -> sqlite3.Connection:
+        """
+        当前线程的只读连接
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            address = _database.get_address(self._database)
+            connection = sqlite3.connect(f"file:{address}?mode=ro", uri=True)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA query_only = ON")
+            connection.execute("PRAGMA mmap_size = 268435456")
+            self._local.connection = connection
+        return connection
+
+    def limit(self, limit=None) -> int:
+        """
+        返回限制在 1 与 max_page_size 之间的每页行数
+
+        :type limit: int | None
+        :rtype: int
+        """
+        return max(1, min(self.page_size if limit is None else int(limit), self.max_page_size))
+
+    # ---------- 分页 ----------
+
+    def _page(self, query: tuple, params: tuple, cursor: str | None, limit) -> tuple[list[dict], str | None]:
+        """
+        查询一页
+
+        :return:
+            行的列表与下一页的游标，已是最后一页时游标为 None
+        """
+        table, columns, keys, where = query
+        limit = self.limit(limit)
+        order = ', '.join(keys)
+        sql = f"SELECT {columns} FROM {table} WHERE {where}"
+        if cursor is not None:
+            values = decode_cursor(cursor, len(keys))
+            sql += f" AND ({order}) > ({', '.join('?' * len(keys))})"
+            params = (*params, *values)
+        sql += f" ORDER BY {order} LIMIT ?"
+
+        rows = [dict(row) for row in self.reader.execute(sql, (*params, limit + 1))]
+        if len(rows) <= limit:
+            return rows, None
+        rows.pop()
+        return rows, encode_cursor(rows[-1][key] for key in keys)
+
+    def series(self, cursor=None, limit=None) -> tuple[list[dict], str | None]:
+        """
+        按标题分页查询系列
+
+        :param cursor:
+            上一页返回的游标，默认为 None，即第一页
+
+        :param limit:
+            每页行数，默认为 page_size
+
+        :type cursor: str | None
+        :type limit: int | None
+
+        :return:
+            行的列表与下一页的游标，已是最后一页时游标为 None
+        :rtype: tuple[list[dict], str | None]
+
+        :raise ValueError:
+            游标无效时抛出
+        """
+        return self._page(_SERIES, (), cursor, limit)
+
+    def episodes(self, series: int, cursor=None, limit=None) -> tuple[list[dict], str | None]:
+        """
+        按季与集数分页查询系列的剧集，参数与返回值同 :meth:`series`
+
+        :type series: int
+        :rtype: tuple[list[dict], str | None]
+        """
+        return self._page(_EPISODES, (series,), cursor, limit)
+
+    def files(self, episode=None, cursor=None, limit=None) -> tuple[list[dict], str | None]:
+        """
+        分页查询剧集的文件，episode 为 None 时查询所有文件，参数与返回值同 :meth:`series`
+
+        :type episode: int | None
+        :rtype: tuple[list[dict], str | None]
+        """
+        if episode is None:
+            return self._page(_ALL_FILES, (), cursor, limit)
+        return self._page(_FILES, (episode,), cursor, limit)
+
+    def get_file(self, file: int) -> dict | None:
+        """
+        查询指定编号的文件
+
+        :type file: int
+
+        :return:
+            文件的行，不存在时返回 None
+        :rtype: dict | None
+        """
+        row = self.reader.execute(f"SELECT {_FILES[1]} FROM media_file WHERE id = ?", (file,)).fetchone()
+        return None if row is None else dict(row)
+
+    def iterate(self, method: str, *args, cursor=None, chunk=None) -> _Iterator[list[dict]]:
+        """
+        逐页遍历查询结果，用于流式输出
+
+        >>> for rows in library.iterate('episodes', 1):
+        ...     pass
+
+        :param method:
+            'series'、'episodes' 或 'files'
+
+        :param cursor:
+            开始的游标，默认为 None，即从头开始，仅限关键字
+
+        :param chunk:
+            每页行数，默认为 max_page_size，仅限关键字
+
+        :type method: str
+        :type cursor: str | None
+        :type chunk: int | None
+        """
+        page = getattr(self, method)
+        while True:
+            rows, cursor = page(*args, cursor=cursor, limit=chunk or self.max_page_size)
+            if rows:
+                yield rows
+            if cursor is None:
+                return
+
+    def get_series(self, series: int) -> dict | None:
+        """
+        查询指定编号的系列
+
+        :type series: int
+
+        :return:
+            系列的行，不存在时返回 None
+        :rtype: dict | None
+        """
+        row = self.reader.execute(f"SELECT {_SERIES[1]} FROM series WHERE id = ?", (series,)).fetchone()
+        return None if row is None else dict(row)
+
+    def summary(self, series: list[int]) -> dict[int, dict]:
+        """
+        统计系列的剧集数目、文件数目与文件总大小
+
+        :type series: list[int]
+
+        :return:
+            以系列编号为键的字典，值包括 episodes、files 与 size
+        :rtype: dict[int, dict]
+        """
+        result = {index: {'episodes': 0, 'files': 0, 'size': 0} for index in series}
+        for row in self.reader.execute(
+                f"SELECT episode.series, COUNT(DISTINCT episode.id), COUNT(media_file.id), "
+                f"COALESCE(SUM(media_file.size), 0) FROM episode "
+                f"LEFT JOIN media_file ON media_file.episode = episode.id "
+                f"WHERE episode.series IN ({', '.join('?' * len(series))}) GROUP BY episode.series", series):
+            result[row[0]] = {'episodes': row[1], 'files': row[2], 'size': row[3]}
+        return result
+
+    def series_files(self, series: int) -> list[dict]:
+        """
+        返回系列的所有剧集，每个剧集的 files 键为其文件的列表
+
+        :type series: int
+        :rtype: list[dict]
+        """
+        episodes = {}
+        for row in self.reader.execute(
+                "SELECT episode.id, episode.season, episode.number, episode.title, episode.aired, "
+                "media_file.id AS file, media_file.path, media_file.size FROM episode "
+                "LEFT JOIN media_file ON media_file.episode = episode.id "
+                "WHERE episode.series = ? ORDER BY episode.season, episode.number, episode.id, media_file.id",
+                (series,)):
+            episode = episodes.setdefault(row['id'], {key: row[key] for key in
+                                                      ('id', 'season', 'number', 'title', 'aired')} | {'files': []})
+            if row['file'] is not None:
+                episode['files'].append({'id': row['file'], 'path': row['path'], 'size': row['size']})
+        return list(episodes.values())
+
+    # ---------- 代数 ----------
+
+    def generations(self, scopes: list[str]) -> dict[str, int]:
+        """
+        返回各个范围的代数，从未写入的范围为 0
+
+        :type scopes: list[str]
+        :rtype: dict[str, int]
+        """
+        result = dict.fromkeys(scopes, 0)
+        result.update(self.reader.execute(f"SELECT scope, value FROM generation "
+                                          f"WHERE scope IN ({', '.join('?' * len(scopes))})", scopes).fetchall())
+        return result
+
+    def generation(self, scope=LIBRARY) -> int:
+        """
+        返回范围的代数
+
+        :type scope: str
+        :rtype: int
+        """
+        return self.generations([scope])[scope]
+
+    @staticmethod
+    def _bump(connection: sqlite3.Connection, scopes):
+        connection.executemany("INSERT INTO generation VALUES (?, 1) "
+                               "ON CONFLICT (scope) DO UPDATE SET value = value + 1",
+                               [(scope,) for scope in {LIBRARY, *scopes}])
+        return
+
+    def bump(self, series=()):
+        """
+        增加媒体库与指定系列的代数，绕过本类直接批量写入数据库后需要调用
+
+        :param series:
+            发生变化的系列编号的可迭代对象
+
+        :type series: typing.Iterable[int]
+        """
+        with _database.transaction(self._database) as connection:
+            self._bump(connection, [series_scope(index) for index in series])
+        return
+
+    # ---------- 写入 ----------
+
+    def add_series(self, title: str, year=None) -> int:
+        """
+        :type title: str
+        :type year: int | None
+
+        :return:
+            系列的编号
+        :rtype: int
+        """
+        with _database.transaction(self._database) as connection:
+            series = connection.execute("INSERT INTO series (title, year, added) VALUES (?, ?, ?)",
+                                        (title, year, time.time())).lastrowid
+            self._bump(connection, [series_scope(series)])
+        return series
+
+    def add_episode(self, series: int, number: int, *, season=1, title=None, aired=None) -> int:
+        """
+        :type series: int
+        :type number: int
+        :type season: int
+        :type title: str | None
+        :type aired: str | None
+
+        :return:
+            剧集的编号
+        :rtype: int
+        """
+        with _database.transaction(self._database) as connection:
+            episode = connection.execute("INSERT INTO episode (series, season, number, title, aired) "
+                                         "VALUES (?, ?, ?, ?, ?)", (series, season, number, title, aired)).lastrowid
+            self._bump(connection, [series_scope(series)])
+        return episode
+
+    def add_file(self, path, episode=None) -> int:
+        """
+        登记文件，文件已登记时更新其大小、修改时间与所属剧集
+
+        :type path: conf.Path.StrPath
+        :type episode: int | None
+
+        :return:
+            文件的编号
+        :rtype: int
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with _database.transaction(self._database) as connection:
+            series = connection.execute("SELECT episode.series FROM media_file "  # 原先所属的系列同样发生变化
+                                        "JOIN episode ON episode.id = media_file.episode "
+                                        "WHERE media_file.path = ?", (path,)).fetchall()
+            connection.execute("INSERT INTO media_file (episode, path, size, mtime) VALUES (?, ?, ?, ?) "
+                               "ON CONFLICT (path) DO UPDATE SET "
+                               "episode = excluded.episode, size = excluded.size, mtime = excluded.mtime",
+                               (episode, path, stat.st_size, stat.st_mtime))
+            file = connection.execute("SELECT id FROM media_file WHERE path = ?", (path,)).fetchone()[0]
+            series += connection.execute("SELECT series FROM episode WHERE id = ?", (episode,)).fetchall()
+            self._bump(connection, [series_scope(row[0]) for row in series])
+        return file
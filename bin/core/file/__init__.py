@@ -0,0 +1,14 @@
+from . import hash
+from . import duplicate
+from . import watch
+from . import transfer
+from . import probe
+
+
+__all__ = [
+    "hash",
+    "duplicate",
+    "watch",
+    "transfer",
+    "probe"
+]
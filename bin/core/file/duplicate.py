@@ -0,0 +1,333 @@
+# 重复文件模块 (文件层)
+
+import os
+import time
+import hashlib
+import collections
+import concurrent.futures
+
+from typing import Iterable as _Iterable
+
+from . import hash as _hash
+from ..base import config as _config
+from ..base import database as _database
+
+
+__all__ = [
+    "walk",
+    "partial_hash",
+    "DuplicateFinder"
+]
+
+
+_SECTION = 'File'  #: ADM INI文件 中文件配置所在的节
+_DATABASE = 'library'  #: 储存检测结果的数据库名称
+
+
+def walk(roots: _Iterable) -> _Iterable[os.DirEntry]:
+    """
+    遍历所有根目录下的普通文件，不跟随符号链接
+
+    :param roots:
+        根目录的可迭代对象
+
+    :type roots: _Iterable[conf.Path.StrPath]
+
+    :return:
+        文件的 DirEntry 的生成器
+    :rtype: _Iterable[os.DirEntry]
+    """
+    stack = [os.path.abspath(root) for root in roots]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry
+        except (FileNotFoundError, PermissionError, NotADirectoryError):
+            continue
+    return
+
+
+def partial_hash(path, size: int, block_size: int) -> bytes:
+    """
+    计算文件头部与尾部两个数据块的哈希
+
+    文件不大于两个数据块时读取整个文件
+
+    :param path:
+        文件地址
+
+    :param size:
+        文件大小
+
+    :param block_size:
+        数据块大小
+
+    :type path: conf.Path.StrPath
+    :type size: int
+    :type block_size: int
+
+    :rtype: bytes
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, mode='rb', buffering=0) as fp:
+        if size <= block_size * 2:
+            h.update(fp.read())
+        else:
+            h.update(fp.read(block_size))
+            fp.seek(-block_size, os.SEEK_END)
+            h.update(fp.read(block_size))
+    return h.digest()
+
+
+# noinspection SqlResolve
+class DuplicateFinder:
+    """
+    分阶段的重复文件检测
+
+    检测分为如下三个阶段，每一阶段仅处理上一阶段仍可能重复的文件::
+
+        1. 按文件大小分组，无需读取文件
+        #. 比较文件头部与尾部数据块的哈希，每个文件仅读取两个数据块
+        #. 比较完整的 SHA-1，委托至 :class:`core.file.hash.HashEngine`
+
+    指向同一 inode 的硬链接视为同一个文件
+
+    部分哈希与完整哈希均以 (地址, 大小, 修改时间) 为依据储存在 library 数据库中，
+    因此再次检测时未修改的文件不会被重新读取，检测结果同样储存在数据库中
+
+    配置读取自 ADM INI文件 的 File 节::
+
+        duplicate_block     部分哈希的数据块大小 (KiB)
+        duplicate_min_size  参与检测的最小文件大小 (字节)
+        hash_workers        读取部分哈希的线程数目
+    """
+
+    def __init__(self, *, block_size=None, min_size=None, workers=None, database=_DATABASE):
+        """
+        :param block_size:
+            部分哈希的数据块大小 (字节)，默认读取配置，仅限关键字
+
+        :param min_size:
+            参与检测的最小文件大小 (字节)，默认读取配置，仅限关键字
+
+        :param workers:
+            读取部分哈希的线程数目，默认读取配置，仅限关键字
+
+        :param database:
+            储存检测结果的数据库名称，仅限关键字
+
+        :type block_size: int | None
+        :type min_size: int | None
+        :type workers: int | None
+        :type database: str
+        """
+        self.block_size = block_size or _config.get_option(_SECTION, 'duplicate_block', 64) * 1024
+        self.min_size = min_size or _config.get_option(_SECTION, 'duplicate_min_size', 1)
+        self.workers = workers or _config.get_option(_SECTION, 'hash_workers', os.cpu_count() or 1)
+
+        self.stats: dict[str, int] = {}
+
+        self._database = database
+        with _database.transaction(self._database) as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS file_partial ("
+                               "path TEXT PRIMARY KEY, "
+                               "size INTEGER NOT NULL, "
+                               "mtime INTEGER NOT NULL, "
+                               "block INTEGER NOT NULL, "
+                               "partial BLOB NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS duplicate ("
+                               "hash TEXT NOT NULL, "
+                               "size INTEGER NOT NULL, "
+                               "path TEXT PRIMARY KEY, "
+                               "found REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS duplicate_hash ON duplicate (hash)")
+        return
+
+    # ---------- 各阶段 ----------
+
+    def _by_size(self, roots: _Iterable) -> dict[int, list[tuple[str, int]]]:
+        """
+        第一阶段，按文件大小分组
+
+        :return:
+            以文件大小为键，(地址, 修改时间) 列表为值的字典，仅包含可能重复的分组
+        """
+        groups: dict[int, list[tuple[str, int]]] = collections.defaultdict(list)
+        inodes = set()
+        seen = set()
+        roots = [os.path.abspath(root) for root in roots]
+        for entry in walk(roots):
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:  # 文件在遍历过程中被移除
+                continue
+            seen.add(entry.path)
+            if stat.st_size < self.min_size:
+                continue
+            if stat.st_ino and stat.st_nlink > 1:  # 硬链接
+                if (stat.st_dev, stat.st_ino) in inodes:
+                    continue
+                inodes.add((stat.st_dev, stat.st_ino))
+            groups[stat.st_size].append((entry.path, stat.st_mtime_ns))
+
+        self.stats['files'] = len(seen)
+        self._prune(roots, seen)
+        groups = {size: group for size, group in groups.items() if len(group) > 1}
+        self.stats['size_candidates'] = sum(len(group) for group in groups.values())
+        return groups
+
+    def _prune(self, roots: list[str], seen: set[str]):
+        """
+        删除位于根目录下但已不存在的文件的部分哈希
+        """
+        connection = _database.connect(self._database)
+        with _database.get_lock(self._database):
+            paths = [row[0] for row in connection.execute("SELECT path FROM file_partial")]
+        prefixes = tuple(os.path.join(root, '') for root in roots)
+        removed = [(path,) for path in paths if path.startswith(prefixes) and path not in seen]
+        if removed:
+            with _database.transaction(self._database) as connection:
+                connection.executemany("DELETE FROM file_partial WHERE path = ?", removed)
+        self.stats['partial_pruned'] = len(removed)
+        return
+
+    def _by_partial(self, groups: dict[int, list[tuple[str, int]]]) -> list[tuple[int, bytes, list[str]]]:
+        """
+        第二阶段，按头部与尾部数据块的哈希分组
+
+        :return:
+            由文件大小、部分哈希与地址列表构成的元组的列表，仅包含可能重复的分组
+        """
+        connection = _database.connect(self._database)
+        with _database.get_lock(self._database):
+            cached = {row[0]: row[1:] for row in
+                      connection.execute("SELECT path, size, mtime, block, partial FROM file_partial")}
+
+        partials: dict[str, bytes] = {}
+        pending: list[tuple[str, int, int]] = []
+        for size, group in groups.items():
+            for path, mtime in group:
+                row = cached.get(path)
+                if row is not None and row[:3] == (size, mtime, self.block_size):
+                    partials[path] = row[3]
+                else:
+                    pending.append((path, size, mtime))
+
+        rows = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(partial_hash, path, size, self.block_size): (path, size, mtime)
+                       for path, size, mtime in pending}
+            for future in concurrent.futures.as_completed(futures):
+                path, size, mtime = futures[future]
+                try:
+                    partials[path] = future.result()
+                except OSError:  # 文件在检测过程中被移除
+                    continue
+                rows.append((path, size, mtime, self.block_size, partials[path]))
+
+        with _database.transaction(self._database) as connection:
+            connection.executemany("REPLACE INTO file_partial VALUES (?, ?, ?, ?, ?)", rows)
+
+        self.stats['partial_read'] = len(rows)
+        self.stats['bytes_read'] = sum(min(row[1], self.block_size * 2) for row in rows)
+
+        result = []
+        for size, group in groups.items():
+            buckets = collections.defaultdict(list)
+            for path, _ in group:
+                if path in partials:
+                    buckets[partials[path]].append(path)
+            result.extend((size, partial, bucket) for partial, bucket in buckets.items() if len(bucket) > 1)
+        self.stats['partial_candidates'] = sum(len(bucket) for _, _, bucket in result)
+        return result
+
+    def _by_full(self, groups: list[tuple[int, bytes, list[str]]]) -> list[tuple[str, int, list[str]]]:
+        """
+        第三阶段，按完整的 SHA-1 分组
+
+        不大于两个数据块的文件在第二阶段已经被完整读取，直接使用部分哈希作为结果，
+        在第二阶段之后被移除或无法读取的文件会被忽略
+
+        :return:
+            由哈希值、文件大小与地址列表构成的元组的列表
+        """
+        result = []
+        sizes = {}
+        for size, partial, group in groups:
+            if size <= self.block_size * 2:
+                result.append((f"blake2b:{partial.hex()}", size, group))
+            else:
+                sizes.update(dict.fromkeys(group, size))
+        paths = list(sizes)
+
+        engine = _hash.HashEngine(('sha1',), workers=self.workers, database=self._database)
+        pending = [path for path in paths if engine.lookup(path) is None]
+        digests = engine.run(paths)
+
+        for size, partial, group in groups:
+            if size <= self.block_size * 2:
+                continue
+            buckets = collections.defaultdict(list)
+            for path in group:
+                if path in digests:
+                    buckets[digests[path]['sha1']].append(path)
+            result.extend((sha1, size, bucket) for sha1, bucket in buckets.items() if len(bucket) > 1)
+
+        read = [path for path in pending if path in digests]
+        self.stats['full_read'] = len(read)
+        self.stats['bytes_read'] += sum(sizes[path] for path in read)
+        return result
+
+    # ---------- 检测 ----------
+
+    def find(self, roots: _Iterable) -> list[list[str]]:
+        """
+        检测根目录下的所有重复文件，并储存检测结果
+
+        仅替换位于这些根目录下的已储存结果，其他根目录的结果保持不变
+
+        :param roots:
+            根目录的可迭代对象
+
+        :type roots: _Iterable[conf.Path.StrPath]
+
+        :return:
+            重复文件的地址分组，每个分组按地址排序
+        :rtype: list[list[str]]
+        """
+        self.stats = {}
+        roots = [os.path.abspath(root) for root in roots]
+        groups = self._by_full(self._by_partial(self._by_size(roots)))
+
+        prefixes = tuple(os.path.join(root, '') for root in roots)
+        now = time.time()
+        with _database.transaction(self._database) as connection:
+            paths = [row[0] for row in connection.execute("SELECT path FROM duplicate")]
+            connection.executemany("DELETE FROM duplicate WHERE path = ?",
+                                   [(path,) for path in paths if path.startswith(prefixes)])
+            connection.executemany("REPLACE INTO duplicate VALUES (?, ?, ?, ?)",
+                                   [(key, size, path, now) for key, size, group in groups for path in group])
+            connection.execute("DELETE FROM duplicate WHERE hash IN "
+                               "(SELECT hash FROM duplicate GROUP BY hash HAVING COUNT(*) < 2)")  # 只剩一个文件的分组
+
+        self.stats['groups'] = len(groups)
+        self.stats['duplicates'] = sum(len(group) - 1 for _, _, group in groups)
+        return sorted(sorted(group) for _, _, group in groups)
+
+    def groups(self) -> list[list[str]]:
+        """
+        返回上一次检测储存的结果
+
+        :rtype: list[list[str]]
+        """
+        connection = _database.connect(self._database)
+        with _database.get_lock(self._database):
+            rows = connection.execute("SELECT hash, path FROM duplicate ORDER BY hash, path").fetchall()
+        groups: dict[str, list[str]] = collections.defaultdict(list)
+        for key, path in rows:
+            groups[key].append(path)
+        return list(groups.values())
@@ -0,0 +1,501 @@
+# 文件哈希模块 (文件层)
+
+import os
+import re
+import mmap
+import time
+import zlib
+import struct
+import hashlib
+import logging
+import collections
+import concurrent.futures
+
+from typing import Iterable as _Iterable
+
+from ..base import config as _config
+from ..base import database as _database
+from ..base import metrics as _metrics
+
+
+__all__ = [
+    "ALGORITHMS",
+    "DEFAULT_ALGORITHMS",
+    "NATIVE_MD4",
+    "ED2K_CHUNK",
+    "new",
+    "hash_file",
+    "name_crc32",
+    "HashEngine"
+]
+
+
+ALGORITHMS = ('crc32', 'ed2k', 'sha1')  #: 支持的摘要算法
+ED2K_CHUNK = 9728000  #: ed2k 的分块大小
+
+_SECTION = 'File'  #: ADM INI文件 中文件配置所在的节
+_DATABASE = 'library'  #: 储存哈希结果的数据库名称
+_ALIGNMENT = 64 * 1024  #: 读取缓冲区的对齐大小
+
+_logger = logging.getLogger(__name__)
+
+_FILES = _metrics.counter('adm_hash_files_total', '已计算摘要的文件数目')
+_BYTES = _metrics.counter('adm_hash_bytes_total', '已计算摘要的字节数')
+
+
+# ---------- 摘要算法 ----------
+
+
+class _MD4:
+    """
+    纯 Python 实现的 MD4
+
+    仅在 hashlib 不提供 md4 时使用 (OpenSSL 3 默认不再提供)，速度较慢
+    """
+    name = 'md4'
+    digest_size = 16
+    block_size = 64
+
+    _ROUND_2 = (0, 4, 8, 12, 1, 5, 9, 13, 2, 6, 10, 14, 3, 7, 11, 15)
+    _ROUND_3 = (0, 8, 4, 12, 2, 10, 6, 14, 1, 9, 5, 13, 3, 11, 7, 15)
+
+    def __init__(self, data=b''):
+        self._state = (0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476)
+        self._buffer = b''
+        self._length = 0
+        self.update(data)
+        return
+
+    def update(self, data):
+        data = self._buffer + bytes(data)
+        self._length += len(data) - len(self._buffer)
+        end = len(data) - len(data) % 64
+        state = self._state
+        for offset in range(0, end, 64):
+            state = self._compress(state, struct.unpack_from('<16I', data, offset))
+        self._state = state
+        self._buffer = data[end:]
+        return
+
+    @classmethod
+    def _compress(cls, state: tuple[int, int, int, int], x: tuple[int, ...]) -> tuple[int, int, int, int]:
+        mask = 0xFFFFFFFF
+        a, b, c, d = state
+
+        for i in range(16):  # 第一轮
+            k = (a + ((b & c) | (~b & d)) + x[i]) & mask
+            s = (3, 7, 11, 19)[i % 4]
+            a, b, c, d = d, ((k << s) | (k >> (32 - s))) & mask, b, c
+        for i in range(16):  # 第二轮
+            k = (a + ((b & c) | (b & d) | (c & d)) + x[cls._ROUND_2[i]] + 0x5A827999) & mask
+            s = (3, 5, 9, 13)[i % 4]
+            a, b, c, d = d, ((k << s) | (k >> (32 - s))) & mask, b, c
+        for i in range(16):  # 第三轮
+            k = (a + (b ^ c ^ d) + x[cls._ROUND_3[i]] + 0x6ED9EBA1) & mask
+            s = (3, 9, 11, 15)[i % 4]
+            a, b, c, d = d, ((k << s) | (k >> (32 - s))) & mask, b, c
+
+        return ((state[0] + a) & mask, (state[1] + b) & mask,
+                (state[2] + c) & mask, (state[3] + d) & mask)
+
+    def digest(self) -> bytes:
+        length = struct.pack('<Q', (self._length * 8) & (2 ** 64 - 1))
+        data = self._buffer + b'\x80' + b'\x00' * ((55 - self._length) % 64) + length
+        state = self._state
+        for offset in range(0, len(data), 64):
+            state = self._compress(state, struct.unpack_from('<16I', data, offset))
+        return struct.pack('<4I', *state)
+
+    def hexdigest(self) -> str:
+        return self.digest().hex()
+
+
+def _native_md4() -> bool:
+    try:
+        hashlib.new('md4')
+    except ValueError:
+        return False
+    return True
+
+
+NATIVE_MD4 = _native_md4()  #: hashlib 是否提供 md4，否则 ed2k 使用纯 Python 实现，速度仅约 2 MB/s
+DEFAULT_ALGORITHMS = ALGORITHMS if NATIVE_MD4 else ('crc32', 'sha1')  #: 默认的摘要算法，缺少 md4 时不包括 ed2k
+
+
+def _md4(data=b''):
+    """
+    返回一个 md4 对象，优先使用 hashlib 提供的实现
+    """
+    try:
+        return hashlib.new('md4', data)
+    except ValueError:
+        return _MD4(data)
+
+
+class _CRC32:
+    """
+    提供与 hashlib 一致接口的 CRC32
+    """
+    name = 'crc32'
+
+    def __init__(self):
+        self._crc = 0
+        return
+
+    def update(self, data):
+        self._crc = zlib.crc32(data, self._crc)
+        return
+
+    def hexdigest(self) -> str:
+        return f"{self._crc:08X}"
+
+
+class _ED2K:
+    """
+    提供与 hashlib 一致接口的 ed2k
+
+    文件以 9728000 字节分块，小于一个分块时为文件的 md4，
+    否则为各分块 md4 拼接后的 md4
+
+    当文件大小恰好为分块的整数倍时，与 AniDB 一致，额外附加一个空分块的 md4
+    """
+    name = 'ed2k'
+
+    def __init__(self):
+        self._chunk = _md4()
+        self._chunk_size = 0
+        self._digests: list[bytes] = []
+        return
+
+    def update(self, data):
+        data = memoryview(data)
+        while data:
+            size = min(ED2K_CHUNK - self._chunk_size, len(data))
+            self._chunk.update(data[:size])
+            self._chunk_size += size
+            data = data[size:]
+            if self._chunk_size == ED2K_CHUNK:
+                self._digests.append(self._chunk.digest())
+                self._chunk = _md4()
+                self._chunk_size = 0
+        return
+
+    def hexdigest(self) -> str:
+        if not self._digests:
+            return self._chunk.hexdigest()
+        return _md4(b''.join(self._digests) + self._chunk.digest()).hexdigest()
+
+
+def new(name: str):
+    """
+    按名称返回一个摘要对象，其拥有 update 与 hexdigest 方法
+
+    :param name:
+        算法名称，参考 :data:`ALGORITHMS`
+
+    :type name: str
+
+    :raise ValueError:
+        不支持的算法名称
+    """
+    if name == 'crc32':
+        return _CRC32()
+    elif name == 'ed2k':
+        return _ED2K()
+    elif name == 'sha1':
+        return hashlib.sha1()
+    else:
+        raise ValueError(f"'{name}' 为不支持的摘要算法")
+
+
+# ---------- 单文件哈希 ----------
+
+
+def hash_file(path, algorithms=DEFAULT_ALGORITHMS, *, buffer_size=8 * 1024 * 1024, use_mmap=False) -> dict[str, str]:
+    """
+    仅读取一次文件，同时计算所有指定的摘要
+
+    默认使用可复用的 bytearray 作为缓冲区，通过 readinto 读取，
+    避免为每一个数据块分配新的内存；也可以改用 mmap 映射文件
+
+    所有摘要均由同一个缓冲区提供数据，因此增加摘要不会增加磁盘读取
+
+    :param path:
+        文件地址
+
+    :param algorithms:
+        摘要算法名称的可迭代对象，默认为 :data:`DEFAULT_ALGORITHMS`
+
+    :param buffer_size:
+        缓冲区大小，会向上对齐至 64 KiB，仅限关键字
+
+    :param use_mmap:
+        是否使用 mmap 读取，仅限关键字
+
+    :type path: conf.Path.StrPath
+    :type algorithms: _Iterable[str]
+    :type buffer_size: int
+    :type use_mmap: bool
+
+    :return:
+        以算法名称为键，十六进制摘要为值的字典
+    :rtype: dict[str, str]
+    """
+    hashers = [new(name) for name in algorithms]
+    buffer_size = max(-(-int(buffer_size) // _ALIGNMENT) * _ALIGNMENT, _ALIGNMENT)
+
+    with open(path, mode='rb', buffering=0) as fp:
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fp.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+        size = os.fstat(fp.fileno()).st_size
+        if use_mmap and size > 0:
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, 'madvise'):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                view = memoryview(mm)
+                try:
+                    for offset in range(0, size, buffer_size):
+                        block = view[offset:offset + buffer_size]
+                        for hasher in hashers:
+                            hasher.update(block)
+                        block.release()
+                finally:
+                    view.release()
+        else:
+            buffer = bytearray(buffer_size)
+            view = memoryview(buffer)
+            while True:
+                length = fp.readinto(buffer)
+                if not length:
+                    break
+                block = view[:length]
+                for hasher in hashers:
+                    hasher.update(block)
+                block.release()
+            view.release()
+
+    return {hasher.name: hasher.hexdigest() for hasher in hashers}
+
+
+def name_crc32(filename: str) -> str | None:
+    """
+    从压制组的文件名中提取 CRC32，例如::
+
+        [Group] Title - 01 [1080p][ABCD1234].mkv
+
+    :param filename:
+        文件名
+
+    :type filename: str
+
+    :return:
+        大写的 CRC32，不存在时返回 None
+    :rtype: str | None
+    """
+    match = re.findall(r'[\[(]([0-9A-Fa-f]{8})[])]', os.path.basename(str(filename)))
+    return match[-1].upper() if match else None
+
+
+def _worker(path: str, algorithms: tuple[str, ...], buffer_size: int, use_mmap: bool
+            ) -> tuple[str, int, int, dict[str, str]]:
+    """
+    进程池中运行的任务
+
+    :return:
+        由地址、文件大小、修改时间与摘要构成的元组
+    """
+    stat = os.stat(path)
+    digests = hash_file(path, algorithms, buffer_size=buffer_size, use_mmap=use_mmap)
+    return path, stat.st_size, stat.st_mtime_ns, digests
+
+
+# ---------- 批量哈希 ----------
+
+
+# noinspection SqlResolve
+class HashEngine:
+    """
+    批量哈希引擎
+
+    使用进程池并行计算多个文件的摘要，并且限制同一磁盘上同时读取的文件数目，
+    避免机械硬盘因为随机读取而大幅降速
+
+    计算结果以 (地址, 大小, 修改时间) 为依据储存在 library 数据库中，
+    已完成且未修改的文件会被跳过，因此中断后再次运行即可从中断处继续
+
+    无法读取的文件 (例如已被删除或没有权限) 不会中断其他文件，错误记录在 :attr:`errors` 中
+
+    配置读取自 ADM INI文件 的 File 节::
+
+        hash_workers   进程池的大小，默认为 CPU 数目
+        hash_per_disk  同一磁盘上同时读取的文件数目
+        hash_buffer    读取缓冲区的大小 (KiB)
+        hash_mmap      是否使用 mmap 读取
+    """
+
+    def __init__(self, algorithms=DEFAULT_ALGORITHMS, *, workers=None, per_disk=None, database=_DATABASE):
+        """
+        :param algorithms:
+            摘要算法名称的可迭代对象，默认为 :data:`DEFAULT_ALGORITHMS`，
+            hashlib 不提供 md4 时指定 ed2k 会使用很慢的纯 Python 实现
+
+        :param workers:
+            进程池的大小，默认读取配置，仅限关键字
+
+        :param per_disk:
+            同一磁盘上同时读取的文件数目，默认读取配置，仅限关键字
+
+        :param database:
+            储存哈希结果的数据库名称，仅限关键字
+
+        :type algorithms: _Iterable[str]
+        :type workers: int | None
+        :type per_disk: int | None
+        :type database: str
+        """
+        self.algorithms = tuple(algorithms)
+        for name in self.algorithms:
+            if name not in ALGORITHMS:
+                raise ValueError(f"'{name}' 为不支持的摘要算法")
+        if 'ed2k' in self.algorithms and not NATIVE_MD4:
+            _logger.warning('hashlib 不提供 md4，ed2k 将使用纯 Python 实现，每 GB 约需 10 分钟')
+
+        self.errors: dict[str, str] = {}  #: 最近一次 run 中无法读取的文件与错误信息
+        self.workers = workers or _config.get_option(_SECTION, 'hash_workers', os.cpu_count() or 1)
+        self.per_disk = per_disk or _config.get_option(_SECTION, 'hash_per_disk', 1)
+        self.buffer_size = _config.get_option(_SECTION, 'hash_buffer', 8192) * 1024
+        self.use_mmap = _config.get_option(_SECTION, 'hash_mmap', False)
+
+        self._database = database
+        with _database.transaction(self._database) as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS file_hash ("
+                               "path TEXT PRIMARY KEY, "
+                               "size INTEGER NOT NULL, "
+                               "mtime INTEGER NOT NULL, "
+                               "crc32 TEXT, "
+                               "ed2k TEXT, "
+                               "sha1 TEXT, "
+                               "hashed REAL NOT NULL)")
+        return
+
+    def lookup(self, path) -> dict[str, str] | None:
+        """
+        返回文件已储存的摘要，文件被修改或摘要不完整时返回 None
+
+        :param path:
+            文件地址
+
+        :type path: conf.Path.StrPath
+
+        :rtype: dict[str, str] | None
+        """
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        connection = _database.connect(self._database)
+        with _database.get_lock(self._database):
+            row = connection.execute("SELECT size, mtime, crc32, ed2k, sha1 FROM file_hash WHERE path = ?",
+                                     (path,)).fetchone()
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+            return None
+
+        digests = dict(zip(ALGORITHMS, row[2:]))
+        if any(digests[name] is None for name in self.algorithms):
+            return None
+        return {name: digests[name] for name in self.algorithms}
+
+    def _save(self, path: str, size: int, mtime: int, digests: dict[str, str]):
+        """
+        储存单个文件的摘要，保留之前计算的其他摘要
+        """
+        with _database.transaction(self._database) as connection:
+            row = connection.execute("SELECT size, mtime, crc32, ed2k, sha1 FROM file_hash WHERE path = ?",
+                                     (path,)).fetchone()
+            values = {name: None for name in ALGORITHMS}
+            if row is not None and row[0] == size and row[1] == mtime:
+                values.update(zip(ALGORITHMS, row[2:]))
+            values.update(digests)
+            connection.execute("REPLACE INTO file_hash VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (path, size, mtime, values['crc32'], values['ed2k'], values['sha1'], time.time()))
+        return
+
+    def run(self, paths: _Iterable, *, callback=None) -> dict[str, dict[str, str]]:
+        """
+        计算所有文件的摘要，跳过已完成的文件
+
+        :param paths:
+            文件地址的可迭代对象
+
+        :param callback:
+            每完成一个文件时调用，接收地址、摘要、已完成数目与总数目，仅限关键字
+
+        :type paths: _Iterable[conf.Path.StrPath]
+        :type callback: typing.Callable[[str, dict[str, str], int, int], None] | None
+
+        :return:
+            以绝对地址为键，摘要字典为值的字典，不包括无法读取的文件，参考 :attr:`errors`
+        :rtype: dict[str, dict[str, str]]
+        """
+        results: dict[str, dict[str, str]] = {}
+        queues: dict[int, collections.deque[str]] = collections.defaultdict(collections.deque)
+        self.errors = {}
+
+        def failed(path: str, error: OSError):
+            _logger.warning("无法计算 '%s' 的摘要: %s", path, error)
+            self.errors[path] = str(error)
+            return
+
+        for path in dict.fromkeys(os.path.abspath(path) for path in paths):
+            digests = self.lookup(path)
+            if digests is not None:
+                results[path] = digests
+                continue
+            try:
+                queues[os.stat(path).st_dev].append(path)
+            except OSError as e:
+                failed(path, e)
+
+        total = len(results) + len(self.errors) + sum(len(queue) for queue in queues.values())
+        if callback is not None:
+            for done, (path, digests) in enumerate(results.items(), 1):
+                callback(path, digests, done, total)
+
+        if not any(queues.values()):
+            return results
+
+        running: dict[concurrent.futures.Future, tuple[int, str]] = {}
+        reading: collections.Counter[int] = collections.Counter()
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.workers) as executor:
+            def submit():
+                for device, queue in queues.items():
+                    while queue and reading[device] < self.per_disk and len(running) < self.workers:
+                        path = queue.popleft()
+                        future = executor.submit(_worker, path, self.algorithms, self.buffer_size, self.use_mmap)
+                        running[future] = device, path
+                        reading[device] += 1
+                return
+
+            submit()
+            while running:
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    device, path = running.pop(future)
+                    reading[device] -= 1
+                    try:
+                        path, size, mtime, digests = future.result()
+                    except OSError as e:
+                        failed(path, e)
+                        continue
+                    self._save(path, size, mtime, digests)
+                    _FILES.inc()
+                    _BYTES.inc(size)
+                    results[path] = digests
+                    if callback is not None:
+                        callback(path, digests, len(results) + len(self.errors), total)
+                submit()
+
+        return results
@@ -0,0 +1,542 @@
+# 媒体容器解析模块 (文件层)
+
+import os
+import json
+import logging
+import mmap
+import time
+import struct
+import concurrent.futures
+
+from typing import Iterable as _Iterable
+
+from ..base import config as _config
+from ..base import database as _database
+from ..base import metrics as _metrics
+
+
+__all__ = [
+    "probe",
+    "Prober"
+]
+
+
+_SECTION = 'File'  #: ADM INI文件 中文件配置所在的节
+_DATABASE = 'library'  #: 储存解析结果的数据库名称
+_POOL_MIN = 64  #: 使用进程池的最少文件数目，更少时在当前进程中解析
+_BATCH = 256  #: 每个事务储存的结果数目
+
+_logger = logging.getLogger(__name__)
+
+_FILES = _metrics.counter('adm_probe_files_total', '已解析容器信息的文件数目', ('result',))
+
+# ---------- Matroska ----------
+
+_EBML = 0x1A45DFA3
+_DOC_TYPE = 0x4282
+_SEGMENT = 0x18538067
+_SEEK_HEAD = 0x114D9B74
+_SEEK = 0x4DBB
+_SEEK_ID = 0x53AB
+_SEEK_POSITION = 0x53AC
+_INFO = 0x1549A966
+_TIMESTAMP_SCALE = 0x2AD7B1
+_DURATION = 0x4489
+_TRACKS = 0x1654AE6B
+_TRACK_ENTRY = 0xAE
+_TRACK_TYPE = 0x83
+_CODEC_ID = 0x86
+_NAME = 0x536E
+_LANGUAGE = 0x22B59C
+_LANGUAGE_BCP47 = 0x22B59D
+_FLAG_DEFAULT = 0x88
+_FLAG_FORCED = 0x55AA
+_VIDEO = 0xE0
+_PIXEL_WIDTH = 0xB0
+_PIXEL_HEIGHT = 0xBA
+_AUDIO = 0xE1
+_SAMPLING_FREQUENCY = 0xB5
+_CHANNELS = 0x9F
+_CLUSTER = 0x1F43B675
+
+_MATROSKA_TYPES = {1: 'video', 2: 'audio', 17: 'subtitle'}
+
+# ---------- MP4 ----------
+
+_MP4_FIRST = (b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide', b'pdin')  #: MP4 文件的第一个盒子
+_MP4_HANDLERS = {b'vide': 'video', b'soun': 'audio', b'sbtl': 'subtitle', b'subt': 'subtitle',
+                 b'text': 'subtitle', b'clcp': 'subtitle'}
+
+
+def _uint(mm: mmap.mmap, start: int, end: int) -> int:
+    return int.from_bytes(mm[start:end], 'big')
+
+
+def _float(mm: mmap.mmap, start: int, end: int) -> float:
+    if end - start == 4:
+        return struct.unpack('>f', mm[start:end])[0]
+    if end - start == 8:
+        return struct.unpack('>d', mm[start:end])[0]
+    return 0.0
+
+
+def _string(mm: mmap.mmap, start: int, end: int) -> str:
+    return mm[start:end].rstrip(b'\x00').decode('utf8', errors='replace')
+
+
+def _element(mm: mmap.mmap, offset: int, end: int) -> tuple[int, int, int]:
+    """
+    读取位于 offset 的 EBML 元素头，元素 ID 与大小均为 EBML 变长整数，ID 保留长度标记
+
+    :return:
+        元素 ID 与数据的开始与结束位置，结束位置不超过 end，大小未知时为 end
+    """
+    first = mm[offset]
+    if not first:
+        raise ValueError(f"位置 {offset} 处的 EBML 元素 ID 无效")
+    start = offset + 9 - first.bit_length()
+    element = int.from_bytes(mm[offset:start], 'big')
+
+    first = mm[start]
+    if not first:
+        raise ValueError(f"位置 {start} 处的 EBML 元素大小无效")
+    length = 9 - first.bit_length()
+    mask = (1 << 7 * length) - 1
+    size = int.from_bytes(mm[start:start + length], 'big') & mask
+    start += length
+    if size == mask:
+        return element, start, end
+    return element, start, min(start + size, end)
+
+
+def _children(mm: mmap.mmap, start: int, end: int):
+    while start < end:
+        element, data_start, data_end = _element(mm, start, end)
+        yield element, data_start, data_end
+        start = data_end
+    return
+
+
+def _matroska_seeks(mm: mmap.mmap, start: int, end: int):
+    """
+    返回 SeekHead 中的 (元素 ID, 相对于 Segment 数据开始的位置)
+    """
+    for seek, seek_start, seek_end in _children(mm, start, end):
+        if seek != _SEEK:
+            continue
+        target = position = None
+        for child, data_start, data_end in _children(mm, seek_start, seek_end):
+            if child == _SEEK_ID:
+                target = _uint(mm, data_start, data_end)
+            elif child == _SEEK_POSITION:
+                position = _uint(mm, data_start, data_end)
+        if target is not None and position is not None:
+            yield target, position
+    return
+
+
+def _matroska_info(mm: mmap.mmap, start: int, end: int) -> float | None:
+    scale = 1000000
+    duration = None
+    for element, data_start, data_end in _children(mm, start, end):
+        if element == _TIMESTAMP_SCALE:
+            scale = _uint(mm, data_start, data_end)
+        elif element == _DURATION:
+            duration = _float(mm, data_start, data_end)
+    return None if duration is None else duration * scale / 1e9
+
+
+def _matroska_tracks(mm: mmap.mmap, start: int, end: int) -> list[dict]:
+    tracks = []
+    for element, entry_start, entry_end in _children(mm, start, end):
+        if element != _TRACK_ENTRY:
+            continue
+        track = {'type': None, 'codec': None, 'language': 'eng', 'name': None, 'default': True, 'forced': False}
+        bcp47 = None
+        for child, data_start, data_end in _children(mm, entry_start, entry_end):
+            if child == _TRACK_TYPE:
+                track['type'] = _MATROSKA_TYPES.get(_uint(mm, data_start, data_end))
+            elif child == _CODEC_ID:
+                track['codec'] = _string(mm, data_start, data_end)
+            elif child == _LANGUAGE:
+                track['language'] = _string(mm, data_start, data_end)
+            elif child == _LANGUAGE_BCP47:
+                bcp47 = _string(mm, data_start, data_end)
+            elif child == _NAME:
+                track['name'] = _string(mm, data_start, data_end)
+            elif child == _FLAG_DEFAULT:
+                track['default'] = bool(_uint(mm, data_start, data_end))
+            elif child == _FLAG_FORCED:
+                track['forced'] = bool(_uint(mm, data_start, data_end))
+            elif child == _VIDEO:
+                for item, item_start, item_end in _children(mm, data_start, data_end):
+                    if item == _PIXEL_WIDTH:
+                        track['width'] = _uint(mm, item_start, item_end)
+                    elif item == _PIXEL_HEIGHT:
+                        track['height'] = _uint(mm, item_start, item_end)
+            elif child == _AUDIO:
+                track.setdefault('channels', 1)
+                track.setdefault('sample_rate', 8000)
+                for item, item_start, item_end in _children(mm, data_start, data_end):
+                    if item == _CHANNELS:
+                        track['channels'] = _uint(mm, item_start, item_end)
+                    elif item == _SAMPLING_FREQUENCY:
+                        track['sample_rate'] = round(_float(mm, item_start, item_end))
+        if bcp47 is not None:
+            track['language'] = bcp47
+        if track['type'] is not None:
+            tracks.append(track)
+    return tracks
+
+
+def _matroska(mm: mmap.mmap) -> dict:
+    """
+    解析 Matroska 与 WebM 文件的 Segment Info 与 Tracks
+
+    两者通常位于第一个 Cluster 之前，否则根据 SeekHead 跳转，不会读取任何 Cluster 的内容
+    """
+    size = len(mm)
+    element, start, end = _element(mm, 0, size)
+    doc_type = None
+    for child, data_start, data_end in _children(mm, start, end):
+        if child == _DOC_TYPE:
+            doc_type = _string(mm, data_start, data_end)
+    if doc_type not in ('matroska', 'webm'):
+        raise ValueError(f"不支持的 EBML 文档类型 '{doc_type}'")
+
+    offset = end
+    while True:
+        element, segment_start, segment_end = _element(mm, offset, size)
+        if element == _SEGMENT:
+            break
+        offset = segment_end
+        if offset >= size:
+            raise ValueError('缺少 Segment')
+
+    found = {}
+    seeks = {}
+    visited = set()
+    offset = segment_start
+    while _INFO not in found or _TRACKS not in found:
+        if offset < segment_end:
+            element, start, end = _element(mm, offset, segment_end)
+            if element != _CLUSTER:
+                if element in (_INFO, _TRACKS):
+                    found.setdefault(element, (start, end))
+                elif element == _SEEK_HEAD:
+                    for target, position in _matroska_seeks(mm, start, end):
+                        seeks.setdefault(target, []).append(segment_start + position)
+                offset = end
+                continue
+        # 到达 Cluster 或 Segment 的结尾，根据 SeekHead 跳转至尚未读取的元素
+        pending = [position for target in (_INFO, _TRACKS, _SEEK_HEAD) if target not in found
+                   for position in seeks.get(target, ()) if position not in visited and position < segment_end]
+        if not pending:
+            break
+        offset = pending[0]
+        visited.add(offset)
+
+    duration = _matroska_info(mm, *found[_INFO]) if _INFO in found else None
+    tracks = _matroska_tracks(mm, *found[_TRACKS]) if _TRACKS in found else []
+    return {'container': doc_type, 'duration': duration, 'tracks': tracks}
+
+
+def _boxes(mm: mmap.mmap, start: int, end: int):
+    while start + 8 <= end:
+        size = _uint(mm, start, start + 4)
+        kind = mm[start + 4:start + 8]
+        header = 8
+        if size == 1:
+            size = _uint(mm, start + 8, start + 16)
+            header = 16
+        elif size == 0:
+            size = end - start
+        if size < header:
+            raise ValueError(f"位置 {start} 处的盒子大小无效")
+        yield kind, start + header, min(start + size, end)
+        start += size
+    return
+
+
+def _find(mm: mmap.mmap, start: int, end: int, *path: bytes) -> tuple[int, int] | None:
+    for kind, data_start, data_end in _boxes(mm, start, end):
+        if kind == path[0]:
+            return (data_start, data_end) if len(path) == 1 else _find(mm, data_start, data_end, *path[1:])
+    return None
+
+
+def _mp4_language(code: int) -> str | None:
+    if not code or code == 0x7FFF:
+        return None
+    return ''.join(chr(((code >> shift) & 0x1F) + 0x60) for shift in (10, 5, 0))
+
+
+def _mp4_track(mm: mmap.mmap, start: int, end: int) -> dict | None:
+    handler = _find(mm, start, end, b'mdia', b'hdlr')
+    if handler is None or mm[handler[0] + 8:handler[0] + 12] not in _MP4_HANDLERS:
+        return None
+    track = {'type': _MP4_HANDLERS[mm[handler[0] + 8:handler[0] + 12]], 'codec': None, 'language': None,
+             'name': None, 'default': True, 'forced': False}
+
+    header = _find(mm, start, end, b'tkhd')
+    if header is not None:
+        track['default'] = bool(_uint(mm, header[0] + 1, header[0] + 4) & 1)  # track_enabled
+
+    media = _find(mm, start, end, b'mdia', b'mdhd')
+    if media is not None:
+        position = media[0] + (32 if mm[media[0]] == 1 else 20)
+        track['language'] = _mp4_language(_uint(mm, position, position + 2))
+
+    description = _find(mm, start, end, b'mdia', b'minf', b'stbl', b'stsd')
+    if description is not None and _uint(mm, description[0] + 4, description[0] + 8):
+        entry = description[0] + 8
+        track['codec'] = mm[entry + 4:entry + 8].decode('latin-1')
+        if track['type'] == 'video':
+            track['width'] = _uint(mm, entry + 32, entry + 34)
+            track['height'] = _uint(mm, entry + 34, entry + 36)
+        elif track['type'] == 'audio':
+            track['channels'] = _uint(mm, entry + 24, entry + 26)
+            track['sample_rate'] = _uint(mm, entry + 32, entry + 36) >> 16
+
+    if track['type'] == 'video' and not track.get('width') and header is not None:
+        track['width'] = _uint(mm, header[1] - 8, header[1] - 6)  # 16.16 定点数的整数部分
+        track['height'] = _uint(mm, header[1] - 4, header[1] - 2)
+    return track
+
+
+def _mp4(mm: mmap.mmap) -> dict:
+    """
+    解析 MP4 与 MOV 文件的 moov 盒子
+
+    顶层的 mdat 只读取盒子头，因此 moov 位于文件结尾时同样只会读取少量页面
+    """
+    movie = _find(mm, 0, len(mm), b'moov')
+    if movie is None:
+        raise ValueError('缺少 moov')
+
+    duration = None
+    tracks = []
+    for kind, start, end in _boxes(mm, *movie):
+        if kind == b'mvhd':
+            if mm[start] == 1:
+                scale, length = _uint(mm, start + 20, start + 24), _uint(mm, start + 24, start + 32)
+            else:
+                scale, length = _uint(mm, start + 12, start + 16), _uint(mm, start + 16, start + 20)
+            if scale and length not in (0, 0xFFFFFFFF, 0xFFFFFFFFFFFFFFFF):
+                duration = length / scale
+            elif scale:  # 分段的 MP4 在 mehd 中记录总时长
+                fragment = _find(mm, *movie, b'mvex', b'mehd')
+                if fragment is not None:
+                    width = 8 if mm[fragment[0]] == 1 else 4
+                    length = _uint(mm, fragment[0] + 4, fragment[0] + 4 + width)
+                    duration = length / scale if length else None
+        elif kind == b'trak':
+            track = _mp4_track(mm, start, end)
+            if track is not None:
+                tracks.append(track)
+    return {'container': 'mp4', 'duration': duration, 'tracks': tracks}
+
+
+def probe(path) -> dict:
+    """
+    解析 Matroska (mkv, webm) 与 MP4 (mp4, m4v, mov) 文件的时长与音视频、字幕轨道
+
+    通过 mmap 读取，只访问容器头部所在的页面，收集到所需的信息后立即停止，
+    不会读取音视频数据，因此耗时与文件大小无关
+
+    >>> probe('[Group] Title - 01 [1080p].mkv')
+    {'container': 'matroska', 'duration': 1420.0, 'width': 1920, 'height': 1080, 'tracks': [...]}
+
+    :param path:
+        文件地址
+
+    :type path: conf.Path.StrPath
+
+    :return:
+        包括容器类型 container、时长 duration (秒, 未知时为 None)、第一个视频轨道的 width 与 height，
+        以及轨道的列表 tracks，每个轨道包括 type ('video', 'audio' 或 'subtitle')、codec、language、
+        name、default 与 forced，视频轨道另有 width 与 height，音频轨道另有 channels 与 sample_rate
+    :rtype: dict
+
+    :raise ValueError:
+        文件不是支持的格式或已损坏
+    """
+    with open(path, mode='rb') as fp:
+        if os.fstat(fp.fileno()).st_size < 8:
+            raise ValueError(f"{path} 不是 Matroska 或 MP4 文件")
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, 'madvise'):
+                mm.madvise(mmap.MADV_RANDOM)
+            try:
+                if _uint(mm, 0, 4) == _EBML:
+                    result = _matroska(mm)
+                elif mm[4:8] in _MP4_FIRST:
+                    result = _mp4(mm)
+                else:
+                    raise ValueError(f"{path} 不是 Matroska 或 MP4 文件")
+            except (IndexError, struct.error) as e:
+                raise ValueError(f"{path} 已损坏") from e
+
+    video = next((track for track in result['tracks'] if track['type'] == 'video'), {})
+    return {'container': result['container'], 'duration': result['duration'],
+            'width': video.get('width'), 'height': video.get('height'), 'tracks': result['tracks']}
+
+
+def _worker(path: str) -> tuple[str, int, int, dict, str | None]:
+    """
+    进程池中运行的任务
+
+    :return:
+        由地址、文件大小、修改时间、解析结果与错误信息构成的元组，无法解析的文件的结果为空字典，
+        无法读取的文件的错误信息不为 None
+    """
+    try:
+        stat = os.stat(path)
+        info = probe(path)
+    except ValueError:
+        info = {}
+    except OSError as e:
+        return path, 0, 0, {}, str(e)
+    return path, stat.st_size, stat.st_mtime_ns, info, None
+
+
+# ---------- 批量解析 ----------
+
+
+# noinspection SqlResolve
+class Prober:
+    """
+    批量解析媒体文件的容器信息
+
+    解析结果以 (地址, 大小, 修改时间) 为依据缓存在 library 数据库中，未修改的文件不会被再次解析；
+    无法解析的文件同样会被缓存，结果为空字典；
+    无法读取的文件 (例如已被删除或没有权限) 不会中断其他文件，错误记录在 :attr:`errors` 中
+
+    需要解析的文件较多时在进程池中分批解析，较少时在当前进程中解析，避免创建进程的开销
+
+    配置读取自 ADM INI文件 的 File 节::
+
+        probe_workers  进程池的大小，默认为 CPU 数目
+    """
+
+    def __init__(self, *, workers=None, database=_DATABASE):
+        """
+        :param workers:
+            进程池的大小，默认读取配置，仅限关键字
+
+        :param database:
+            储存解析结果的数据库名称，仅限关键字
+
+        :type workers: int | None
+        :type database: str
+        """
+        self.errors: dict[str, str] = {}  #: 最近一次 run 中无法读取的文件与错误信息
+        self.workers = workers or _config.get_option(_SECTION, 'probe_workers', os.cpu_count() or 1)
+
+        self._database = database
+        with _database.transaction(self._database) as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS media_probe ("
+                               "path TEXT PRIMARY KEY, "
+                               "size INTEGER NOT NULL, "
+                               "mtime INTEGER NOT NULL, "
+                               "info TEXT NOT NULL, "
+                               "probed REAL NOT NULL)")
+        return
+
+    def lookup(self, path) -> dict | None:
+        """
+        返回文件已缓存的解析结果，文件被修改或未被解析时返回 None
+
+        :param path:
+            文件地址
+
+        :type path: conf.Path.StrPath
+
+        :rtype: dict | None
+        """
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        connection = _database.connect(self._database)
+        with _database.get_lock(self._database):
+            row = connection.execute("SELECT size, mtime, info FROM media_probe WHERE path = ?", (path,)).fetchone()
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+            return None
+        return json.loads(row[2])
+
+    def _save(self, rows: list[tuple[str, int, int, dict]]):
+        now = time.time()
+        with _database.transaction(self._database) as connection:
+            connection.executemany("REPLACE INTO media_probe VALUES (?, ?, ?, ?, ?)",
+                                   [(path, size, mtime, json.dumps(info, ensure_ascii=False), now)
+                                    for path, size, mtime, info in rows])
+        return
+
+    def run(self, paths: _Iterable, *, callback=None) -> dict[str, dict]:
+        """
+        解析所有文件，跳过已缓存的文件
+
+        :param paths:
+            文件地址的可迭代对象
+
+        :param callback:
+            每完成一个文件时调用，接收地址、解析结果、已完成数目与总数目，仅限关键字
+
+        :type paths: _Iterable[conf.Path.StrPath]
+        :type callback: typing.Callable[[str, dict, int, int], None] | None
+
+        :return:
+            以绝对地址为键，解析结果为值的字典，不包括无法读取的文件，参考 :func:`probe` 与 :attr:`errors`
+        :rtype: dict[str, dict]
+        """
+        results: dict[str, dict] = {}
+        pending: list[str] = []
+        self.errors = {}
+        for path in dict.fromkeys(os.path.abspath(path) for path in paths):
+            info = self.lookup(path)
+            if info is not None:
+                results[path] = info
+            else:
+                pending.append(path)
+
+        total = len(results) + len(pending)
+        if callback is not None:
+            for done, (path, info) in enumerate(results.items(), 1):
+                callback(path, info, done, total)
+
+        if not pending:
+            return results
+
+        executor = None
+        if self.workers > 1 and len(pending) >= _POOL_MIN:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+            outputs = executor.map(_worker, pending, chunksize=max(1, min(_BATCH, len(pending) // (self.workers * 4))))
+        else:
+            outputs = map(_worker, pending)
+
+        rows = []
+        try:
+            for path, size, mtime, info, error in outputs:
+                if error is not None:
+                    _logger.warning("无法解析 '%s' 的容器信息: %s", path, error)
+                    self.errors[path] = error
+                    _FILES.labels('error').inc()
+                    continue
+                rows.append((path, size, mtime, info))
+                _FILES.labels('ok' if info else 'unsupported').inc()
+                results[path] = info
+                if callback is not None:
+                    callback(path, info, len(results) + len(self.errors), total)
+                if len(rows) >= _BATCH:
+                    self._save(rows)
+                    rows = []
+            if rows:
+                self._save(rows)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        return results
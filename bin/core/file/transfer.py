@@ -0,0 +1,210 @@
+# 文件传输模块 (文件层)
+
+import os
+import errno
+import shutil
+
+
+__all__ = [
+    "TEMP_SUFFIX",
+    "same_device",
+    "HARDLINK",
+    "SYMLINK",
+    "copy_file",
+    "move_file",
+    "link_file"
+]
+
+
+TEMP_SUFFIX = '.admpart'  #: 跨设备复制时临时文件的后缀
+HARDLINK = 'hardlink'  #: 链接类型，硬链接
+SYMLINK = 'symlink'  #: 链接类型，符号链接
+
+_CHUNK = 64 * 1024 * 1024  #: 单次零拷贝调用传输的最大字节数
+_FALLBACK_ERRNO = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF}
+_LINK_FALLBACK_ERRNO = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EOPNOTSUPP}  #: 硬链接失败时改用符号链接的错误
+
+
+def same_device(src, dst) -> bool:
+    """
+    判断 dst 是否可以通过 rename 从 src 得到，即两者位于同一设备
+
+    dst 不存在时使用其最近的已存在的上级文件夹进行判断
+
+    :type src: conf.Path.StrPath
+    :type dst: conf.Path.StrPath
+
+    :rtype: bool
+    """
+    dst = os.path.abspath(dst)
+    while not os.path.exists(dst):
+        parent = os.path.dirname(dst)
+        if parent == dst:
+            break
+        dst = parent
+    return os.stat(src).st_dev == os.stat(dst).st_dev
+
+
+def _copy_range(fd_in: int, fd_out: int, size: int) -> int:
+    """
+    依次尝试 copy_file_range 与 sendfile，数据不会经过用户空间
+
+    :return:
+        已复制的字节数，不支持零拷贝时可能小于 size
+    """
+    offset = 0
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while offset < size:
+                sent = os.copy_file_range(fd_in, fd_out, min(_CHUNK, size - offset))
+                if sent == 0:
+                    return offset
+                offset += sent
+            return offset
+        except OSError as e:
+            if e.errno not in _FALLBACK_ERRNO:
+                raise
+
+    if hasattr(os, 'sendfile') and os.name == 'posix':
+        try:
+            while offset < size:
+                sent = os.sendfile(fd_out, fd_in, offset, min(_CHUNK, size - offset))
+                if sent == 0:
+                    return offset
+                offset += sent
+        except OSError as e:
+            if e.errno not in _FALLBACK_ERRNO:
+                raise
+    return offset
+
+
+def copy_file(src, dst):
+    """
+    复制文件内容与元数据，优先使用零拷贝的系统调用
+
+    在 Linux 上依次使用 copy_file_range 与 sendfile，
+    其他平台或不支持时使用大缓冲区的 :func:`shutil.copyfileobj`
+
+    :param src:
+        源文件地址
+
+    :param dst:
+        目标文件地址，会被覆盖
+
+    :type src: conf.Path.StrPath
+    :type dst: conf.Path.StrPath
+    """
+    with open(src, mode='rb') as fp_in, open(dst, mode='wb') as fp_out:
+        size = os.fstat(fp_in.fileno()).st_size
+        offset = _copy_range(fp_in.fileno(), fp_out.fileno(), size)
+        if offset < size:
+            fp_in.seek(offset)
+            fp_out.seek(offset)
+            shutil.copyfileobj(fp_in, fp_out, 8 * 1024 * 1024)
+        fp_out.flush()
+        os.fsync(fp_out.fileno())
+    shutil.copystat(src, dst)
+    return
+
+
+def move_file(src, dst):
+    """
+    移动文件，会自动创建目标文件夹
+
+    同一设备上使用 :func:`os.rename`，跨设备时先复制至带有 TEMP_SUFFIX 后缀的临时文件，
+    写入磁盘后重命名为目标文件，最后删除源文件，因此目标文件一旦存在即是完整的
+
+    :param src:
+        源文件地址
+
+    :param dst:
+        目标文件地址
+
+    :type src: conf.Path.StrPath
+    :type dst: conf.Path.StrPath
+
+    :raise FileExistsError:
+        目标文件已存在时抛出
+    """
+    if os.path.exists(dst):
+        raise FileExistsError(f"目标文件 '{dst}' 已存在")
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+
+    try:
+        os.rename(src, dst)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    temp = f"{dst}{TEMP_SUFFIX}"
+    try:
+        copy_file(src, temp)
+        os.replace(temp, dst)
+    except BaseException:
+        try:
+            os.remove(temp)
+        except FileNotFoundError:
+            pass
+        raise
+    os.remove(src)
+    return
+
+
+def link_file(src, dst, *, mode='auto', replace=False) -> str:
+    """
+    在 dst 创建指向 src 的链接，会自动创建目标文件夹
+
+    :param src:
+        源文件地址
+
+    :param dst:
+        链接地址
+
+    :param mode:
+        链接类型，为 HARDLINK、SYMLINK 或 'auto'，
+        'auto' 时优先使用硬链接，跨设备或文件系统不支持时改用符号链接，仅限关键字
+
+    :param replace:
+        是否原子地替换已存在的 dst，仅限关键字
+
+    :type src: conf.Path.StrPath
+    :type dst: conf.Path.StrPath
+    :type mode: str
+    :type replace: bool
+
+    :return:
+        实际创建的链接类型
+    :rtype: str
+
+    :raise FileExistsError:
+        dst 已存在，并且未指定 replace 时抛出
+    """
+    if mode not in (HARDLINK, SYMLINK, 'auto'):
+        raise ValueError(f"未知的链接类型 '{mode}'")
+    src = os.path.abspath(src)
+    os.makedirs(os.path.dirname(os.path.abspath(dst)), exist_ok=True)
+    temp = f"{dst}{TEMP_SUFFIX}" if replace else dst
+    if replace:  # 上次中断时残留的临时文件
+        try:
+            os.remove(temp)
+        except FileNotFoundError:
+            pass
+
+    for kind in ((HARDLINK, SYMLINK) if mode == 'auto' else (mode,)):
+        try:
+            if kind == HARDLINK:
+                os.link(src, temp, follow_symlinks=False)
+            else:
+                os.symlink(src, temp)
+        except OSError as e:
+            if mode == 'auto' and kind == HARDLINK and e.errno in _LINK_FALLBACK_ERRNO:
+                continue
+            raise
+        if replace:
+            try:
+                os.replace(temp, dst)
+            except BaseException:
+                os.remove(temp)
+                raise
+        return kind
@@ -0,0 +1,528 @@
+# 文件监视模块 (文件层)
+
+import os
+import time
+import queue
+import select
+import struct
+import ctypes
+import logging
+import threading
+import ctypes.util
+
+from typing import Iterable as _Iterable
+
+from ..base import config as _config
+
+
+__all__ = [
+    "CREATED",
+    "MODIFIED",
+    "DELETED",
+    "Event",
+    "InotifyBackend",
+    "PollingBackend",
+    "Watcher"
+]
+
+
+CREATED = 'created'  #: 新增事件
+MODIFIED = 'modified'  #: 修改事件
+DELETED = 'deleted'  #: 删除事件
+
+_SECTION = 'File'  #: ADM INI文件 中文件配置所在的节
+
+_logger = logging.getLogger(__name__)
+
+
+class Event:
+    """
+    文件变化事件
+    """
+
+    def __init__(self, kind: str, path: str, is_dir=False):
+        """
+        :param kind:
+            事件类型，为 CREATED, MODIFIED, DELETED 之一
+        :param path:
+            发生变化的绝对地址
+        :param is_dir:
+            是否为文件夹
+
+        :type kind: str
+        :type path: str
+        :type is_dir: bool
+        """
+        self.kind = kind
+        self.path = path
+        self.is_dir = is_dir
+        return
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Event):
+            return NotImplemented
+        return (self.kind, self.path, self.is_dir) == (other.kind, other.path, other.is_dir)
+
+    def __repr__(self) -> str:
+        return f"<Event {self.kind} {self.path}{os.sep if self.is_dir else ''}>"
+
+
+def _merge(old: str, new: str) -> str | None:
+    """
+    合并同一地址的两个连续事件
+
+    :return:
+        合并后的事件类型，事件相互抵消时返回 None
+    :rtype: str | None
+    """
+    if old == CREATED:
+        return None if new == DELETED else CREATED
+    if old == DELETED:
+        return MODIFIED if new == CREATED else new
+    return DELETED if new == DELETED else MODIFIED
+
+
+# ---------- 监视后端 ----------
+
+
+class InotifyBackend:
+    """
+    基于 Linux inotify 的监视后端
+
+    递归监视所有文件夹，新增的文件夹会被自动加入监视，
+    文件在写入完成 (IN_CLOSE_WRITE) 或被修改时产生修改事件
+    """
+    _IN_MODIFY = 0x00000002
+    _IN_CLOSE_WRITE = 0x00000008
+    _IN_MOVED_FROM = 0x00000040
+    _IN_MOVED_TO = 0x00000080
+    _IN_CREATE = 0x00000100
+    _IN_DELETE = 0x00000200
+    _IN_DELETE_SELF = 0x00000400
+    _IN_Q_OVERFLOW = 0x00004000
+    _IN_IGNORED = 0x00008000
+    _IN_ISDIR = 0x40000000
+    _IN_NONBLOCK = 0o4000
+    _IN_CLOEXEC = 0o2000000
+
+    _MASK = (_IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO |
+             _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF)
+    _HEADER = struct.Struct('iIII')
+
+    def __init__(self, roots: _Iterable):
+        """
+        :param roots:
+            根目录的可迭代对象
+
+        :type roots: _Iterable[conf.Path.StrPath]
+
+        :raise OSError:
+            当前平台不支持 inotify 时抛出
+        """
+        library = ctypes.util.find_library('c')
+        try:
+            self._libc = ctypes.CDLL(library, use_errno=True)
+            self._libc.inotify_init1  # noqa
+        except (OSError, AttributeError, TypeError) as e:
+            raise OSError('当前平台不支持 inotify') from e
+
+        self._fd = self._libc.inotify_init1(self._IN_NONBLOCK | self._IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify 初始化失败')
+
+        self._watches: dict[int, str] = {}
+        self.overflowed = False
+        for root in roots:
+            self._add_tree(os.path.abspath(root), [])
+        return
+
+    def _add_tree(self, root: str, events: list[Event]):
+        """
+        递归监视文件夹，并为其中已存在的内容生成新增事件
+        """
+        stack = [root]
+        while stack:
+            folder = stack.pop()
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(folder), self._MASK)
+            if wd < 0:
+                _logger.warning("无法监视 '%s'，错误码为 %d", folder, ctypes.get_errno())
+                continue
+            self._watches[wd] = folder
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        if is_dir:
+                            stack.append(entry.path)
+                        events.append(Event(CREATED, entry.path, is_dir))
+            except OSError:
+                continue
+        return
+
+    def read(self, timeout: float) -> list[Event]:
+        """
+        等待并读取事件
+
+        :param timeout:
+            最长等待时间 (秒)
+
+        :type timeout: float
+
+        :rtype: list[Event]
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self._fd, 256 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = self._HEADER.unpack_from(data, offset)
+            offset += self._HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & self._IN_Q_OVERFLOW:  # 事件溢出，需要重新扫描
+                self.overflowed = True
+                continue
+            folder = self._watches.get(wd)
+            if folder is None:
+                continue
+            if mask & (self._IN_IGNORED | self._IN_DELETE_SELF):
+                self._watches.pop(wd, None)
+                continue
+
+            path = os.path.join(folder, name)
+            is_dir = bool(mask & self._IN_ISDIR)
+            if mask & (self._IN_CREATE | self._IN_MOVED_TO):
+                events.append(Event(CREATED, path, is_dir))
+                if is_dir:
+                    self._add_tree(path, events)
+            elif mask & (self._IN_DELETE | self._IN_MOVED_FROM):
+                events.append(Event(DELETED, path, is_dir))
+            elif mask & (self._IN_MODIFY | self._IN_CLOSE_WRITE):
+                events.append(Event(MODIFIED, path, is_dir))
+        return events
+
+    def close(self):
+        """
+        关闭 inotify
+        """
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+        return
+
+
+class PollingBackend:
+    """
+    基于文件夹修改时间快照的可移植监视后端
+
+    每次轮询仅对每个文件夹调用一次 stat，只有修改时间发生变化的文件夹才会被重新列出，
+    由于向已有文件追加写入并不会改变文件夹的修改时间，
+    最近发生变化的文件会被持续检查，直到其在 hot_time 秒内不再变化
+    """
+
+    def __init__(self, roots: _Iterable, *, hot_time=60.0):
+        """
+        :param roots:
+            根目录的可迭代对象
+
+        :param hot_time:
+            持续检查最近变化文件的时间 (秒)，仅限关键字
+
+        :type roots: _Iterable[conf.Path.StrPath]
+        :type hot_time: float
+        """
+        self.hot_time = hot_time
+        self._folders: dict[str, tuple[int, dict[str, tuple[bool, int, int]]]] = {}
+        self._hot: dict[str, tuple[int, int, float]] = {}
+        self.overflowed = False
+        for root in roots:
+            self._scan_tree(os.path.abspath(root), None)
+        return
+
+    @staticmethod
+    def _list(folder: str) -> tuple[int, dict[str, tuple[bool, int, int]]] | None:
+        """
+        列出文件夹的内容
+
+        :return:
+            由文件夹修改时间与内容字典构成的元组，内容字典的值为 (是否为文件夹, 大小, 修改时间)，
+            文件夹不存在时返回 None
+        """
+        try:
+            mtime = os.stat(folder).st_mtime_ns
+            entries = {}
+            with os.scandir(folder) as it:
+                for entry in it:
+                    stat = entry.stat(follow_symlinks=False)
+                    entries[entry.name] = (entry.is_dir(follow_symlinks=False), stat.st_size, stat.st_mtime_ns)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            return None
+        return mtime, entries
+
+    def _scan_tree(self, root: str, events: list[Event] | None):
+        """
+        记录文件夹树的快照，events 不为 None 时为其中的内容生成新增事件
+        """
+        stack = [root]
+        while stack:
+            folder = stack.pop()
+            snapshot = self._list(folder)
+            if snapshot is None:
+                continue
+            self._folders[folder] = snapshot
+            for name, (is_dir, size, mtime) in snapshot[1].items():
+                path = os.path.join(folder, name)
+                if is_dir:
+                    stack.append(path)
+                if events is not None:
+                    events.append(Event(CREATED, path, is_dir))
+                    if not is_dir:
+                        self._hot[path] = (size, mtime, time.monotonic())
+        return
+
+    def _remove_tree(self, root: str, events: list[Event]):
+        """
+        移除文件夹树的快照，并为其中的内容生成删除事件
+        """
+        prefix = root + os.sep
+        for folder in [folder for folder in self._folders if folder == root or folder.startswith(prefix)]:
+            for name, (is_dir, _, _) in self._folders.pop(folder)[1].items():
+                events.append(Event(DELETED, os.path.join(folder, name), is_dir))
+        return
+
+    def read(self, timeout: float) -> list[Event]:
+        """
+        等待 timeout 秒后进行一次轮询
+
+        :param timeout:
+            轮询间隔 (秒)
+
+        :type timeout: float
+
+        :rtype: list[Event]
+        """
+        time.sleep(timeout)
+        events: list[Event] = []
+
+        for folder in list(self._folders):
+            if folder not in self._folders:  # 已随上级文件夹一同移除
+                continue
+            old_mtime, old_entries = self._folders[folder]
+            try:
+                if os.stat(folder).st_mtime_ns == old_mtime:
+                    continue
+            except (FileNotFoundError, NotADirectoryError):
+                continue  # 由上级文件夹生成删除事件
+            snapshot = self._list(folder)
+            if snapshot is None:
+                continue
+            self._folders[folder] = snapshot
+
+            new_entries = snapshot[1]
+            for name in old_entries.keys() - new_entries.keys():
+                path = os.path.join(folder, name)
+                events.append(Event(DELETED, path, old_entries[name][0]))
+                if old_entries[name][0]:
+                    self._remove_tree(path, events)
+                self._hot.pop(path, None)
+            for name in new_entries.keys() - old_entries.keys():
+                path = os.path.join(folder, name)
+                is_dir, size, mtime = new_entries[name]
+                events.append(Event(CREATED, path, is_dir))
+                if is_dir:
+                    self._scan_tree(path, events)
+                else:
+                    self._hot[path] = (size, mtime, time.monotonic())
+            for name in new_entries.keys() & old_entries.keys():
+                if new_entries[name] != old_entries[name] and not new_entries[name][0]:
+                    path = os.path.join(folder, name)
+                    events.append(Event(MODIFIED, path))
+                    self._hot[path] = (new_entries[name][1], new_entries[name][2], time.monotonic())
+
+        now = time.monotonic()
+        for path, (size, mtime, changed) in list(self._hot.items()):  # 检查最近变化的文件
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                self._hot.pop(path)
+                continue
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime):
+                events.append(Event(MODIFIED, path))
+                self._hot[path] = (stat.st_size, stat.st_mtime_ns, now)
+            elif now - changed > self.hot_time:
+                self._hot.pop(path)
+        return events
+
+    def close(self):
+        self._folders.clear()
+        self._hot.clear()
+        return
+
+
+# ---------- 监视器 ----------
+
+
+class Watcher:
+    """
+    文件监视器
+
+    在独立的线程中运行监视后端，将事件去抖并合并后放入 queue 队列，
+    供扫描器以及数据库写入者消费
+
+    同一地址的连续事件会被合并，例如下载过程中的大量写入仅会产生一个事件，
+    事件在 debounce 秒内没有新的变化后才会被放入队列
+
+    Linux 下默认使用 :class:`InotifyBackend`，其他平台使用 :class:`PollingBackend`
+
+    配置读取自 ADM INI文件 的 File 节::
+
+        watch_backend   监视后端，可以为 auto, inotify 或 polling
+        watch_debounce  去抖时间 (秒)
+        watch_interval  轮询后端的轮询间隔 (秒)
+    """
+
+    def __init__(self, roots: _Iterable, *, events=None, backend=None, debounce=None, interval=None):
+        """
+        :param roots:
+            根目录的可迭代对象
+
+        :param events:
+            接收事件的队列，默认创建一个新的队列，仅限关键字
+
+        :param backend:
+            监视后端名称，默认读取配置，仅限关键字
+
+        :param debounce:
+            去抖时间 (秒)，默认读取配置，仅限关键字
+
+        :param interval:
+            轮询后端的轮询间隔 (秒)，默认读取配置，仅限关键字
+
+        :type roots: _Iterable[conf.Path.StrPath]
+        :type events: queue.Queue[Event] | None
+        :type backend: str | None
+        :type debounce: float | None
+        :type interval: float | None
+        """
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.queue: queue.Queue[Event] = queue.Queue() if events is None else events
+        self.backend_name = backend or _config.get_option(_SECTION, 'watch_backend', 'auto')
+        self.debounce = _config.get_option(_SECTION, 'watch_debounce', 2.0) if debounce is None else debounce
+        self.interval = _config.get_option(_SECTION, 'watch_interval', 5.0) if interval is None else interval
+
+        self._backend: InotifyBackend | PollingBackend | None = None
+        self._pending: dict[str, tuple[str, bool, float]] = {}
+        self._thread: threading.Thread | None = None
+        self._stopping = threading.Event()
+        return
+
+    def _create_backend(self) -> InotifyBackend | PollingBackend:
+        if self.backend_name in ('auto', 'inotify'):
+            try:
+                return InotifyBackend(self.roots)
+            except OSError:
+                if self.backend_name == 'inotify':
+                    raise
+        return PollingBackend(self.roots)
+
+    @property
+    def backend(self) -> InotifyBackend | PollingBackend | None:
+        """
+        返回当前使用的监视后端，未启动时为 None
+        """
+        return self._backend
+
+    def _push(self, events: list[Event]):
+        """
+        合并事件至待处理字典
+        """
+        now = time.monotonic()
+        for event in events:
+            pending = self._pending.get(event.path)
+            if pending is None:
+                self._pending[event.path] = (event.kind, event.is_dir, now)
+                continue
+            kind = _merge(pending[0], event.kind)
+            if kind is None:
+                del self._pending[event.path]
+            else:
+                self._pending[event.path] = (kind, event.is_dir or pending[1], now)
+        return
+
+    def _flush(self, *, force=False):
+        """
+        将超过去抖时间的事件放入队列
+        """
+        now = time.monotonic()
+        for path, (kind, is_dir, changed) in list(self._pending.items()):
+            if force or now - changed >= self.debounce:
+                del self._pending[path]
+                self.queue.put(Event(kind, path, is_dir))
+        return
+
+    def _run(self):
+        timeout = min(self.debounce / 2, self.interval) if self.debounce else self.interval
+        if isinstance(self._backend, InotifyBackend):
+            timeout = min(timeout, 0.5) if timeout else 0.5
+        while not self._stopping.is_set():
+            self._push(self._backend.read(timeout))
+            if self._backend.overflowed:  # 事件溢出时通知消费者重新扫描根目录
+                self._backend.overflowed = False
+                self._push([Event(MODIFIED, root, True) for root in self.roots])
+            self._flush()
+        self._flush(force=True)
+        return
+
+    def start(self):
+        """
+        在新的线程中开始监视
+        """
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._backend = self._create_backend()
+        self._thread = threading.Thread(target=self._run, name='watcher', daemon=True)
+        self._thread.start()
+        return
+
+    def stop(self):
+        """
+        停止监视，并将所有未处理的事件放入队列
+        """
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._thread.join()
+        self._thread = None
+        self._backend.close()
+        return
+
+    def drain(self, timeout=None) -> list[Event]:
+        """
+        等待至少一个事件，然后取出队列中当前所有的事件，便于消费者批量处理
+
+        :param timeout:
+            最长等待时间 (秒)，默认一直等待
+
+        :type timeout: float | None
+
+        :return:
+            事件的列表，超时时为空
+        :rtype: list[Event]
+        """
+        try:
+            events = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                events.append(self.queue.get_nowait())
+            except queue.Empty:
+                return events
@@ -0,0 +1,8 @@
+from . import cache
+from . import rss
+
+
+__all__ = [
+    "cache",
+    "rss"
+]
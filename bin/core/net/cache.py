@@ -0,0 +1,374 @@
+# 网络缓存模块 (网络层)
+
+import os
+import json
+import time
+import sqlite3
+import threading
+import urllib.error
+import urllib.request
+
+from ..base import conf as _conf
+from ..base import config as _config
+
+
+__all__ = [
+    "OfflineError",
+    "Response",
+    "HTTPCache",
+    "fetch"
+]
+
+
+_SECTION = 'Network'  #: ADM INI文件 中网络配置所在的节
+_USER_AGENT = f"{_conf.Project.SHORT_NAME.value}/{_conf.Project.VERSION.value} (+{_conf.Project.URL.value})"
+
+
+class OfflineError(ConnectionError):
+    """
+    当处于离线模式，并且缓存中不存在请求的内容时抛出
+    """
+    pass
+
+
+class Response:
+    """
+    一个简化的 HTTP 响应
+
+    无论是否来自缓存，网络层的客户端均只会获得该类的实例
+    """
+
+    def __init__(self, url: str, status: int, headers: dict[str, str], body: bytes, *, from_cache=False):
+        """
+        :param url:
+            请求的地址
+        :param status:
+            HTTP 状态码
+        :param headers:
+            响应头，键均为小写
+        :param body:
+            响应的正文
+        :param from_cache:
+            响应是否来自缓存
+
+        :type url: str
+        :type status: int
+        :type headers: dict[str, str]
+        :type body: bytes
+        :type from_cache: bool
+        """
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.from_cache = from_cache
+        return
+
+    def text(self, encoding='utf8') -> str:
+        """
+        返回解码后的正文
+
+        :rtype: str
+        """
+        return self.body.decode(encoding, errors='replace')
+
+    def json(self):
+        """
+        返回按 JSON 解析后的正文
+        """
+        return json.loads(self.body)
+
+    def __repr__(self) -> str:
+        return f"<Response [{self.status}] {self.url}{' (cache)' if self.from_cache else ''}>"
+
+
+def _max_age(headers: dict[str, str]) -> int | None:
+    """
+    解析 Cache-Control 中的缓存时长
+
+    :return:
+        no-store 时返回 -1，no-cache 时返回 0，max-age 存在时返回其值，其他情况返回 None
+    :rtype: int | None
+    """
+    directives = [value.strip().lower() for value in headers.get('cache-control', '').split(',')]
+    if 'no-store' in directives:
+        return -1
+    if 'no-cache' in directives:
+        return 0
+    for directive in directives:
+        if directive.startswith('max-age='):
+            try:
+                return max(int(directive.removeprefix('max-age=')), 0)
+            except ValueError:
+                return None
+    return None
+
+
+# noinspection SqlResolve
+class HTTPCache(_conf.Singleton):
+    """
+    基于 SQLite 的 HTTP 响应缓存，由网络层的所有客户端共享
+
+    缓存储存于 `Folder.CACHE` 下的 http.db 文件中，并记录响应的 ETag 与 Last-Modified，
+    未过期的缓存直接返回而不访问网络，过期的缓存则使用条件请求重新验证
+
+    配置读取自 ADM INI文件 的 Network 节::
+
+        cache_ttl   默认的缓存时长 (秒)，响应头未指定 max-age 时使用
+        cache_size  缓存的最大容量 (MiB)，超出后按最近访问时间清理
+        offline     离线模式，开启后仅从缓存中读取
+
+    该类是一个线程安全的单例类
+    """
+
+    def __init__(self):
+        if not self._init_bool:
+            self.ttl = _config.get_option(_SECTION, 'cache_ttl', 3600)
+            self.max_size = _config.get_option(_SECTION, 'cache_size', 256) * 1024 * 1024
+            self.offline = _config.get_option(_SECTION, 'offline', False)
+            self.timeout = _config.get_option(_SECTION, 'timeout', 30)
+
+            self._address = os.path.join(_conf.Folder.CACHE, 'http.db')
+            self._connect = None
+            self._lock = threading.Lock()
+
+        super().__init__()
+        return
+
+    @property
+    def connect(self) -> sqlite3.Connection:
+        """
+        返回缓存数据库的连接，首次访问时创建
+        """
+        with self._lock:
+            if self._connect is None:
+                os.makedirs(os.path.dirname(self._address), exist_ok=True)
+                connect = sqlite3.connect(self._address, check_same_thread=False)
+                connect.execute("PRAGMA journal_mode = WAL")
+                connect.execute("PRAGMA synchronous = NORMAL")
+                connect.execute("CREATE TABLE IF NOT EXISTS response ("
+                                "url TEXT PRIMARY KEY, "
+                                "status INTEGER NOT NULL, "
+                                "headers TEXT NOT NULL, "
+                                "body BLOB NOT NULL, "
+                                "etag TEXT, "
+                                "last_modified TEXT, "
+                                "expires REAL NOT NULL, "
+                                "accessed REAL NOT NULL, "
+                                "size INTEGER NOT NULL)")
+                connect.execute("CREATE INDEX IF NOT EXISTS response_accessed ON response (accessed)")
+                connect.commit()
+                self._connect = connect
+        return self._connect
+
+    # ---------- 缓存操作 ----------
+
+    def get(self, url: str) -> tuple[Response, float, str | None, str | None] | None:
+        """
+        读取缓存，并更新其访问时间
+
+        :param url:
+            请求的地址
+
+        :type url: str
+
+        :return:
+            缓存不存在时返回 None，
+            否则返回由缓存的响应、过期时间、ETag 与 Last-Modified 构成的元组
+        :rtype: tuple[Response, float, str | None, str | None] | None
+        """
+        connect = self.connect
+        with self._lock:
+            row = connect.execute("SELECT status, headers, body, expires, etag, last_modified "
+                                  "FROM response WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return None
+            connect.execute("UPDATE response SET accessed = ? WHERE url = ?", (time.time(), url))
+            connect.commit()
+        response = Response(url, row[0], json.loads(row[1]), row[2], from_cache=True)
+        return response, row[3], row[4], row[5]
+
+    def put(self, response: Response, *, ttl=None):
+        """
+        写入缓存，如果响应头中包含 no-store，则不会写入
+
+        :param response:
+            待缓存的响应
+
+        :param ttl:
+            缓存时长，默认依次使用响应头中的 max-age 与配置中的 cache_ttl，仅限关键字
+
+        :type response: Response
+        :type ttl: int | None
+        """
+        max_age = _max_age(response.headers)
+        if max_age == -1:
+            return
+        if ttl is None:
+            ttl = self.ttl if max_age is None else max_age
+
+        now = time.time()
+        connect = self.connect
+        with self._lock:
+            connect.execute("REPLACE INTO response VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                            (response.url, response.status, json.dumps(response.headers), response.body,
+                             response.headers.get('etag'), response.headers.get('last-modified'),
+                             now + ttl, now, len(response.body)))
+            connect.commit()
+        self.prune()
+        return
+
+    def touch(self, url: str, headers: dict[str, str], *, ttl=None):
+        """
+        在重新验证成功 (304) 后延长缓存的过期时间，并合并新的验证字段
+
+        :type url: str
+        :type headers: dict[str, str]
+        :type ttl: int | None
+        """
+        max_age = _max_age(headers)
+        if ttl is None:
+            ttl = self.ttl if max_age is None or max_age == -1 else max_age
+
+        now = time.time()
+        connect = self.connect
+        with self._lock:
+            connect.execute("UPDATE response SET expires = ?, accessed = ?, "
+                            "etag = coalesce(?, etag), last_modified = coalesce(?, last_modified) "
+                            "WHERE url = ?",
+                            (now + ttl, now, headers.get('etag'), headers.get('last-modified'), url))
+            connect.commit()
+        return
+
+    def invalidate(self, url: str):
+        """
+        删除指定地址的缓存
+
+        :type url: str
+        """
+        connect = self.connect
+        with self._lock:
+            connect.execute("DELETE FROM response WHERE url = ?", (url,))
+            connect.commit()
+        return
+
+    def clear(self):
+        """
+        清空所有缓存
+        """
+        connect = self.connect
+        with self._lock:
+            connect.execute("DELETE FROM response")
+            connect.commit()
+            connect.execute("VACUUM")
+        return
+
+    def prune(self):
+        """
+        当缓存总容量超过 cache_size 时，按最近访问时间从旧到新删除缓存
+        """
+        connect = self.connect
+        with self._lock:
+            total = connect.execute("SELECT coalesce(sum(size), 0) FROM response").fetchone()[0]
+            if total <= self.max_size:
+                return
+            for url, size in connect.execute("SELECT url, size FROM response ORDER BY accessed").fetchall():
+                connect.execute("DELETE FROM response WHERE url = ?", (url,))
+                total -= size
+                if total <= self.max_size:
+                    break
+            connect.commit()
+        return
+
+    # ---------- 网络请求 ----------
+
+    def fetch(self, url: str, headers=None, *, ttl=None, offline=None, timeout=None) -> Response:
+        """
+        请求指定的地址，优先使用缓存
+
+        处理流程::
+
+            1. 离线模式下直接返回缓存，缓存不存在时抛出 OfflineError
+            #. 缓存未过期时直接返回缓存
+            #. 缓存已过期时附带 If-None-Match 与 If-Modified-Since 发起条件请求，
+               服务器返回 304 时延长缓存并返回
+            #. 网络错误时如果存在过期的缓存，则返回该缓存
+
+        :param url:
+            请求的地址
+
+        :param headers:
+            额外的请求头
+
+        :param ttl:
+            缓存时长，仅限关键字
+
+        :param offline:
+            是否使用离线模式，默认使用配置中的 offline，仅限关键字
+
+        :param timeout:
+            超时时间，默认使用配置中的 timeout，仅限关键字
+
+        :type url: str
+        :type headers: dict[str, str] | None
+        :type ttl: int | None
+        :type offline: bool | None
+        :type timeout: float | None
+
+        :return:
+            请求的响应
+        :rtype: Response
+
+        :raise OfflineError:
+            离线模式下缓存不存在时抛出
+
+        :raise urllib.error.URLError:
+            网络错误，并且不存在可用的缓存时抛出
+        """
+        url = str(url)
+        offline = self.offline if offline is None else bool(offline)
+        cached = self.get(url)
+
+        if offline:
+            if cached is None:
+                raise OfflineError(f"处于离线模式，并且 '{url}' 不存在缓存")
+            return cached[0]
+
+        if cached is not None and cached[1] > time.time():  # 未过期
+            return cached[0]
+
+        request = urllib.request.Request(url, headers={'User-Agent': _USER_AGENT, **(headers or {})})
+        if cached is not None:  # 条件请求
+            if cached[2] is not None:
+                request.add_header('If-None-Match', cached[2])
+            if cached[3] is not None:
+                request.add_header('If-Modified-Since', cached[3])
+
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout if timeout is None else timeout) as fp:
+                response = Response(url, fp.status, {key.lower(): value for key, value in fp.headers.items()},
+                                    fp.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and cached is not None:  # 未修改
+                self.touch(url, {key.lower(): value for key, value in e.headers.items()}, ttl=ttl)
+                return cached[0]
+            raise
+        except (urllib.error.URLError, TimeoutError):
+            if cached is not None:  # 网络错误时使用过期的缓存
+                return cached[0]
+            raise
+
+        if response.status == 200:
+            self.put(response, ttl=ttl)
+        return response
+
+
+def fetch(url: str, headers=None, **kwargs) -> Response:
+    """
+    使用全局共享的 :class:`HTTPCache` 请求指定的地址
+
+    参数与 :meth:`HTTPCache.fetch` 相同
+
+    :rtype: Response
+    """
+    return HTTPCache().fetch(url, headers, **kwargs)
@@ -0,0 +1,435 @@
+# RSS 订阅模块 (网络层)
+
+import time
+import asyncio
+import hashlib
+import logging
+import urllib.error
+import urllib.request
+import concurrent.futures
+
+import xml.etree.ElementTree as _ElementTree
+
+from typing import Callable as _Callable
+
+from . import cache as _cache
+from ..base import config as _config
+from ..base import database as _database
+
+
+__all__ = [
+    "Item",
+    "Feed",
+    "Poller"
+]
+
+
+_SECTION = 'RSS'  #: ADM INI文件 中订阅配置所在的节
+_DATABASE = 'rss'  #: 储存订阅状态的数据库名称
+
+_logger = logging.getLogger(__name__)
+
+
+def _local_name(tag: str) -> str:
+    """
+    移除 XML 标签的命名空间前缀
+
+    :rtype: str
+    """
+    return tag.rpartition('}')[2]
+
+
+def _guid_hash(feed_url: str, guid: str) -> bytes:
+    """
+    返回订阅地址与条目 GUID 的组合哈希，用作去重索引
+
+    :rtype: bytes
+    """
+    return hashlib.blake2b(f"{feed_url}\n{guid}".encode('utf8'), digest_size=16).digest()
+
+
+class Item:
+    """
+    订阅中的单个条目
+
+    同时兼容 RSS 的 item 与 Atom 的 entry
+    """
+
+    def __init__(self, feed: str, guid: str, title: str, link: str, published: str):
+        """
+        :param feed:
+            所属订阅的地址
+        :param guid:
+            条目的唯一标识，缺省时依次使用 link 与 title
+        :param title:
+            条目标题
+        :param link:
+            条目链接，对于发布站通常为种子或磁力链接
+        :param published:
+            发布时间的原始文本
+
+        :type feed: str
+        :type guid: str
+        :type title: str
+        :type link: str
+        :type published: str
+        """
+        self.feed = feed
+        self.guid = guid
+        self.title = title
+        self.link = link
+        self.published = published
+        return
+
+    def __repr__(self) -> str:
+        return f"<Item {self.title!r}>"
+
+
+class Feed:
+    """
+    单个订阅的轮询状态
+
+    轮询间隔会根据更新频率自适应调整::
+
+        1. 获得新条目时，间隔减半，但不低于 min_interval
+        #. 未获得新条目时，间隔增加一半，但不超过 max_interval
+        #. 请求失败时，间隔加倍，但不超过 max_interval
+    """
+
+    def __init__(self, url: str, interval: float, min_interval: float, max_interval: float):
+        self.url = url
+        self.interval = float(interval)
+        self.min_interval = float(min_interval)
+        self.max_interval = float(max_interval)
+
+        self.etag: str | None = None
+        self.last_modified: str | None = None
+        self.next_poll = 0.0  # 立即进行首次轮询
+        return
+
+    def adapt(self, new_items: int, *, failed=False):
+        """
+        根据本次轮询的结果调整轮询间隔，并计算下一次轮询的时间
+
+        :param new_items:
+            本次获得的新条目数目
+
+        :param failed:
+            本次轮询是否失败，仅限关键字
+
+        :type new_items: int
+        :type failed: bool
+        """
+        if failed:
+            interval = self.interval * 2
+        elif new_items:
+            interval = self.interval / 2
+        else:
+            interval = self.interval * 1.5
+        self.interval = min(max(interval, self.min_interval), self.max_interval)
+        self.next_poll = time.time() + self.interval
+        return
+
+    def __repr__(self) -> str:
+        return f"<Feed {self.url} every {self.interval:.0f}s>"
+
+
+# noinspection SqlResolve
+class Poller:
+    """
+    并发的 RSS 订阅轮询器
+
+    每个订阅均在独立的协程中按照自身的间隔进行轮询，
+    请求附带 If-None-Match 与 If-Modified-Since，未修改的订阅不会被下载，
+    订阅内容使用 :func:`xml.etree.ElementTree.iterparse` 流式解析，
+    在遇到第一个已知的条目时立即停止读取
+
+    已知条目以订阅地址与 GUID 的哈希值储存在 rss 数据库中
+
+    新条目会被放入 items 队列，如果指定了 callback，也会在事件循环中调用它
+
+    配置读取自 ADM INI文件 的 RSS 节::
+
+        interval      默认的轮询间隔 (秒)
+        min_interval  最短的轮询间隔 (秒)
+        max_interval  最长的轮询间隔 (秒)
+        concurrency   同时进行的请求数目
+    """
+
+    def __init__(self, *, callback=None, concurrency=None, database=_DATABASE):
+        """
+        :param callback:
+            接收 :class:`Item` 的可调用对象，仅限关键字
+
+        :param concurrency:
+            同时进行的请求数目，默认读取配置，仅限关键字
+
+        :param database:
+            储存订阅状态的数据库名称，仅限关键字
+
+        :type callback: _Callable[[Item], None] | None
+        :type concurrency: int | None
+        :type database: str
+        """
+        self.interval = _config.get_option(_SECTION, 'interval', 1800.0)
+        self.min_interval = _config.get_option(_SECTION, 'min_interval', 300.0)
+        self.max_interval = _config.get_option(_SECTION, 'max_interval', 21600.0)
+        self.concurrency = concurrency or _config.get_option(_SECTION, 'concurrency', 8)
+        self.timeout = _config.get_option('Network', 'timeout', 30)
+
+        self.callback: _Callable[[Item], None] | None = callback
+        self.items: asyncio.Queue[Item] = asyncio.Queue()
+
+        self._database = database
+        self._feeds: dict[str, Feed] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._stopping: asyncio.Event | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self._executor: concurrent.futures.ThreadPoolExecutor | None = None
+
+        with _database.transaction(self._database) as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS rss_feed ("
+                               "url TEXT PRIMARY KEY, "
+                               "etag TEXT, "
+                               "last_modified TEXT, "
+                               "interval REAL NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS rss_item ("
+                               "hash BLOB PRIMARY KEY, "
+                               "feed TEXT NOT NULL, "
+                               "title TEXT, "
+                               "link TEXT, "
+                               "published TEXT, "
+                               "seen REAL NOT NULL"
+                               ") WITHOUT ROWID")
+        return
+
+    # ---------- 订阅管理 ----------
+
+    def add(self, url: str, *, interval=None) -> Feed:
+        """
+        添加一个订阅，并恢复其上一次保存的轮询状态
+
+        如果轮询器已经在运行，则立即开始轮询该订阅
+
+        :param url:
+            订阅地址
+
+        :param interval:
+            初始的轮询间隔，默认读取配置，仅限关键字
+
+        :type url: str
+        :type interval: float | None
+
+        :rtype: Feed
+        """
+        url = str(url)
+        feed = Feed(url, interval or self.interval, self.min_interval, self.max_interval)
+
+        connection = _database.connect(self._database)
+        with _database.get_lock(self._database):
+            row = connection.execute("SELECT etag, last_modified, interval FROM rss_feed WHERE url = ?",
+                                     (url,)).fetchone()
+        if row is not None:
+            feed.etag, feed.last_modified = row[0], row[1]
+            if interval is None:
+                feed.interval = row[2]
+
+        self._feeds[url] = feed
+        if self._semaphore is not None and url not in self._tasks:
+            self._tasks[url] = asyncio.create_task(self._schedule(feed))
+        return feed
+
+    def remove(self, url: str):
+        """
+        移除一个订阅，并停止其轮询
+
+        :type url: str
+        """
+        del self._feeds[str(url)]
+        task = self._tasks.pop(str(url), None)
+        if task is not None:
+            task.cancel()
+        return
+
+    def feeds(self) -> list[Feed]:
+        """
+        返回所有的订阅
+
+        :rtype: list[Feed]
+        """
+        return list(self._feeds.values())
+
+    # ---------- 条目去重 ----------
+
+    def is_seen(self, feed_url: str, guid: str) -> bool:
+        """
+        判断条目是否已知
+
+        :rtype: bool
+        """
+        connection = _database.connect(self._database)
+        with _database.get_lock(self._database):
+            row = connection.execute("SELECT 1 FROM rss_item WHERE hash = ?",
+                                     (_guid_hash(feed_url, guid),)).fetchone()
+        return row is not None
+
+    def _save(self, feed: Feed, items: list[Item]):
+        """
+        储存新条目与订阅的轮询状态
+        """
+        now = time.time()
+        with _database.transaction(self._database) as connection:
+            connection.executemany("INSERT OR IGNORE INTO rss_item VALUES (?, ?, ?, ?, ?, ?)",
+                                   [(_guid_hash(item.feed, item.guid), item.feed,
+                                     item.title, item.link, item.published, now) for item in items])
+            connection.execute("REPLACE INTO rss_feed VALUES (?, ?, ?, ?)",
+                               (feed.url, feed.etag, feed.last_modified, feed.interval))
+        return
+
+    # ---------- 请求与解析 ----------
+
+    def _parse(self, feed: Feed, fp) -> list[Item]:
+        """
+        流式解析订阅内容，遇到第一个已知条目时停止
+
+        订阅内容默认按照时间由新到旧排列
+        """
+        items = []
+        container = None
+        seen = set()
+        for event, element in _ElementTree.iterparse(fp, events=('start', 'end')):
+            name = _local_name(element.tag)
+            if event == 'start':
+                if name in ('channel', 'feed'):
+                    container = element
+                continue
+            if name not in ('item', 'entry'):
+                continue
+
+            fields = {}
+            for child in element:
+                child_name = _local_name(child.tag)
+                if child_name == 'link' and child.get('href'):  # Atom
+                    fields.setdefault('link', child.get('href'))
+                elif child_name == 'enclosure' and child.get('url'):  # 发布站的种子文件
+                    fields['enclosure'] = child.get('url')
+                elif child.text:
+                    fields.setdefault(child_name, child.text.strip())
+
+            link = fields.get('enclosure') or fields.get('link', '')
+            title = fields.get('title', '')
+            guid = fields.get('guid') or fields.get('id') or link or title
+            if container is not None:
+                container.clear()  # 释放已解析的条目
+
+            if guid in seen:
+                continue
+            if self.is_seen(feed.url, guid):  # 之后的内容均已知
+                break
+            seen.add(guid)
+            items.append(Item(feed.url, guid, title, link,
+                              fields.get('pubDate') or fields.get('published') or fields.get('updated', '')))
+        return items
+
+    def _fetch(self, feed: Feed) -> list[Item]:
+        """
+        发起条件请求并解析，在线程池中运行
+
+        :return:
+            新条目的列表，未修改时为空
+        :rtype: list[Item]
+        """
+        # noinspection PyProtectedMember
+        request = urllib.request.Request(feed.url, headers={'User-Agent': _cache._USER_AGENT})
+        if feed.etag is not None:
+            request.add_header('If-None-Match', feed.etag)
+        if feed.last_modified is not None:
+            request.add_header('If-Modified-Since', feed.last_modified)
+
+        try:
+            fp = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 304:  # 未修改
+                return []
+            raise
+
+        with fp:
+            items = self._parse(feed, fp)
+            feed.etag = fp.headers.get('ETag')
+            feed.last_modified = fp.headers.get('Last-Modified')
+        return items
+
+    async def poll(self, feed: Feed) -> list[Item]:
+        """
+        立即轮询一次订阅，储存并分发新条目，并调整轮询间隔
+
+        :type feed: Feed
+
+        :return:
+            新条目的列表
+        :rtype: list[Item]
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            items = await loop.run_in_executor(self._executor, self._fetch, feed)
+        except (urllib.error.URLError, TimeoutError, ConnectionError, _ElementTree.ParseError) as e:
+            _logger.warning("订阅 '%s' 轮询失败: %s", feed.url, e)
+            feed.adapt(0, failed=True)
+            return []
+
+        feed.adapt(len(items))
+        await loop.run_in_executor(self._executor, self._save, feed, items)
+
+        for item in reversed(items):  # 按由旧到新的顺序分发
+            self.items.put_nowait(item)
+            if self.callback is not None:
+                self.callback(item)
+        return items
+
+    # ---------- 运行 ----------
+
+    async def _schedule(self, feed: Feed):
+        """
+        单个订阅的轮询循环
+
+        :meth:`poll` 抛出的其他异常 (例如无效的地址、数据库错误或 callback 的异常) 只会被记录，
+        并按照失败增加轮询间隔，不会结束该订阅的轮询
+        """
+        while True:
+            await asyncio.sleep(max(feed.next_poll - time.time(), 0))
+            async with self._semaphore:
+                try:
+                    await self.poll(feed)
+                except Exception:
+                    _logger.exception("订阅 '%s' 轮询时发生了意外的错误", feed.url)
+                    feed.adapt(0, failed=True)
+
+    async def run(self):
+        """
+        开始轮询所有订阅，直到调用 :meth:`stop` 或被取消
+        """
+        self._stopping = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency,
+                                                               thread_name_prefix='rss')
+        for url, feed in self._feeds.items():
+            self._tasks[url] = asyncio.create_task(self._schedule(feed))
+        try:
+            await self._stopping.wait()
+        finally:
+            for task in self._tasks.values():
+                task.cancel()
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+            self._tasks = {}
+            self._semaphore = None
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        return
+
+    def stop(self):
+        """
+        停止所有订阅的轮询
+        """
+        if self._stopping is not None:
+            self._stopping.set()
+        return
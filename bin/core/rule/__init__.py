@@ -0,0 +1,8 @@
+from . import organise
+from . import link
+
+
+__all__ = [
+    "organise",
+    "link"
+]
@@ -0,0 +1,378 @@
+# 链接整理模块 (规则层)
+
+import os
+import logging
+import collections
+
+from typing import (
+    Callable as _Callable,
+    Iterable as _Iterable
+)
+
+from ..base import config as _config
+from ..base import database as _database
+from ..file import duplicate as _duplicate
+from ..file import transfer as _transfer
+from ..file import watch as _watch
+
+
+__all__ = [
+    "MISSING",
+    "STALE",
+    "ORPHAN",
+    "LinkTree"
+]
+
+
+MISSING = 'missing'  #: 损坏类型，链接不存在
+STALE = 'stale'  #: 损坏类型，链接不再指向源文件，例如源文件被重新下载
+ORPHAN = 'orphan'  #: 损坏类型，源文件已不存在
+
+_SECTION = 'File'  #: ADM INI文件 中文件配置所在的节
+_DATABASE = 'library'  #: 储存链接记录的数据库名称
+
+_logger = logging.getLogger(__name__)
+
+
+def _listing(cache: dict, folder: str) -> dict[str, os.DirEntry]:
+    """
+    返回文件夹中以文件名为键的 DirEntry，结果缓存在 cache 中，每个文件夹仅调用一次 scandir
+    """
+    if folder not in cache:
+        try:
+            with os.scandir(folder) as entries:
+                cache[folder] = {os.path.normcase(entry.name): entry for entry in entries}
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            cache[folder] = {}
+    return cache[folder]
+
+
+def _entry(cache: dict, path: str) -> os.DirEntry | None:
+    return _listing(cache, os.path.dirname(path)).get(os.path.normcase(os.path.basename(path)))
+
+
+# noinspection SqlResolve
+class LinkTree:
+    """
+    由链接构成的整理视图
+
+    源文件保持原有的布局 (例如用于做种)，在目标地址创建链接构成规范的媒体库，
+    同一设备上使用硬链接，不占用额外的空间，跨设备时改用符号链接
+
+    每个链接均记录在 library 数据库中，:meth:`sync` 仅对变化的部分创建或删除链接，
+    :meth:`update` 可以直接接收 :class:`core.file.watch.Watcher` 的事件，新增一个文件仅需创建一个链接
+
+    删除链接前会确认目标仍是由本视图创建的链接，不会删除占用该地址的其他文件，
+    源文件已不存在且硬链接是唯一的副本时保留该文件，仅报告为孤立链接
+
+    配置读取自 ADM INI文件 的 File 节::
+
+        link_mode  链接类型，为 hardlink、symlink 或 auto
+    """
+
+    def __init__(self, name: str, rule: _Callable[[str], str | None], *, root=None, mode=None, database=_DATABASE):
+        """
+        :param name:
+            视图名称，同一个数据库中可以保存多个视图
+
+        :param rule:
+            接收源地址并返回链接地址的可调用对象，返回 None 时不链接该文件
+
+        :param root:
+            链接树的根目录，删除链接后向上移除变空的文件夹直至该目录 (不含)，为 None 时不移除文件夹，仅限关键字
+
+        :param mode:
+            链接类型，默认读取配置，仅限关键字
+
+        :param database:
+            储存链接记录的数据库名称，仅限关键字
+
+        :type name: str
+        :type rule: _Callable[[str], str | None]
+        :type root: conf.Path.StrPath | None
+        :type mode: str | None
+        :type database: str
+        """
+        self.name = name
+        self.rule = rule
+        self.root = None if root is None else os.path.abspath(root)
+        self.mode = mode or _config.get_option(_SECTION, 'link_mode', 'auto')
+        self.stats = {}  #: 最近一次 sync 或 repair 的统计信息
+
+        self._database = database
+        with _database.transaction(self._database) as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS link_tree ("
+                               "tree TEXT NOT NULL, "
+                               "dst TEXT NOT NULL, "
+                               "src TEXT NOT NULL, "
+                               "kind TEXT NOT NULL, "
+                               "inode INTEGER, "
+                               "PRIMARY KEY (tree, dst)) WITHOUT ROWID")
+            if 'inode' not in {row[1] for row in connection.execute("PRAGMA table_info (link_tree)")}:
+                connection.execute("ALTER TABLE link_tree ADD COLUMN inode INTEGER")  # 早期版本的数据库
+            connection.execute("CREATE INDEX IF NOT EXISTS link_tree_src ON link_tree (tree, src)")
+        return
+
+    def links(self) -> dict[str, tuple[str, str]]:
+        """
+        返回所有的链接记录
+
+        :return:
+            以链接地址为键，源地址与链接类型构成的元组为值的字典
+        :rtype: dict[str, tuple[str, str]]
+        """
+        connection = _database.connect(self._database)
+        with _database.get_lock(self._database):
+            rows = connection.execute("SELECT dst, src, kind FROM link_tree WHERE tree = ?", (self.name,)).fetchall()
+        return {dst: (src, kind) for dst, src, kind in rows}
+
+    # ---------- 链接 ----------
+
+    @staticmethod
+    def _is_link(src: str, dst: str, kind: str) -> bool:
+        """
+        判断 dst 是否为指向 src 的链接
+        """
+        try:
+            if kind == _transfer.SYMLINK:
+                return os.path.islink(dst) and os.readlink(dst) == src
+            return not os.path.islink(dst) and os.path.samefile(src, dst)
+        except OSError:
+            return False
+
+    def _link(self, src: str, dst: str, recorded: tuple[str, str] | None) -> str | None:
+        """
+        创建链接，dst 已存在时仅替换由本视图创建的链接
+
+        :return:
+            链接类型，dst 被其他文件占用时返回 None
+        """
+        if recorded is not None and recorded[0] == src and self._is_link(src, dst, recorded[1]):
+            return recorded[1]
+        if recorded is None and os.path.lexists(dst):  # 数据库丢失记录时接管已有的链接
+            for kind in (_transfer.HARDLINK, _transfer.SYMLINK):
+                if self._is_link(src, dst, kind):
+                    return kind
+            return None
+        return _transfer.link_file(src, dst, mode=self.mode, replace=recorded is not None)
+
+    def _unlink(self, src: str, dst: str, kind: str) -> bool:
+        """
+        删除由本视图创建的链接，并向上移除变空的文件夹直至根目录
+
+        dst 被其他文件占用时不会删除，源文件已不存在时仅删除仍有其他硬链接的文件，
+        硬链接数为 1 时该文件是唯一的副本，因此予以保留
+
+        :return:
+            是否应删除链接记录，保留唯一的副本时返回 False
+        """
+        if not self._is_link(src, dst, kind):
+            try:
+                stat = os.lstat(dst)
+            except FileNotFoundError:
+                return True
+            if kind == _transfer.SYMLINK or os.path.lexists(src) or os.path.islink(dst):
+                return True  # 地址已被其他文件占用，不再属于本视图
+            if stat.st_nlink <= 1:
+                _logger.warning("链接 '%s' 的源文件 '%s' 已不存在，并且该文件是唯一的副本，因此予以保留", dst, src)
+                return False
+        try:
+            os.remove(dst)
+        except FileNotFoundError:
+            pass
+
+        folder = os.path.dirname(dst)
+        while self.root is not None and folder.startswith(os.path.join(self.root, '')):
+            try:
+                os.rmdir(folder)
+            except OSError:
+                break
+            folder = os.path.dirname(folder)
+        return True
+
+    @staticmethod
+    def _inode(dst: str, kind: str) -> int | None:
+        """
+        返回硬链接的 inode，用于之后判断该地址上的文件是否仍是本视图创建的链接
+        """
+        if kind != _transfer.HARDLINK:
+            return None
+        try:
+            return os.lstat(dst).st_ino
+        except OSError:
+            return None
+
+    def _replaceable(self, dst: str, kind: str, inode: int | None) -> bool:
+        """
+        判断修复时是否可以替换 dst，即 dst 不存在或仍是本视图创建的链接，
+        硬链接的链接数大于 1 或 inode 与记录一致时才认为是本视图创建的，否则可能是用户放置的文件
+        """
+        try:
+            stat = os.lstat(dst)
+        except FileNotFoundError:
+            return True
+        if kind == _transfer.SYMLINK:
+            return os.path.islink(dst)
+        return not os.path.islink(dst) and (stat.st_nlink > 1 or (inode is not None and stat.st_ino == inode))
+
+    def _save(self, created: list[tuple[str, str, str]], removed: list[str]):
+        rows = [(self.name, dst, src, kind, self._inode(dst, kind)) for dst, src, kind in created]
+        with _database.transaction(self._database) as connection:
+            connection.executemany("DELETE FROM link_tree WHERE tree = ? AND dst = ?",
+                                   [(self.name, dst) for dst in removed])
+            connection.executemany("INSERT OR REPLACE INTO link_tree VALUES (?, ?, ?, ?, ?)", rows)
+        return
+
+    # ---------- 同步 ----------
+
+    def sync(self, roots: _Iterable) -> dict[str, int]:
+        """
+        使链接与根目录下的源文件保持一致，仅对变化的部分进行文件操作
+
+        :param roots:
+            源文件根目录的可迭代对象
+
+        :type roots: _Iterable[conf.Path.StrPath]
+
+        :return:
+            统计信息
+        :rtype: dict[str, int]
+        """
+        desired = {}
+        duplicated = occupied = 0
+        for entry in _duplicate.walk(roots):
+            dst = self.rule(entry.path)
+            if dst is None:
+                continue
+            dst = os.path.abspath(dst)
+            if dst in desired:
+                duplicated += 1
+            else:
+                desired[dst] = entry.path
+
+        existing = self.links()
+        created, removed = [], []
+        kept = 0
+        for dst in existing.keys() - desired.keys():
+            if self._unlink(existing[dst][0], dst, existing[dst][1]):
+                removed.append(dst)
+            else:
+                kept += 1
+        for dst, src in desired.items():
+            recorded = existing.get(dst)
+            if recorded is not None and recorded[0] == src:
+                continue  # 链接是否损坏由 verify 检查
+            kind = self._link(src, dst, recorded)
+            if kind is None:
+                occupied += 1
+            else:
+                created.append((dst, src, kind))
+        self._save(created, removed)
+
+        self.stats = {'links': len(desired) - occupied, 'created': len(created),
+                      'removed': len(removed), 'kept': kept, 'conflicts': duplicated + occupied}
+        return self.stats
+
+    def update(self, events: _Iterable[_watch.Event]):
+        """
+        根据源文件的变化事件增量更新链接
+
+        :param events:
+            :class:`core.file.watch.Watcher` 产生的事件的可迭代对象
+
+        :type events: _Iterable[_watch.Event]
+        """
+        existing = self.links()
+        by_src = collections.defaultdict(list)
+        for dst, (src, _) in existing.items():
+            by_src[src].append(dst)
+
+        created, removed = [], []
+        for event in events:
+            path = os.path.abspath(event.path)
+            if event.kind == _watch.DELETED:
+                prefix = path + os.sep
+                for src in [src for src in by_src if src == path or (event.is_dir and src.startswith(prefix))]:
+                    for dst in by_src.pop(src):
+                        if self._unlink(src, dst, existing[dst][1]):
+                            removed.append(dst)
+            elif not event.is_dir:
+                dst = self.rule(path)
+                if dst is None:
+                    continue
+                dst = os.path.abspath(dst)
+                kind = self._link(path, dst, existing.get(dst))
+                if kind is not None:
+                    created.append((dst, path, kind))
+                    existing[dst] = (path, kind)
+                    by_src[path].append(dst)
+        self._save(created, removed)
+        return
+
+    # ---------- 修复 ----------
+
+    def verify(self) -> list[tuple[str, str, str]]:
+        """
+        检查所有的链接，每个文件夹仅调用一次 scandir，不会逐个读取文件状态
+
+        :return:
+            由损坏类型、源地址与链接地址构成的元组的列表
+        :rtype: list[tuple[str, str, str]]
+        """
+        cache = {}
+        broken = []
+        for dst, (src, kind) in self.links().items():
+            source = _entry(cache, src)
+            link = _entry(cache, dst)
+            if source is None or not source.is_file(follow_symlinks=False):
+                broken.append((ORPHAN, src, dst))
+            elif link is None:
+                broken.append((MISSING, src, dst))
+            elif kind == _transfer.SYMLINK:
+                if not link.is_symlink() or os.readlink(dst) != src:
+                    broken.append((STALE, src, dst))
+            elif link.is_symlink() or link.inode() != source.inode():
+                broken.append((STALE, src, dst))
+        return broken
+
+    def repair(self, broken: list[tuple[str, str, str]] | None = None) -> dict[str, int]:
+        """
+        批量修复损坏的链接，源文件已不存在时删除链接，但保留作为唯一副本的硬链接，
+        链接地址被其他文件 (例如用户放置的文件) 占用时不会替换，计入 conflicts
+
+        :param broken:
+            :meth:`verify` 的返回值，为 None 时重新检查
+
+        :type broken: list[tuple[str, str, str]] | None
+
+        :return:
+            统计信息
+        :rtype: dict[str, int]
+        """
+        if broken is None:
+            broken = self.verify()
+        existing = self.links()
+        connection = _database.connect(self._database)
+        with _database.get_lock(self._database):
+            inodes = dict(connection.execute("SELECT dst, inode FROM link_tree WHERE tree = ?", (self.name,)))
+        created, removed = [], []
+        conflicts = kept = 0
+        for problem, src, dst in broken:
+            if problem == ORPHAN:
+                if dst not in existing or self._unlink(src, dst, existing[dst][1]):
+                    removed.append(dst)
+                else:
+                    kept += 1
+                continue
+            if dst in existing and not self._replaceable(dst, existing[dst][1], inodes.get(dst)):
+                conflicts += 1
+                continue
+            try:
+                created.append((dst, src, _transfer.link_file(src, dst, mode=self.mode, replace=True)))
+            except OSError:
+                conflicts += 1
+        self._save(created, removed)
+
+        self.stats = {'broken': len(broken), 'relinked': len(created), 'removed': len(removed),
+                      'kept': kept, 'conflicts': conflicts}
+        return self.stats
@@ -0,0 +1,412 @@
+# 文件整理模块 (规则层)
+
+import os
+import time
+import collections
+import concurrent.futures
+
+from typing import (
+    Callable as _Callable,
+    Iterable as _Iterable
+)
+
+from ..base import config as _config
+from ..base import database as _database
+from ..file import duplicate as _duplicate
+from ..file import transfer as _transfer
+
+
+__all__ = [
+    "MISSING",
+    "DUPLICATE",
+    "EXISTS",
+    "OCCUPIED",
+    "Operation",
+    "Plan",
+    "Organiser"
+]
+
+
+MISSING = 'missing'  #: 冲突类型，源文件不存在
+DUPLICATE = 'duplicate'  #: 冲突类型，多个源文件对应同一个目标
+EXISTS = 'exists'  #: 冲突类型，目标文件已存在
+OCCUPIED = 'occupied'  #: 冲突类型，目标为计划中其他操作的源文件
+
+_SECTION = 'File'  #: ADM INI文件 中文件配置所在的节
+_DATABASE = 'library'  #: 储存整理日志的数据库名称
+_BATCH = 256  #: 同设备移动时每批次写入日志的操作数目
+
+
+def _key(path: str) -> str:
+    """
+    返回用于比较的地址，在大小写不敏感的平台上忽略大小写
+    """
+    return os.path.normcase(os.path.abspath(path))
+
+
+class Operation:
+    """
+    整理计划中的单个移动操作
+    """
+
+    def __init__(self, src: str, dst: str):
+        self.src = os.path.abspath(src)
+        self.dst = os.path.abspath(dst)
+        self.conflict: str | None = None  #: 冲突类型，无冲突时为 None
+        return
+
+    def __repr__(self) -> str:
+        return f"<Operation {self.src} -> {self.dst}{f' ({self.conflict})' if self.conflict else ''}>"
+
+
+class Plan:
+    """
+    整理计划
+
+    在执行前计算出所有的移动操作并检测冲突，
+    源地址与目标地址相同的操作会被忽略
+    """
+
+    def __init__(self, pairs: _Iterable[tuple]):
+        """
+        :param pairs:
+            (源地址, 目标地址) 的可迭代对象
+
+        :type pairs: _Iterable[tuple[conf.Path.StrPath, conf.Path.StrPath]]
+        """
+        self.operations = [Operation(src, dst) for src, dst in pairs if _key(src) != _key(dst)]
+        self._detect()
+        return
+
+    @classmethod
+    def from_rule(cls, roots: _Iterable, rule: _Callable[[str], str | None]) -> 'Plan':
+        """
+        遍历根目录下的所有文件，使用 rule 计算每个文件的目标地址
+
+        :param roots:
+            根目录的可迭代对象
+
+        :param rule:
+            接收源地址并返回目标地址的可调用对象，返回 None 时不移动该文件
+
+        :type roots: _Iterable[conf.Path.StrPath]
+        :type rule: _Callable[[str], str | None]
+
+        :rtype: Plan
+        """
+        pairs = []
+        for entry in _duplicate.walk(roots):
+            dst = rule(entry.path)
+            if dst is not None:
+                pairs.append((entry.path, dst))
+        return cls(pairs)
+
+    def _detect(self):
+        """
+        检测所有操作的冲突
+        """
+        targets = collections.Counter(_key(operation.dst) for operation in self.operations)
+        sources = {_key(operation.src) for operation in self.operations}
+        for operation in self.operations:
+            if not os.path.lexists(operation.src):
+                operation.conflict = MISSING
+            elif targets[_key(operation.dst)] > 1:
+                operation.conflict = DUPLICATE
+            elif _key(operation.dst) in sources:
+                operation.conflict = OCCUPIED
+            elif os.path.lexists(operation.dst):
+                operation.conflict = EXISTS
+        return
+
+    @property
+    def conflicts(self) -> list[Operation]:
+        """
+        返回存在冲突的操作
+        """
+        return [operation for operation in self.operations if operation.conflict is not None]
+
+    def dry_run(self) -> list[str]:
+        """
+        返回计划的文本描述，不会进行任何文件操作
+
+        :rtype: list[str]
+        """
+        lines = []
+        for operation in self.operations:
+            state = 'move' if operation.conflict is None else f"skip [{operation.conflict}]"
+            lines.append(f"{state}: {operation.src} -> {operation.dst}")
+        lines.append(f"共 {len(self.operations)} 个操作，其中 {len(self.conflicts)} 个存在冲突")
+        return lines
+
+    def __len__(self) -> int:
+        return len(self.operations)
+
+
+# noinspection SqlResolve
+class Organiser:
+    """
+    整理计划的执行者
+
+    同一设备上的移动使用 :func:`os.rename`，
+    跨设备的移动使用零拷贝的 :func:`core.file.transfer.move_file`，并在线程池中并行进行
+
+    每一个操作均记录在 library 数据库的日志中，
+    中断后可以使用 :meth:`resume` 继续执行，或使用 :meth:`rollback` 撤销已完成的操作，
+    恢复时会根据文件的实际状态校正日志，因此日志的批量写入不会影响正确性
+
+    配置读取自 ADM INI文件 的 File 节::
+
+        organise_workers  跨设备移动的线程数目
+    """
+
+    def __init__(self, *, workers=None, database=_DATABASE):
+        """
+        :param workers:
+            跨设备移动的线程数目，默认读取配置，仅限关键字
+
+        :param database:
+            储存整理日志的数据库名称，仅限关键字
+
+        :type workers: int | None
+        :type database: str
+        """
+        self.workers = workers or _config.get_option(_SECTION, 'organise_workers', 4)
+
+        self._database = database
+        with _database.transaction(self._database) as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS organise_run ("
+                               "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                               "created REAL NOT NULL, "
+                               "state TEXT NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS organise_journal ("
+                               "run INTEGER NOT NULL REFERENCES organise_run (id) ON DELETE CASCADE, "
+                               "seq INTEGER NOT NULL, "
+                               "src TEXT NOT NULL, "
+                               "dst TEXT NOT NULL, "
+                               "state TEXT NOT NULL, "
+                               "error TEXT, "
+                               "PRIMARY KEY (run, seq))")
+            connection.execute("CREATE TABLE IF NOT EXISTS organise_folder ("
+                               "run INTEGER NOT NULL REFERENCES organise_run (id) ON DELETE CASCADE, "
+                               "path TEXT NOT NULL, "
+                               "PRIMARY KEY (run, path))")
+        return
+
+    # ---------- 日志 ----------
+
+    def runs(self) -> list[tuple[int, float, str]]:
+        """
+        返回所有的整理记录
+
+        :return:
+            由编号、创建时间与状态构成的元组的列表
+        :rtype: list[tuple[int, float, str]]
+        """
+        connection = _database.connect(self._database)
+        with _database.get_lock(self._database):
+            return connection.execute("SELECT id, created, state FROM organise_run ORDER BY id").fetchall()
+
+    def journal(self, run: int) -> list[tuple[int, str, str, str, str | None]]:
+        """
+        返回指定整理记录的所有操作
+
+        :return:
+            由序号、源地址、目标地址、状态与错误信息构成的元组的列表
+        :rtype: list[tuple[int, str, str, str, str | None]]
+        """
+        connection = _database.connect(self._database)
+        with _database.get_lock(self._database):
+            return connection.execute("SELECT seq, src, dst, state, error FROM organise_journal "
+                                      "WHERE run = ? ORDER BY seq", (run,)).fetchall()
+
+    def _mark(self, run: int, rows: list[tuple[str, str | None, int]]):
+        """
+        批量更新操作状态
+
+        :param rows:
+            由状态、错误信息与序号构成的元组的列表
+        """
+        if rows:
+            with _database.transaction(self._database) as connection:
+                connection.executemany("UPDATE organise_journal SET state = ?, error = ? "
+                                       "WHERE run = ? AND seq = ?", [(*row[:2], run, row[2]) for row in rows])
+        return
+
+    def _record_folders(self, run: int, destinations: _Iterable[str]):
+        """
+        在移动之前记录将由本次整理创建的目标文件夹，撤销时仅移除这些文件夹
+
+        :param destinations:
+            目标地址的可迭代对象
+        """
+        created, existing = set(), set()
+        for dst in destinations:
+            folder = os.path.dirname(dst)
+            while folder not in created and folder not in existing:
+                if os.path.isdir(folder):
+                    existing.add(folder)
+                    break
+                created.add(folder)
+                parent = os.path.dirname(folder)
+                if parent == folder:
+                    break
+                folder = parent
+        if created:
+            with _database.transaction(self._database) as connection:
+                connection.executemany("INSERT OR IGNORE INTO organise_folder VALUES (?, ?)",
+                                       [(run, folder) for folder in created])
+        return
+
+    def _set_state(self, run: int, state: str):
+        with _database.transaction(self._database) as connection:
+            connection.execute("UPDATE organise_run SET state = ? WHERE id = ?", (state, run))
+        return
+
+    # ---------- 执行 ----------
+
+    def _apply(self, run: int, operations: list[tuple[int, str, str]], done_state: str,
+               callback: _Callable[[str, str], None] | None, failed_state='failed'):
+        """
+        执行一组移动操作，并根据文件的实际状态跳过已完成的操作
+
+        失败的操作的状态为 failed_state，错误信息记录在 error 中
+        """
+        same, cross, finished = [], [], []
+        for seq, src, dst in operations:
+            if not os.path.lexists(src) and os.path.lexists(dst):  # 已完成，但日志未写入
+                finished.append((done_state, None, seq))
+            elif not os.path.lexists(src):
+                finished.append((failed_state, MISSING, seq))
+            elif os.path.lexists(dst):
+                finished.append((failed_state, EXISTS, seq))
+            elif _transfer.same_device(src, dst):
+                same.append((seq, src, dst))
+            else:
+                cross.append((seq, src, dst))
+        self._mark(run, finished)
+        self._record_folders(run, (dst for _, _, dst in same + cross))
+
+        batch = []
+        for seq, src, dst in same:
+            try:
+                _transfer.move_file(src, dst)
+            except OSError as e:
+                batch.append((failed_state, str(e), seq))
+            else:
+                batch.append((done_state, None, seq))
+                if callback is not None:
+                    callback(src, dst)
+            if len(batch) >= _BATCH:
+                self._mark(run, batch)
+                batch = []
+        self._mark(run, batch)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(_transfer.move_file, src, dst): (seq, src, dst) for seq, src, dst in cross}
+            for future in concurrent.futures.as_completed(futures):
+                seq, src, dst = futures[future]
+                try:
+                    future.result()
+                except OSError as e:
+                    self._mark(run, [(failed_state, str(e), seq)])
+                else:
+                    self._mark(run, [(done_state, None, seq)])
+                    if callback is not None:
+                        callback(src, dst)
+        return
+
+    def execute(self, plan: Plan, *, skip_conflicts=False, callback=None) -> int:
+        """
+        执行整理计划
+
+        :param plan:
+            整理计划
+
+        :param skip_conflicts:
+            是否跳过存在冲突的操作，否则存在冲突时不会执行任何操作，仅限关键字
+
+        :param callback:
+            每完成一个操作时调用，接收源地址与目标地址，仅限关键字
+
+        :type plan: Plan
+        :type skip_conflicts: bool
+        :type callback: _Callable[[str, str], None] | None
+
+        :return:
+            整理记录的编号
+        :rtype: int
+
+        :raise FileExistsError:
+            计划存在冲突，并且未指定 skip_conflicts 时抛出
+        """
+        conflicts = plan.conflicts
+        if conflicts and not skip_conflicts:
+            raise FileExistsError(f"整理计划中存在 {len(conflicts)} 个冲突，例如 {conflicts[0]}")
+
+        with _database.transaction(self._database) as connection:
+            run = connection.execute("INSERT INTO organise_run (created, state) VALUES (?, 'running')",
+                                     (time.time(),)).lastrowid
+            connection.executemany("INSERT INTO organise_journal VALUES (?, ?, ?, ?, ?, ?)",
+                                   [(run, seq, operation.src, operation.dst,
+                                     'pending' if operation.conflict is None else 'skipped', operation.conflict)
+                                    for seq, operation in enumerate(plan.operations)])
+
+        self.resume(run, callback=callback)
+        return run
+
+    def resume(self, run: int, *, callback=None):
+        """
+        继续执行被中断的整理记录中所有未完成的操作
+
+        :param run:
+            整理记录的编号
+
+        :param callback:
+            每完成一个操作时调用，接收源地址与目标地址，仅限关键字
+
+        :type run: int
+        :type callback: _Callable[[str, str], None] | None
+        """
+        operations = [(seq, src, dst) for seq, src, dst, state, _ in self.journal(run) if state == 'pending']
+        self._apply(run, operations, 'done', callback)
+        self._set_state(run, 'done')
+        return
+
+    def rollback(self, run: int, *, callback=None):
+        """
+        按相反的顺序撤销整理记录中所有已完成的操作，并移除本次整理创建且已变空的目标文件夹
+
+        中断时同设备移动的日志可能尚未写入，
+        因此撤销前先根据文件的实际状态校正仍为 pending 的操作；
+        撤销失败的操作保持 done 状态并记录错误信息，排除原因后再次调用即可重试，
+        此时整理记录的状态保持为 rolling_back
+
+        :param run:
+            整理记录的编号
+
+        :param callback:
+            每撤销一个操作时调用，接收源地址与目标地址，仅限关键字
+
+        :type run: int
+        :type callback: _Callable[[str, str], None] | None
+        """
+        self._set_state(run, 'rolling_back')
+        journal = self.journal(run)
+        finished = {seq for seq, src, dst, state, _ in journal
+                    if state == 'pending' and not os.path.lexists(src) and os.path.lexists(dst)}
+        self._mark(run, [('done', None, seq) for seq in finished])
+        operations = [(seq, dst, src) for seq, src, dst, state, _ in reversed(journal)
+                      if state == 'done' or seq in finished]
+        self._apply(run, operations, 'rolled_back', callback, failed_state='done')
+
+        connection = _database.connect(self._database)
+        with _database.get_lock(self._database):
+            folders = [path for path, in connection.execute("SELECT path FROM organise_folder WHERE run = ?", (run,))]
+        for folder in sorted(folders, key=len, reverse=True):  # 由深至浅移除变空的文件夹
+            try:
+                os.rmdir(folder)
+            except OSError:
+                pass
+        if not any(state == 'done' for _, _, _, state, _ in self.journal(run)):
+            self._set_state(run, 'rolled_back')
+        return
@@ -0,0 +1,358 @@
+# 守护进程模块 (启动层)
+#
+# 第一个启动的 minisite 完成初始化后常驻后台，保持配置，缓存与数据库连接池处于已初始化的状态，
+# 之后启动的 minisite 与 manage.py 通过本地的 Unix 套接字 (Windows 上为命名管道) 将命令转发给它执行，
+# 无需重复环境检查，虚拟环境激活与 core.base.setup
+#
+# 守护进程的地址与认证密钥记录在运行文件中，只有当前用户可以读取
+
+import os
+import sys
+
+
+__all__ = [
+    'RUNTIME',
+    'LOCAL_COMMANDS',
+    'INTERACTIVE_COMMANDS',
+    'is_local',
+    'command',
+    'forward',
+    'serve'
+]
+
+
+RUNTIME = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles', 'temp', 'daemon.json')  # 与 Folder.TEMP 的默认位置一致
+LOCAL_COMMANDS = frozenset({'runserver', 'testserver', 'shell', 'dbshell', 'test', 'changepassword'})  # 需要终端或长时间运行，不转发的 Django 命令
+INTERACTIVE_COMMANDS = frozenset({'createsuperuser', 'flush', 'makemigrations', 'migrate', 'squashmigrations',
+                                  'collectstatic', 'remove_stale_contenttypes'})  # 可能读取标准输入，仅在指定 --noinput 时转发的 Django 命令
+_NOINPUT = frozenset({'--noinput', '--no-input'})
+
+_commands = {}  # 命令名称与处理函数
+
+
+def command(name: str):
+    """
+    注册一个可以被转发的命令，用作装饰器::
+
+        @daemon.command('name')
+        def func(args: list[str]) -> int:
+            ...
+
+    处理函数在守护进程中依次执行，写入标准输出与标准错误的内容会被转发回客户端，
+    返回值或 SystemExit 的状态码为客户端的退出状态码，标准输入始终为空，读取时立即得到 EOF
+
+    :param name:
+        命令名称
+
+    :type name: str
+    """
+    def decorator(func):
+        _commands[name] = func
+        return func
+
+    return decorator
+
+
+def is_local(args) -> bool:
+    """
+    判断 Django 命令是否应在当前进程中执行而不转发给守护进程
+
+    守护进程没有终端，因此需要终端的命令与未指定 --noinput 的交互式命令均在当前进程中执行
+
+    :param args:
+        manage.py 的参数，不包括程序名称
+
+    :type args: typing.Sequence[str]
+
+    :rtype: bool
+    """
+    if not args:
+        return True
+    return args[0] in LOCAL_COMMANDS or (args[0] in INTERACTIVE_COMMANDS and not _NOINPUT.intersection(args))
+
+
+def _read_runtime(runtime: str) -> dict | None:
+    import json
+
+    try:
+        with open(runtime, encoding='utf8') as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+def _connect(runtime: str):
+    """
+    连接守护进程
+
+    :return:
+        multiprocessing 的 Connection，运行文件不存在或守护进程未在运行时返回 None
+    """
+    info = _read_runtime(runtime)
+    if info is None:
+        return None
+    from multiprocessing.connection import Client, AuthenticationError
+
+    try:
+        return Client(info['address'], family=info['family'], authkey=bytes.fromhex(info['authkey']))
+    except (OSError, EOFError, KeyError, ValueError, AuthenticationError):
+        return None
+
+
+def _request(connection, name: str, args: list[str]) -> dict:
+    import json
+
+    connection.send_bytes(json.dumps({'command': name, 'args': args, 'cwd': os.getcwd()}).encode('utf8'))
+    return json.loads(connection.recv_bytes())
+
+
+def forward(name: str, args=(), *, runtime=RUNTIME) -> int | None:
+    """
+    将命令转发给正在运行的守护进程执行，并输出其标准输出与标准错误
+
+    :param name:
+        命令名称，参考 :func:`command`
+    :param args:
+        命令参数
+    :param runtime:
+        运行文件的地址，仅限关键字
+
+    :type name: str
+    :type args: typing.Iterable[str]
+    :type runtime: str
+
+    :return:
+        命令的退出状态码，守护进程未在运行时返回 None，此时应在当前进程中执行命令
+    :rtype: int | None
+
+    :raise EOFError:
+        守护进程在执行命令时退出时抛出
+    """
+    connection = _connect(runtime)
+    if connection is None:
+        return None
+    with connection:
+        reply = _request(connection, name, list(args))
+    sys.stdout.write(reply['stdout'])
+    sys.stdout.flush()
+    sys.stderr.write(reply['stderr'])
+    sys.stderr.flush()
+    return reply['status']
+
+
+# ---------- 守护进程 ----------
+
+
+def _address(runtime: str) -> tuple[str, str]:
+    """
+    返回守护进程的地址与地址族，同一个 bin 文件夹下的 ADM 总是使用相同的地址
+    """
+    import hashlib
+
+    digest = hashlib.sha256(os.path.dirname(os.path.abspath(__file__)).encode('utf8')).hexdigest()[:16]
+    if sys.platform == 'win32':
+        return fr"\\.\pipe\ADM-{digest}", 'AF_PIPE'
+    address = os.path.join(os.path.dirname(runtime), 'daemon.sock')
+    if len(address) > 100:  # Unix 套接字地址的长度限制
+        import tempfile
+        address = os.path.join(tempfile.gettempdir(), f"adm-{digest}.sock")
+    return address, 'AF_UNIX'
+
+
+def _stale_socket(address: str) -> bool:
+    """
+    判断 Unix 套接字是否为未能正常退出的守护进程遗留的，即无法连接的套接字
+    """
+    import socket
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(address)
+        except (ConnectionRefusedError, FileNotFoundError):
+            return True
+        except OSError:
+            return False
+    return False
+
+
+def _write_runtime(runtime: str, info: dict):
+    """
+    写入运行文件，权限为只有当前用户可以读写
+    """
+    import json
+
+    os.makedirs(os.path.dirname(runtime), exist_ok=True)
+    temp = f"{runtime}.{os.getpid()}"
+    fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with open(fd, encoding='utf8', mode='w') as fp:
+        json.dump(info, fp)
+    os.replace(temp, runtime)
+    return
+
+
+def _setup():
+    """
+    初始化 ADM 与网站，即冷启动时每个进程都需要完成的工作
+    """
+    from core import base
+
+    base.setup()
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'website.settings')
+    import django
+    django.setup()
+    return
+
+
+def _execute(request: dict) -> dict:
+    """
+    在当前进程中执行一个命令，并捕获其输出
+
+    :return:
+        包含 status, stdout 与 stderr 的回复
+    :rtype: dict
+    """
+    import io
+    import contextlib
+    import traceback
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    cwd = os.getcwd()
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            func = _commands[request['command']]
+        except KeyError:
+            print(f"未知的命令 '{request['command']}'", file=sys.stderr)
+            status = 2
+        else:
+            stdin, sys.stdin = sys.stdin, io.StringIO()  # 守护进程没有终端，交互式的输入立即得到 EOF 而不会阻塞
+            try:
+                os.chdir(request.get('cwd') or cwd)
+                status = func(list(request.get('args', ())))
+            except SystemExit as e:
+                status = e.code
+            except Exception:
+                traceback.print_exc()
+                status = 1
+            finally:
+                os.chdir(cwd)
+                sys.stdin = stdin
+    if status is None:
+        status = 0
+    elif not isinstance(status, int):
+        print(status, file=stderr)
+        status = 1
+    return {'status': status, 'stdout': stdout.getvalue(), 'stderr': stderr.getvalue()}
+
+
+_state = {}  # 守护进程的启动时间，已执行的命令数目与是否需要退出
+
+
+def serve(*, runtime=RUNTIME) -> bool:
+    """
+    初始化 ADM 与网站后作为守护进程运行，直到收到 stop 命令
+
+    同一时刻只会有一个守护进程，已有守护进程在运行时直接返回，
+    命令在主线程中依次执行，因此处理函数无需考虑线程安全
+
+    :param runtime:
+        运行文件的地址，仅限关键字
+
+    :type runtime: str
+
+    :return:
+        已有守护进程在运行时返回 False，否则在退出后返回 True
+    :rtype: bool
+    """
+    import json
+    import time
+    import logging
+    import secrets
+    from multiprocessing.connection import Listener, AuthenticationError
+
+    connection = _connect(runtime)
+    if connection is not None:
+        connection.close()
+        return False
+
+    _setup()
+    logger = logging.getLogger(__name__)
+    connection = _connect(runtime)  # 初始化期间另一个守护进程可能已经启动
+    if connection is not None:
+        connection.close()
+        return False
+
+    address, family = _address(runtime)
+    if family == 'AF_UNIX' and os.path.exists(address):
+        if not _stale_socket(address):  # 另一个守护进程正在监听，但尚未写入运行文件
+            return False
+        os.remove(address)  # 未能正常退出的守护进程遗留的套接字
+    authkey = secrets.token_bytes(32)
+    try:
+        listener = Listener(address, family=family, authkey=authkey)
+    except OSError:  # 另一个守护进程刚刚启动
+        return False
+    _write_runtime(runtime, {'pid': os.getpid(), 'address': address, 'family': family, 'authkey': authkey.hex()})
+    _state.update(started=time.time(), served=0, stop=False, address=address)
+    logger.info('守护进程已启动，地址为 %s', address)
+
+    try:
+        with listener:
+            while not _state['stop']:
+                try:
+                    connection = listener.accept()
+                except (OSError, EOFError, AuthenticationError) as e:
+                    logger.warning('拒绝了一个连接: %r', e)
+                    continue
+                with connection:
+                    try:
+                        request = json.loads(connection.recv_bytes())
+                        connection.send_bytes(json.dumps(_execute(request)).encode('utf8'))
+                    except (OSError, EOFError, ValueError) as e:
+                        logger.warning('未能完成转发的命令: %r', e)
+                        continue
+                _state['served'] += 1
+    finally:
+        if (_read_runtime(runtime) or {}).get('pid') == os.getpid():
+            os.remove(runtime)
+        logger.info('守护进程已退出，共执行了 %d 个命令', _state['served'])
+        _state.clear()
+    return True
+
+
+@command('ping')
+def _ping(args: list[str]) -> int:
+    print(os.getpid())
+    return 0
+
+
+@command('status')
+def _status(args: list[str]) -> int:
+    import time
+
+    print(f"pid: {os.getpid()}\n"
+          f"address: {_state['address']}\n"
+          f"uptime: {time.time() - _state['started']:.1f} s\n"
+          f"served: {_state['served']}")
+    return 0
+
+
+@command('stop')
+def _stop(args: list[str]) -> int:
+    _state['stop'] = True
+    return 0
+
+
+@command('minisite')
+def _minisite(args: list[str]) -> int:  # TODO[中期] (@YHDSL) 启动网页&任务栏角标
+    print(f"ADM 已在运行 (pid {os.getpid()})")
+    return 0
+
+
+@command('manage')
+def _manage(args: list[str]) -> int:
+    from django.core.management import ManagementUtility
+
+    if args and args[0] in INTERACTIVE_COMMANDS and not _NOINPUT.intersection(args):
+        args = [*args, '--noinput']  # 直接调用 forward 时也不会等待输入
+    ManagementUtility(['manage.py', *args]).execute()
+    return 0
@@ -3,9 +3,15 @@
 import os
 import sys
 
+import daemon
+
 
 def main():
     """Run administrative tasks."""
+    if not daemon.is_local(sys.argv[1:]):
+        status = daemon.forward('manage', sys.argv[1:])  # Forward to a running ADM daemon if there is one.
+        if status is not None:
+            sys.exit(status)
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'website.settings')
     try:
         from django.core.management import execute_from_command_line
@@ -1,17 +1,25 @@
 # 网站启动模块 (启动层)
 
+import sys
+
 try:
     import common
+    import daemon
 except ModuleNotFoundError:
     from tkinter.messagebox import showerror
     showerror(title='ADM 错误', message='软件损坏，请尝试重新安装。')
 
 
-def main():  # TODO[中期] (@YHDSL) 命令行转发&启动网页&任务栏角标
+def main():  # TODO[中期] (@YHDSL) 启动网页&任务栏角标
+    if daemon.forward('minisite', sys.argv[1:]) is not None:  # 已有实例在运行时转发命令后退出
+        return
+
     common.check_environ()
 
     common.check_venv()
 
+    daemon.serve()
+
     return
 
 
@@ -0,0 +1,6 @@
+from . import db
+
+
+__all__ = [
+    "db"
+]
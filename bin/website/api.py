@@ -0,0 +1,82 @@
+"""
+Async JSON API for browsing the library.
+
+Every endpoint pages with keyset cursors (see ``core.data.library``) so the cost
+of a page does not depend on how deep it is. ``?format=ndjson`` streams the
+whole result set, starting from ``?cursor=`` if given, one JSON object per line.
+
+Blocking SQLite work runs in a bounded thread pool of ``settings.API_WORKERS``
+threads, each holding its own read-only connection, so the event loop is never
+blocked and the database is never hit by more threads than that.
+"""
+
+import json
+import asyncio
+import functools
+import concurrent.futures
+
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import path
+
+from core.data import library as _library
+
+app_name = 'api'
+
+_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=getattr(settings, 'API_WORKERS', 4), thread_name_prefix='api')
+
+
+@functools.cache
+def get_library():
+    return _library.Library()
+
+
+async def run(func, *args, **kwargs):
+    """Run a blocking call in the API thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+async def _stream(method, *args, cursor=None):
+    rows = get_library().iterate(method, *args, cursor=cursor)
+    while True:
+        chunk = await run(next, rows, None)
+        if chunk is None:
+            return
+        yield ''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in chunk).encode('utf8')
+
+
+async def _respond(request, method, *args):
+    cursor = request.GET.get('cursor') or None
+    try:
+        if request.GET.get('format') == 'ndjson':
+            if cursor is not None:  # validate before the response starts streaming
+                await run(getattr(get_library(), method), *args, cursor=cursor, limit=1)
+            return StreamingHttpResponse(_stream(method, *args, cursor=cursor),
+                                         content_type='application/x-ndjson')
+        rows, next_cursor = await run(getattr(get_library(), method), *args,
+                                      cursor=cursor, limit=request.GET.get('limit'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'items': rows, 'next': next_cursor})
+
+
+async def series_list(request):
+    return await _respond(request, 'series')
+
+
+async def episode_list(request, series):
+    return await _respond(request, 'episodes', series)
+
+
+async def file_list(request, episode=None):
+    return await _respond(request, 'files', episode)
+
+
+urlpatterns = [
+    path('series/', series_list, name='series'),
+    path('series/<int:series>/episodes/', episode_list, name='episodes'),
+    path('episodes/<int:episode>/files/', file_list, name='episode-files'),
+    path('files/', file_list, name='files'),
+]
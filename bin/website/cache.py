@@ -0,0 +1,134 @@
+"""
+SQLite cache backend.
+
+Django's ``FileBasedCache`` lists the whole cache directory on every ``set()`` to
+decide whether to cull, which makes filling a cache of N entries O(N²). This
+backend keeps all entries in one SQLite database (WAL mode, so readers never
+wait for writers), looks up several keys in a single query for ``get_many()``
+and only checks the entry count every ``CULL_EVERY`` writes.
+
+Options (``OPTIONS`` in the ``CACHES`` setting): ``MAX_ENTRIES`` and
+``CULL_FREQUENCY`` as for the built-in backends, plus ``CULL_EVERY``.
+"""
+
+import os
+import time
+import pickle
+import sqlite3
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from core.base import metrics as _metrics
+
+_REQUESTS = _metrics.counter('adm_cache_requests_total', 'Cache lookups by result.', ('result',))
+_HITS = _REQUESTS.labels('hit')
+_MISSES = _REQUESTS.labels('miss')
+
+
+class SQLiteCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._location = os.fspath(location)
+        self._cull_every = int(params.get('OPTIONS', {}).get('CULL_EVERY', 64))
+        self._writes = 0
+        self._connection = None
+
+    @property
+    def connection(self):
+        # Django creates one backend instance per thread, so the connection is never shared.
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self._location), exist_ok=True)
+            connection = sqlite3.connect(self._location, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS cache ('
+                               'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL) WITHOUT ROWID')
+            connection.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+            self._connection = connection
+        return self._connection
+
+    def _alive(self, expires):
+        return expires is None or expires > time.time()
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self.connection.execute('SELECT value, expires FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None or not self._alive(row[1]):
+            _MISSES.inc()
+            return default
+        _HITS.inc()
+        return pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        mapping = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not mapping:
+            return {}
+        result = {}
+        for key, value, expires in self.connection.execute(
+                f'SELECT key, value, expires FROM cache WHERE key IN ({", ".join("?" * len(mapping))})',
+                list(mapping)):
+            if self._alive(expires):
+                result[mapping[key]] = pickle.loads(value)
+        _HITS.inc(len(result))
+        _MISSES.inc(len(mapping) - len(result))
+        return result
+
+    def _write(self, sql, key, value, timeout, *extra):
+        if timeout == 0:  # an immediately expiring entry is never stored
+            self.connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+            return False
+        value = pickle.dumps(value, self.pickle_protocol)
+        cursor = self.connection.execute(sql, (key, value, self.get_backend_timeout(timeout), *extra))
+        self._writes += 1
+        if self._writes % self._cull_every == 0:
+            self._cull()
+        return cursor.rowcount > 0
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._write('INSERT OR REPLACE INTO cache VALUES (?, ?, ?)', key, value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._write('INSERT INTO cache VALUES (?, ?, ?) '
+                           'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires '
+                           'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+                           key, value, timeout, time.time())
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self.connection.execute('UPDATE cache SET expires = ? '
+                                       'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                                       (self.get_backend_timeout(timeout), key, time.time())).rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self.connection.execute('DELETE FROM cache WHERE key = ?', (key,)).rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self.connection.execute('SELECT expires FROM cache WHERE key = ?', (key,)).fetchone()
+        return row is not None and self._alive(row[0])
+
+    def clear(self):
+        self.connection.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Keep the connection open across requests, it is per thread and cheap to hold.
+        pass
+
+    def _cull(self):
+        """Drop expired entries, then the soonest-expiring 1/CULL_FREQUENCY if still over MAX_ENTRIES."""
+        connection = self.connection
+        connection.execute('DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?', (time.time(),))
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            self.clear()
+            return
+        connection.execute('DELETE FROM cache WHERE key IN ('
+                           'SELECT key FROM cache ORDER BY expires IS NULL, expires LIMIT ?)',
+                           (count // self._cull_frequency,))
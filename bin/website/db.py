@@ -0,0 +1,70 @@
+"""
+Database helpers for the website project.
+
+Connections are tuned in :func:`configure_connection`, which runs on every new
+connection through the ``connection_created`` signal. ``ReplicaRouter`` sends
+read-only queries to the ``replica`` alias when one is configured, see
+``website/settings.py``. Every query is timed into the ``adm_db_query_seconds``
+histogram, see ``core.base.metrics``.
+"""
+
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from core.base import metrics as _metrics
+
+REPLICA = 'replica'
+
+_QUERY_SECONDS = _metrics.histogram('adm_db_query_seconds', 'Database query latency by connection alias.', ('alias',))
+
+
+def _observe_query(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        _QUERY_SECONDS.labels(context['connection'].alias).observe(time.perf_counter() - start)
+
+
+@receiver(connection_created)
+def configure_connection(sender, connection, **kwargs):
+    """Apply the SQLite pragmas from ``settings.SQLITE_PRAGMAS`` to a new connection."""
+    if _observe_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_observe_query)
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    if connection.alias == REPLICA:
+        pragmas['query_only'] = 'ON'
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+class ReplicaRouter:
+    """
+    Send reads to the ``replica`` connection and everything else to ``default``.
+
+    Reads inside an atomic block on ``default`` stay on ``default`` so that a
+    request always sees its own writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if REPLICA not in settings.DATABASES:
+            return None
+        if transaction.get_connection('default').in_atomic_block:
+            return 'default'
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -0,0 +1,17 @@
+"""
+Prometheus endpoint for the runtime metrics in ``core.base.metrics``.
+
+``/metrics`` returns every registered counter, gauge and histogram in the
+Prometheus text exposition format. Reading merges the per-thread shards, so it
+never blocks the threads that record the metrics.
+"""
+
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+from core.base import metrics as _metrics
+
+
+@require_GET
+def metrics(request):
+    return HttpResponse(_metrics.expose(), content_type=_metrics.CONTENT_TYPE)
@@ -12,6 +12,10 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 
 from pathlib import Path
 
+from core.base import conf as _conf
+from core.base import config as _config
+from core.base import database as _database
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -54,7 +58,7 @@ ROOT_URLCONF = 'website.urls'
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        'DIRS': [BASE_DIR / 'website' / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -73,10 +77,76 @@ WSGI_APPLICATION = 'website.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.0/ref/settings/#databases
 
+# The database lives in the ADM database folder (conf.Folder.DATABASE) and is
+# tuned through the [Website] section of the ADM INI file:
+#
+#     conn_max_age   seconds to keep a connection open, 0 closes it after each request
+#     busy_timeout   milliseconds to wait for a lock before raising "database is locked"
+#     journal_mode   SQLite journal mode, WAL lets readers run alongside a writer
+#     mmap_size      bytes of the database file to memory-map, 0 disables it
+#     replica        route read-only queries to a separate read-only connection
+#     replica_name   database used by the replica, defaults to the main database
+#     api_workers    threads running blocking SQLite work for the async library API
+#     stream_limit   concurrent video streams allowed per client address
+
+_SECTION = 'Website'
+_DATABASE_NAME = _database.get_address('website')
+Path(_DATABASE_NAME).parent.mkdir(parents=True, exist_ok=True)
+
+CONN_MAX_AGE = _config.get_option(_SECTION, 'conn_max_age', 600)
+BUSY_TIMEOUT = _config.get_option(_SECTION, 'busy_timeout', 5000)
+
+SQLITE_PRAGMAS = {
+    'journal_mode': _config.get_option(_SECTION, 'journal_mode', 'wal'),
+    'synchronous': 'NORMAL',
+    'busy_timeout': BUSY_TIMEOUT,
+    'mmap_size': _config.get_option(_SECTION, 'mmap_size', 256 * 1024 * 1024),
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': _DATABASE_NAME,
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': CONN_MAX_AGE > 0,
+        'OPTIONS': {
+            'timeout': BUSY_TIMEOUT / 1000,
+        },
+    }
+}
+
+if _config.get_option(_SECTION, 'replica', False):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': _config.get_option(_SECTION, 'replica_name', '') or _DATABASE_NAME,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['website.db.ReplicaRouter']
+
+API_WORKERS = _config.get_option(_SECTION, 'api_workers', 4)
+STREAMS_PER_CLIENT = _config.get_option(_SECTION, 'stream_limit', 4)
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+#
+# Rendered pages and fragments are stored in a SQLite database under
+# conf.Folder.CACHE (see website/cache.py). Their keys include the library
+# generation (see core.data.library), so entries never go stale; cache_timeout
+# and cache_entries only bound how much is kept. Options are read from the
+# [Website] section of the ADM INI file.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'website.cache.SQLiteCache',
+        'LOCATION': Path(_conf.Folder.CACHE) / 'website.db',
+        'TIMEOUT': _config.get_option(_SECTION, 'cache_timeout', 24 * 3600),
+        'OPTIONS': {
+            'MAX_ENTRIES': _config.get_option(_SECTION, 'cache_entries', 10000),
+            'CULL_FREQUENCY': 4,
+        },
     }
 }
 
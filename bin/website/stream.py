@@ -0,0 +1,162 @@
+"""
+Video streaming for files registered in the library.
+
+``GET /stream/<id>/`` serves a media file with support for single byte ranges
+(``Range``/``If-Range``) and conditional requests (``ETag`` built from size and
+mtime, ``Last-Modified``). The file object is handed to the server through
+``FileResponse``, so a server with ``wsgi.file_wrapper`` sendfile support
+(e.g. gunicorn) moves the bytes without them ever entering Python: the range
+is expressed as the file position plus ``Content-Length``.
+
+Each client address may hold at most ``settings.STREAMS_PER_CLIENT`` open
+streams; further requests get ``429 Too Many Requests`` until one finishes.
+"""
+
+import os
+import re
+import mimetypes
+import threading
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.urls import path
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+from .api import get_library
+
+app_name = 'stream'
+
+mimetypes.add_type('video/x-matroska', '.mkv')
+mimetypes.add_type('video/mp4', '.mp4')
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+_streams = {}
+_streams_lock = threading.Lock()
+
+
+def _acquire(client):
+    with _streams_lock:
+        if _streams.get(client, 0) >= getattr(settings, 'STREAMS_PER_CLIENT', 4):
+            return False
+        _streams[client] = _streams.get(client, 0) + 1
+        return True
+
+
+def _release(client):
+    with _streams_lock:
+        _streams[client] -= 1
+        if not _streams[client]:
+            del _streams[client]
+
+
+class RangeFile:
+    """
+    A read-only view of ``length`` bytes of an open file starting at its current position.
+
+    It exposes ``fileno()`` so that sendfile-capable servers can transmit the
+    range directly, and deliberately has no ``tell()``/``seek()`` so that
+    ``FileResponse`` leaves ``Content-Length`` to the caller.
+    """
+
+    def __init__(self, file, length, on_close=None):
+        self.name = file.name
+        self._file = file
+        self._remaining = length
+        self._on_close = on_close
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        if self._on_close is not None:
+            self._on_close()
+            self._on_close = None
+        self._file.close()
+
+
+def _parse_range(header, size):
+    """
+    Return ``(start, end)`` for a single ``bytes=`` range, ``None`` to ignore the
+    header, or ``False`` when the range cannot be satisfied.
+    """
+    match = _RANGE.match(header.strip())
+    if match is None:  # multiple or malformed ranges are answered with the whole file
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:  # suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+@require_safe
+def stream(request, file):
+    row = get_library().get_file(file)
+    if row is None:
+        raise Http404('File not found')
+    try:
+        handle = open(row['path'], 'rb')
+    except FileNotFoundError:
+        raise Http404('File not found')
+
+    stat = os.fstat(handle.fileno())
+    etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+    last_modified = int(stat.st_mtime)
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional is not None:
+        handle.close()
+        return conditional
+
+    size = stat.st_size
+    byte_range = None
+    if 'HTTP_RANGE' in request.META:
+        if_range = request.META.get('HTTP_IF_RANGE', '').strip()
+        if not if_range or if_range == etag or parse_http_date_safe(if_range) == last_modified:
+            byte_range = _parse_range(request.META['HTTP_RANGE'], size)
+    if byte_range is False:
+        handle.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    client = request.META.get('REMOTE_ADDR', '')
+    if not _acquire(client):
+        handle.close()
+        response = HttpResponse('Too many concurrent streams', status=429)
+        response['Retry-After'] = '1'
+        return response
+
+    start, end = byte_range or (0, size - 1)
+    handle.seek(start)
+    response = FileResponse(RangeFile(handle, end - start + 1, lambda: _release(client)))
+    response['Content-Length'] = end - start + 1
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if byte_range is not None:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return response
+
+
+urlpatterns = [
+    path('<int:file>/', stream, name='stream'),
+]
@@ -14,8 +14,14 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
+from django.urls import include, path
+
+from website.metrics import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/', include('website.api')),
+    path('stream/', include('website.stream')),
+    path('library/', include('website.views')),
+    path('metrics', metrics, name='metrics'),
 ]
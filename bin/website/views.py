@@ -0,0 +1,89 @@
+"""
+Library pages rendered with templates.
+
+Both pages are cached whole by :func:`generation_cache`, keyed on the library
+generation of the scope they display. The grid additionally caches one
+fragment per series card keyed on that series' generation, so after a scan
+that touched one series the grid is re-rendered from cached cards except for
+the changed one. Cached cards are fetched in one ``get_many`` and passed to the
+template as HTML, so a fragment culled before rendering is never re-rendered
+without its summary.
+"""
+
+import hashlib
+import functools
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.http import Http404
+from django.shortcuts import render
+from django.utils.safestring import mark_safe
+from django.urls import path
+
+from core.data import library as _library
+
+from .api import get_library
+
+app_name = 'library'
+
+
+def generation_cache(scope):
+    """
+    Cache a GET view's response under a key containing the generation of ``scope(**kwargs)``.
+
+    The generation changes whenever the data in the scope is written, so cached
+    responses never need explicit invalidation.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            name = scope(**kwargs)
+            digest = hashlib.md5(request.get_full_path().encode('utf8')).hexdigest()
+            key = f'view:{view.__name__}:{name}:{get_library().generation(name)}:{digest}'
+            response = cache.get(key)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200:
+                    cache.set(key, response)
+            return response
+        return wrapper
+    return decorator
+
+
+@generation_cache(lambda: _library.LIBRARY)
+def library_grid(request):
+    media = get_library()
+    try:
+        series, next_cursor = media.series(request.GET.get('cursor') or None, request.GET.get('limit'))
+    except ValueError:
+        raise Http404('Invalid cursor')
+    ids = [row['id'] for row in series]
+    generations = media.generations([_library.series_scope(index) for index in ids]) if ids else {}
+    keys = {index: make_template_fragment_key('series_card', [index, generations[_library.series_scope(index)]])
+            for index in ids}
+    cached = cache.get_many(keys.values())
+    missing = [index for index in ids if keys[index] not in cached]  # only cards without a cached fragment
+    summary = media.summary(missing) if missing else {}
+    for row in series:
+        row.update(summary.get(row['id'], {}))
+        row['generation'] = generations[_library.series_scope(row['id'])]
+        if keys[row['id']] in cached:
+            row['card'] = mark_safe(cached[keys[row['id']]])
+    return render(request, 'library/grid.html', {'series': series, 'next': next_cursor})
+
+
+@generation_cache(lambda series: _library.series_scope(series))
+def series_page(request, series):
+    media = get_library()
+    row = media.get_series(series)
+    if row is None:
+        raise Http404('Series not found')
+    return render(request, 'library/series.html', {'series': row, 'episodes': media.series_files(series)})
+
+
+urlpatterns = [
+    path('', library_grid, name='grid'),
+    path('series/<int:series>/', series_page, name='series'),
+]